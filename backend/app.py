@@ -4,38 +4,45 @@ from flask_cors import CORS
 import os
 import uuid
 import openpyxl
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
 import json
-import threading
 import time
-import queue
 from voc_analyzer import VOCAnalyzer
+from workbook_io import load_session_tables, open_workbook, stream_upload_json
+from session_store import SessionError, SessionStore
+from job_scheduler import JobScheduler, SchedulerFull
+from settings import get_setting
+from sheet_codec import encode_sheet, wants_compact
+from response_compression import compress_response, compressed_stream
+from process_pool import encode_json, start_process_pool
+import stats_engine
 
 app = Flask(__name__)
 CORS(app)
 
+# 结果Sheet构建与序列化使用的进程池，在创建其他后台线程之前启动
+start_process_pool()
+
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-import math
-
-# 工具函数：清理JSON数据中的无效值
-def clean_json_data(data):
-    if isinstance(data, dict):
-        return {k: clean_json_data(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [clean_json_data(v) for v in data]
-    elif isinstance(data, float):
-        if math.isnan(data) or math.isinf(data):
-            return ""
-        return data
-    else:
-        return data
+# 上传文件解析后的表格按 fileId 保存在服务端，分析与统计重算直接引用
+session_store = SessionStore(
+    os.path.join(os.path.dirname(__file__), 'sessions'),
+    max_memory=get_setting('SESSION_MEMORY_ENTRIES', 8),
+    ttl_days=get_setting('SESSION_TTL_DAYS', 7),
+    max_disk=get_setting('SESSION_MAX_DISK_ENTRIES', 200)
+)
 
 analyzer = VOCAnalyzer()
 
+
+@app.after_request
+def compress_json_response(response):
+    """按 Accept-Encoding 压缩较大的普通响应（如 recalculate_stats 的结果），流式响应在各接口中单独处理"""
+    return compress_response(response, request.headers.get('Accept-Encoding', ''))
+
+
 def celldata_to_dataframe(celldata):
     """Convert FortuneSheet celldata to pandas DataFrame
     
@@ -84,9 +91,12 @@ def celldata_to_dataframe(celldata):
     print(f"[celldata_to_dataframe] Created DataFrame with shape {df.shape}")
     return df
 
-# 用于跟踪分析任务的状态
-# 用于跟踪分析任务的状态
-analysis_tasks = {}  # {file_id: {'stop_flag': threading.Event(), 'thread': thread}}
+# 分析任务队列：固定数量的工作线程执行分析，排队已满时返回429
+job_scheduler = JobScheduler(
+    workers=get_setting('JOB_WORKERS', 2),
+    max_queued=get_setting('JOB_QUEUE_LIMIT', 16),
+    retention=get_setting('JOB_RETENTION', 600)
+)
 
 @app.route('/api/log_feedback', methods=['POST'])
 def log_feedback():
@@ -108,245 +118,50 @@ def log_feedback():
 
 @app.route('/api/recalculate_stats', methods=['POST'])
 def recalculate_stats():
-    """重新计算统计数据（用户手动归类后调用）"""
+    """重新计算统计数据（用户手动归类后调用）
+
+    请求中带 fileId 时在服务端保存分组状态，之后的修改可通过 /api/recalculate_stats/delta 增量重算。
+    """
     try:
         data = request.json
-        if not data or 'celldata' not in data:
+        if not data or ('celldata' not in data and not data.get('fileId')):
             return jsonify({'error': 'No celldata provided'}), 400
             
-        celldata = data['celldata']
-        print(f"[Recalculate] Received {len(celldata)} cells")
-        
-        # 解析表格数据
-        # 新格式: 行0是表头, 列0=问题总标题, 列1=问题归类, 列2=用户情绪, 列3+=其他数据
-        rows_data = {}
-        headers = {}
-        max_col = 0
-        
-        for cell in celldata:
-            r, c = cell['r'], int(cell['c'])
-            v = cell['v'].get('v', '') if isinstance(cell['v'], dict) else cell['v']
-            
-            if r == 0:
-                headers[c] = v
-                max_col = max(max_col, c)
-            else:
-                if r not in rows_data:
-                    rows_data[r] = {}
-                rows_data[r][c] = v
-
-        # 提取动态列名 (从索引3开始)
-        original_data_headers = []
-        for c in range(3, max_col + 1):
-            if c in headers:
-                original_data_headers.append(headers[c])
-        
+        if 'celldata' in data:
+            celldata = data['celldata']
+            print(f"[Recalculate] Received {len(celldata)} cells")
+            # 解析表格数据
+            headers, rows_data, max_col = stats_engine.parse_celldata(celldata)
+        else:
+            # 引用服务端会话中保存的分析结果，只提交修改过的单元格（changes）
+            try:
+                session = session_store.get(data['fileId'], data.get('version'))
+            except SessionError as e:
+                return jsonify({'error': str(e)}), e.status
+            if 'analysis' not in session.tables:
+                return jsonify({'error': '会话中没有分析结果，请先进行分析'}), 404
+            changes = data.get('changes') or []
+            print(f"[Recalculate] 使用会话 {data['fileId']} v{session.version} 的分析结果，{len(changes)} 个修改")
+            headers, rows_data, max_col = stats_engine.parse_cells(
+                stats_engine.edited_table_cells(session.tables['analysis'], changes)
+            )
+        original_data_headers = stats_engine.data_headers(headers, max_col)
         print(f"[Recalculate] Detected {len(original_data_headers)} data columns: {original_data_headers}")
 
-        # 补齐合并单元格导致的空值（将上方同列值向下填充）
-        last_summary = None
-        last_category = None
-        for r in sorted(rows_data.keys()):
-            row = rows_data[r]
-            if 0 in row and row[0] != '':
-                last_summary = row[0]
-            elif last_summary is not None:
-                row[0] = last_summary
-            if 1 in row and row[1] != '':
-                last_category = row[1]
-            elif last_category is not None:
-                row[1] = last_category
-
         # 统计: 按(问题总标题, 问题归类, 用户情绪)分组
-        groups = {}
-        total_real_rows = len(rows_data)
-        
-        # 为保持类别聚合顺序，记录首次出现的类别与分组顺序
-        category_order = []
-        group_order = []
-
-        for row_idx, row in rows_data.items():
-            summary = row.get(0, '未分类') or '未分类'
-            category = row.get(1, '未归类') or '未归类'
-            sentiment = row.get(2, '中性😐') or '中性😐'
-            
-            # 收集该行所有其他列的数据
-            row_extra_data = []
-            for c in range(3, max_col + 1):
-                row_extra_data.append(row.get(c, ''))
-            
-            key = (summary, category, sentiment)
-            if key not in groups:
-                if category not in category_order:
-                    category_order.append(category)
-                group_order.append(key)
-                groups[key] = {
-                    'summary': summary,
-                    'category': category,
-                    'sentiment': sentiment,
-                    'user_count': 0,
-                    'data_rows': []
-                }
-            groups[key]['user_count'] += 1
-            groups[key]['data_rows'].append(row_extra_data)
-        
-        # 计算百分比并按“类别 -> 首次出现顺序”排列
-        result_list = []
-        # 按类别顺序组织
-        for cat in category_order:
-            cat_groups = [k for k in group_order if k[1] == cat]
-            for key in cat_groups:
-                group = groups[key]
-                user_pct = (group['user_count'] / total_real_rows * 100) if total_real_rows > 0 else 0
-                result_list.append({
-                    'summary': group['summary'],
-                    'category': group['category'],
-                    'sentiment': group['sentiment'],
-                    'user_count': group['user_count'],
-                    'user_pct': f"{user_pct:.2f}%",
-                    'data_rows': group['data_rows']
-                })
-        
-        # 构建新的celldata（带统计列）
-        new_celldata = []
-        
-        # 新表头: [问题总标题, 问题归类, 用户情绪, 用户数量, 用户占比] + [原始数据列...]
-        new_headers = ['问题总标题', '问题归类', '用户情绪', '用户数量', '用户占比'] + original_data_headers
-        
-        for i, header in enumerate(new_headers):
-            new_celldata.append({
-                'r': 0,
-                'c': i,
-                'v': {
-                    'v': header,
-                    'm': header,
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'bg': '#EDEBE9',
-                    'bl': 1
-                }
-            })
-        
-        current_row = 1
-        merge_config = {}
-        
-        # 填充数据
-        for group in result_list:
-            start_row = current_row
-            rows_count = len(group['data_rows'])
-            
-            # 填充具体数据行 (从列5开始)
-            for row_data in group['data_rows']:
-                for idx, val in enumerate(row_data):
-                    val_str = str(val)
-                    new_celldata.append({
-                        'r': current_row,
-                        'c': 5 + idx,  # 偏移5列 (前5列是统计)
-                        'v': {
-                            'v': val_str,
-                            'm': val_str,
-                            'ct': {'fa': 'General', 't': 'g'}
-                        }
-                    })
-                current_row += 1
-            
-            # 统计列（合并单元格）： 列0-4
-            # 问题总标题
-            new_celldata.append({
-                'r': start_row,
-                'c': 0,
-                'v': {
-                    'v': group['summary'],
-                    'm': group['summary'],
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'vt': 1, 'ht': 1,
-                    'bg': '#E6F2FF'
-                }
-            })
-            
-            # 问题归类
-            new_celldata.append({
-                'r': start_row,
-                'c': 1,
-                'v': {
-                    'v': group['category'],
-                    'm': group['category'],
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'vt': 1, 'ht': 1,
-                    'bg': '#E6F2FF'
-                }
-            })
-            
-            # 用户情绪（带颜色）
-            font_color = '#000000'
-            if '负面' in str(group['sentiment']):
-                font_color = '#FF0000'
-            elif '正面' in str(group['sentiment']):
-                font_color = '#008000'
-                
-            new_celldata.append({
-                'r': start_row,
-                'c': 2,
-                'v': {
-                    'v': group['sentiment'],
-                    'm': group['sentiment'],
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'vt': 1, 'ht': 1,
-                    'fc': font_color
-                }
-            })
-            
-            # 用户数量
-            new_celldata.append({
-                'r': start_row,
-                'c': 3,
-                'v': {
-                    'v': group['user_count'],
-                    'm': str(group['user_count']),
-                    'ct': {'fa': 'General', 't': 'n'},
-                    'vt': 1, 'ht': 1
-                }
-            })
-            
-            # 用户占比
-            new_celldata.append({
-                'r': start_row,
-                'c': 4,
-                'v': {
-                    'v': group['user_pct'],
-                    'm': group['user_pct'],
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'vt': 1, 'ht': 1
-                }
-            })
-            
-            # 合并单元格配置
-            if rows_count > 1:
-                for col_idx in range(5):
-                    merge_config[f"{start_row}_{col_idx}"] = {
-                        "r": start_row,
-                        "c": col_idx,
-                        "rs": rows_count,
-                        "cs": 1
-                    }
-        
-        result = {
-            'name': '分析结果',
-            'status': 1,  # 设置为活动sheet
-            'celldata': new_celldata,
-            'config': {
-                'merge': merge_config,
-                'columnlen': {
-                    '0': 220,  # 问题总标题
-                    '1': 120,  # 问题归类
-                    '2': 100,  # 用户情绪
-                    '3': 70,   # 用户数量
-                    '4': 70,   # 用户占比
-                    '5': 500   # VOC原声片段（默认第一列原始数据）
-                }
-            }
-        }
-        
-        print(f"[Recalculate] Generated {len(new_celldata)} cells with {len(result_list)} groups")
+        result_list = stats_engine.group_rows(rows_data, max_col)
+        result = stats_engine.render_stats_sheet(result_list, original_data_headers)
+        print(f"[Recalculate] Generated {len(result['celldata'])} cells with {len(result_list)} groups")
+
+        file_id = data.get('fileId')
+        if file_id:
+            state = stats_engine.StatsState(result_list)
+            stats_engine.save_state(file_id, state)
+            result['version'] = state.version
+            result['layout'] = state.layout()
+
+        if wants_compact(data.get('format')):
+            result = encode_sheet(result)
         return jsonify(result), 200
         
     except Exception as e:
@@ -356,6 +171,27 @@ def recalculate_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/recalculate_stats/delta', methods=['POST'])
+def recalculate_stats_delta():
+    """增量重新计算统计：只提交修改过的单元格，只返回变化的分组块
+
+    请求: {fileId, version, changes: [{r, c, v}, ...]}，坐标为上次重算结果中的位置
+    返回: {version, total, layout: [[分组ID, 行数], ...], blocks: [[分组ID, celldata], ...]}
+    状态不存在（404）或版本不一致（409）时前端应改用全量重算。
+    """
+    data = request.json
+    if not data or not data.get('fileId'):
+        return jsonify({'error': '缺少fileId'}), 400
+    changes = data.get('changes') or []
+    try:
+        delta = stats_engine.apply_delta(data['fileId'], data.get('version'), changes)
+    except stats_engine.StatsStateError as e:
+        print(f"[Recalculate] 增量重算失败: {e}")
+        return jsonify({'error': str(e)}), e.status
+    print(f"[Recalculate] 增量重算: {len(changes)} 个修改，{len(delta['blocks'])} 个分组变化")
+    return jsonify(delta), 200
+
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -370,271 +206,247 @@ def upload_file():
     file_path = os.path.join(UPLOAD_FOLDER, f'{file_id}.xlsx')
     file.save(file_path)
     
-    # 读取Excel文件并转换为Luckysheet格式
+    # 读取Excel文件并转换为Luckysheet格式：只读模式逐行解析，结果以分块JSON流式返回
     try:
-        wb = load_workbook(file_path)
-        sheets_data = []
-        
-        print(f"[上传] 开始处理文件，共 {len(wb.sheetnames)} 个sheet")
-        
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            cells = []
-            
-            print(f"[上传] 处理sheet: {sheet_name}, 最大行: {ws.max_row}, 最大列: {ws.max_column}")
-            
-            # 读取所有有数据的单元格
-            cell_count = 0
-            for row_idx, row in enumerate(ws.iter_rows(values_only=False), start=1):
-                for col_idx, cell in enumerate(row, start=1):
-                    if cell.value is not None:
-                        cells.append({
-                            'r': row_idx - 1,
-                            'c': col_idx - 1,
-                            'v': {
-                                'v': cell.value,
-                                'm': str(cell.value),
-                                'ct': {'fa': 'General', 't': 'g'}
-                            }
-                        })
-                        cell_count += 1
-            
-            print(f"[上传] Sheet {sheet_name} 共读取 {cell_count} 个单元格")
-            
-            # 设置列宽
-            # 设置列宽
-            column = {}
-            for col_idx in range(1, ws.max_column + 1):
-                col_letter = get_column_letter(col_idx)
-                width = ws.column_dimensions[col_letter].width if ws.column_dimensions[col_letter].width else 73
-                # Luckysheet/FortuneSheet expects key to be string index "0", "1", etc.
-                column[str(col_idx - 1)] = int(width) if width else 73
-            
-            sheet_data = {
-                'name': sheet_name,
-                'index': len(sheets_data),
-                'order': len(sheets_data),
-                'status': 1,
-                'celldata': cells,
-                'config': {
-                    'columnlen': column,
-                    'rowlen': {}
-                },
-                'scrollLeft': 0,
-                'scrollTop': 0,
-                'luckysheet_select_save': [],
-                'calc chain': [],
-                'isPivotTable': False,
-                'pivotTable': {},
-                'filter_select': None,
-                'filter': None,
-                'luckysheet_conditionformat_save': [],
-                'frozen': {},
-                'chart': [],
-                'zoomRatio': 1,
-                'image': [],
-                'showGridLines': 1,
-                'dataVerification': {}
-            }
-            sheets_data.append(sheet_data)
-            print(f"[上传] Sheet {sheet_name} 数据已添加到sheets_data，celldata数量: {len(cells)}")
-        
-        print(f"[上传] 准备返回数据，共 {len(sheets_data)} 个sheet")
-        result = {
-            'fileId': file_id,
-            'sheets': sheets_data,
-            'originalSheets': wb.sheetnames
-        }
-        print(f"[上传] 返回数据大小: {len(str(result))} 字符")
-        return jsonify(result)
+        wb = open_workbook(file_path)
     except Exception as e:
+        os.remove(file_path)
         return jsonify({'error': f'处理文件失败: {str(e)}'}), 500
+    
+    print(f"[上传] 开始处理文件，共 {len(wb.sheetnames)} 个sheet")
+    # ?format=compact 时使用紧凑格式（见 sheet_codec）
+    compact = wants_compact(request.args.get('format') or request.form.get('format'))
+    version = session_store.reserve(file_id)
 
-@app.route('/api/analyze', methods=['POST'])
-def analyze_voc():
-    data = request.json
+    chunks = stream_upload_json(wb, file_path, file_id, app.json.dumps, compact=compact, version=version)
+    try:
+        # 响应开始前先生成第一个分块（含第一个Sheet的开头），工作簿无法解析时仍返回500
+        first_chunk = next(chunks)
+    except Exception as e:
+        chunks.close()
+        # 文件无法解析，不再后台解析会话，直接删除上传的文件
+        session_store.release(file_id)
+        os.remove(file_path)
+        return jsonify({'error': f'处理文件失败: {str(e)}'}), 500
+
+    def upload_stream():
+        try:
+            yield first_chunk
+            yield from chunks
+        finally:
+            # 返回完成后在后台解析分析用的表格，保存到服务端会话
+            session_store.ingest_async(file_id, lambda: load_session_tables(file_path))
+
+    body, headers = compressed_stream(
+        upload_stream(),
+        request.headers.get('Accept-Encoding', ''),
+        label='上传'
+    )
+    return Response(body, mimetype='application/json', headers=headers)
+
+def submit_analysis_job(data):
+    """校验分析请求并提交到任务队列
+
+    Returns:
+        (job, None) 或 (None, 错误响应)
+    """
     file_id = data.get('fileId')
     celldata = data.get('celldata')  # Optional: current sheet data
+    # 增量模式：每分析完一批行就推送 rows 事件，最终的 complete 事件只包含分析Sheet的布局（分组与合并配置）
+    incremental = bool(data.get('incremental'))
+    # format=compact 时结果Sheet使用紧凑格式（见 sheet_codec）
+    compact = wants_compact(data.get('format'))
+    # resume=True 时从断点继续：上次终止或超时前已完成的行不再调用AI
+    resume = bool(data.get('resume'))
+    # 优先级：数值越大越先执行，同优先级按提交顺序
+    try:
+        priority = int(data.get('priority') or 0)
+    except (TypeError, ValueError):
+        return None, (jsonify({'error': 'priority 必须是整数'}), 400)
     
     if not file_id:
-        return jsonify({'error': '缺少fileId'}), 400
+        return None, (jsonify({'error': '缺少fileId'}), 400)
     
-    # 如果提供了celldata，使用它；否则使用文件
-    use_celldata = celldata is not None and len(celldata) > 0
+    # 分析流程：per_row（逐条分析）或 cluster（先聚类，每簇只把代表样本发给AI），为空时使用配置 ANALYSIS_PIPELINE
+    pipeline = data.get('pipeline') or None
+    if pipeline not in (None, 'per_row', 'cluster'):
+        return None, (jsonify({'error': 'pipeline 只能是 per_row 或 cluster'}), 400)
     
-    if not use_celldata:
-        # 传统方式：从文件读取
-        file_path = os.path.join(UPLOAD_FOLDER, f'{file_id}.xlsx')
-        if not os.path.exists(file_path):
-            return jsonify({'error': '文件不存在'}), 404
+    # 分类体系名称（见 /api/taxonomies），为空时使用默认分类体系
+    taxonomy = data.get('taxonomy') or None
+    if taxonomy and analyzer.taxonomies.get(taxonomy) is None:
+        return None, (jsonify({'error': f'分类体系不存在: {taxonomy}'}), 400)
     
-    # 如果已有任务，先停止它
-    if file_id in analysis_tasks:
-        analysis_tasks[file_id]['stop_flag'].set()
-        # 等待旧任务结束
-        analysis_tasks[file_id]['thread'].join(timeout=2)
-    
-    # 创建停止标志
-    stop_flag = threading.Event()
-    
-    # 创建新任务
-    result_container = {'result': None, 'error': None, 'completed': False}
+    # 如果提供了celldata，使用它；否则使用服务端会话中已解析的表格，会话不存在时读取文件
+    use_celldata = celldata is not None and len(celldata) > 0
+    session = None
+    file_path = os.path.join(UPLOAD_FOLDER, f'{file_id}.xlsx')
     
-    def send_progress(current, total, message):
-        """发送进度更新"""
-        progress = int((current / total * 100)) if total > 0 else 0
-        return f"data: {json.dumps({'type': 'progress', 'current': current, 'total': total, 'progress': progress, 'message': message}, ensure_ascii=False)}\n\n"
+    if not use_celldata:
+        try:
+            session = session_store.get(file_id, data.get('version'))
+        except SessionError as e:
+            if e.status != 404:
+                return None, (jsonify({'error': str(e)}), e.status)
+        if session is None and not os.path.exists(file_path):
+            return None, (jsonify({'error': '文件不存在'}), 404)
     
-    def analyze_task(progress_queue):
+    def analyze_task(job):
+        # 每个任务使用独立的分析器状态（停止标志、回调、统计），共享连接池与缓存
+        job_analyzer = analyzer.for_job(taxonomy)
+        stop_flag = job.stop_flag
         try:
             if use_celldata:
                 print(f"[分析任务] 使用celldata进行分析，共 {len(celldata)} 个单元格")
+            elif session is not None:
+                print(f"[分析任务] 使用会话 {file_id} v{session.version} 中的表格进行分析")
             else:
                 print(f"[分析任务] 开始分析文件: {file_path}")
             
             # 发送初始进度
-            progress_queue.put(('progress', 0, 100, '开始分析...'))
+            job.emit('progress', 0, 100, '开始分析...')
             
             # 设置停止标志到analyzer
-            analyzer.set_stop_flag(stop_flag)
+            job_analyzer.set_stop_flag(stop_flag)
             
             # 定义进度回调函数
             def progress_callback(current, total, message):
                 if not stop_flag.is_set():
                     print(f"[进度更新] {message} ({current}/{total})")
-                    progress_queue.put(('progress', current, total, message))
+                    job.emit('progress', current, total, message, job_analyzer.get_run_stats())
             
-            analyzer.progress_callback = progress_callback
+            job_analyzer.progress_callback = progress_callback
             
-            # 分析VOC数据
+            def row_callback(opinions):
+                if not stop_flag.is_set():
+                    job.emit('rows', [VOCAnalyzer.row_result(opinion) for opinion in opinions])
+            
+            job_analyzer.row_callback = row_callback if incremental else None
+            
+            version_holder = {}
+            
+            def table_callback(cells):
+                # 保存分析结果，之后的统计重算可通过 fileId + version 引用
+                version_holder['version'] = session_store.update(file_id, analysis=cells).version
+            
+            job_analyzer.table_callback = table_callback
+            
+            # 逐行保存断点，终止或超时后可通过 resume 继续
+            job_analyzer.checkpoint_job = file_id
+            job_analyzer.resume = resume
+            if pipeline:
+                job_analyzer.pipeline = pipeline
+            if resume:
+                print(f"[分析任务] 从断点继续分析: {file_id}")
+            
+            # 分析VOC数据（结果Sheet在进程池中构建并序列化，analyzed_sheets 为 EncodedJSON）
             if use_celldata:
                 # 从celldata分析
                 print(f"[分析任务] 调用 celldata_to_dataframe...")
                 df = celldata_to_dataframe(celldata)
                 print(f"[分析任务] 调用 analyze_dataframe...")
-                analyzed_sheets = analyzer.analyze_dataframe(df)
+                analyzed_sheets = job_analyzer.analyze_dataframe(df, layout_only=incremental, compact=compact, encode=True)
+            elif session is not None:
+                analyzed_sheets = job_analyzer.analyze_session(session, layout_only=incremental, compact=compact, encode=True)
             else:
                 # 从文件分析
                 print(f"[分析任务] 调用 analyze_file...")
-                analyzed_sheets = analyzer.analyze_file(file_path)
+                analyzed_sheets = job_analyzer.analyze_file(file_path, layout_only=incremental, compact=compact, encode=True)
             
             print(f"[分析任务] 分析完成，得到 {len(analyzed_sheets) if analyzed_sheets else 0} 个sheet")
             
             if stop_flag.is_set():
                 print(f"[分析任务] 检测到停止标志")
-                result_container['error'] = '分析被用户终止'
-                progress_queue.put(('error', '分析被用户终止'))
+                job.error = '分析被用户终止'
+                job.emit('error', job.error)
                 return
             
             if not analyzed_sheets:
                 print(f"[分析任务] 分析结果为空")
-                result_container['error'] = '分析结果为空，请检查文件格式'
-                progress_queue.put(('error', '分析结果为空，请检查文件格式'))
+                job.error = '分析结果为空，请检查文件格式'
+                job.emit('error', job.error)
                 return
             
-            result_container['result'] = {
+            job.result = {
                 'fileId': file_id,
-                'sheets': analyzed_sheets
+                'sheets': analyzed_sheets,
+                'stats': job_analyzer.get_run_stats(),
+                'incremental': incremental,
+                'version': version_holder.get('version')
             }
             print(f"[分析任务] 发送完成消息，包含 {len(analyzed_sheets)} 个sheet")
-            progress_queue.put(('complete', result_container['result']))
+            job.emit('complete', job.result)
         except KeyboardInterrupt:
             print(f"[分析任务] 捕获到 KeyboardInterrupt")
-            result_container['error'] = '分析被中断'
-            progress_queue.put(('error', '分析被中断'))
+            job.error = '分析被用户终止' if stop_flag.is_set() else '分析被中断'
+            job.emit('error', job.error)
         except Exception as e:
             import traceback
             error_detail = str(e)
             print(f"[分析任务] 分析错误详情: {traceback.format_exc()}")
             # 检查是否是用户终止
             if '分析被用户终止' in error_detail or stop_flag.is_set():
-                result_container['error'] = '分析被用户终止'
-                progress_queue.put(('error', '分析被用户终止'))
+                job.error = '分析被用户终止'
             else:
-                result_container['error'] = f'分析失败: {error_detail}'
-                progress_queue.put(('error', result_container['error']))
-        finally:
-            result_container['completed'] = True
-            progress_queue.put(('done', None))
-            print(f"[分析任务] 任务完成，清理资源")
-            # 清理任务
-            if file_id in analysis_tasks:
-                del analysis_tasks[file_id]
-    
-    # 使用队列来传递进度更新
-    progress_queue = queue.Queue()
-    
-    # 启动分析线程
-    thread = threading.Thread(target=analyze_task, args=(progress_queue,))
-    thread.daemon = True
-    thread.start()
+                job.error = f'分析失败: {error_detail}'
+            job.emit('error', job.error)
     
-    analysis_tasks[file_id] = {
-        'stop_flag': stop_flag,
-        'thread': thread
-    }
-    
-    # 使用SSE流式响应
+    try:
+        return job_scheduler.submit(file_id, analyze_task, priority), None
+    except SchedulerFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return None, (response, e.status)
+
+
+def job_event_stream(job, start=0):
+    """以SSE流式返回任务事件（从第 start 个事件开始），每个事件带 id，断开后可凭 Last-Event-ID 继续订阅"""
     @stream_with_context
     def generate():
-        print(f"[SSE] 开始生成流式响应 for file_id: {file_id}")
+        print(f"[SSE] 开始生成流式响应 for job: {job.id}（文件 {job.file_id}）")
         timeout = 300  # 5分钟超时
         start_time = time.time()
+        index = start
         
         while True:
             try:
-                # 检查超时
+                # 检查超时（任务本身继续执行，已完成的行保存在断点中）
                 if time.time() - start_time > timeout:
                     print(f"[SSE] 超时")
-                    yield f"data: {json.dumps({'type': 'error', 'message': '分析超时'}, ensure_ascii=False)}\n\n"
-                    break
-                
-                # 检查线程是否还在运行
-                if not thread.is_alive() and result_container['completed']:
-                    # 线程已完成，检查是否有最终结果
-                    print(f"[SSE] 线程已完成，检查结果...")
-                    if result_container['error']:
-                        print(f"[SSE] 发送错误: {result_container['error']}")
-                        yield f"data: {json.dumps({'type': 'error', 'message': result_container['error']}, ensure_ascii=False)}\n\n"
-                    elif result_container['result']:
-                        # 如果线程完成但没有通过队列发送complete消息，直接发送结果
-                        print(f"[SSE] 发送结果（线程已完成但未通过队列）")
-                        yield f"data: {json.dumps({'type': 'complete', 'data': result_container['result']}, ensure_ascii=False)}\n\n"
+                    yield f"data: {json.dumps({'type': 'error', 'message': '分析超时，已完成的行已保存，可继续分析'}, ensure_ascii=False)}\n\n"
                     break
                 
-                # 从队列获取进度更新（非阻塞）
-                try:
-                    update_type, *args = progress_queue.get(timeout=0.5)
-                    print(f"[SSE] 收到队列消息: {update_type}")
+                for update_type, *args in job.events_since(index):
+                    index += 1
+                    event_id = f"id: {index - 1}\n"
                     
                     if update_type == 'progress':
-                        current, total, message = args
+                        current, total, message, *extra = args
                         progress = int((current / total * 100)) if total > 0 else 0
                         print(f"[SSE] 发送进度: {message} ({current}/{total}, {progress}%)")
-                        yield f"data: {json.dumps({'type': 'progress', 'current': current, 'total': total, 'progress': progress, 'message': message}, ensure_ascii=False)}\n\n"
+                        event = {'type': 'progress', 'current': current, 'total': total, 'progress': progress, 'message': message}
+                        if extra:
+                            # 统计信息：缓存命中/未命中次数等
+                            event['stats'] = extra[0]
+                        yield f"{event_id}data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    elif update_type == 'rows':
+                        rows = args[0]
+                        print(f"[SSE] 推送 {len(rows)} 行分析结果")
+                        yield f"{event_id}data: {json.dumps({'type': 'rows', 'rows': rows}, ensure_ascii=False)}\n\n"
                     elif update_type == 'complete':
                         result = args[0]
                         print(f"[SSE] 发送完成消息，包含 {len(result.get('sheets', []))} 个sheet")
-                        # 清理数据中的NaN
-                        cleaned_result = clean_json_data(result)
-                        yield f"data: {json.dumps({'type': 'complete', 'data': cleaned_result}, ensure_ascii=False)}\n\n"
-                        break
+                        # 清理数据中的NaN；Sheet数据已在进程池中序列化，直接拼接
+                        yield event_id.encode('utf-8') + b"data: " + encode_json({'type': 'complete', 'data': result}) + b"\n\n"
+                        return
                     elif update_type == 'error':
                         error_msg = args[0]
                         print(f"[SSE] 发送错误: {error_msg}")
-                        yield f"data: {json.dumps({'type': 'error', 'message': error_msg}, ensure_ascii=False)}\n\n"
-                        break
+                        yield f"{event_id}data: {json.dumps({'type': 'error', 'message': error_msg}, ensure_ascii=False)}\n\n"
+                        return
                     elif update_type == 'done':
                         print(f"[SSE] 收到done消息")
-                        # 检查是否有结果需要发送
-                        if result_container['result']:
-                            print(f"[SSE] 发送结果（done消息后）")
-                            cleaned_result = clean_json_data(result_container['result'])
-                            yield f"data: {json.dumps({'type': 'complete', 'data': cleaned_result}, ensure_ascii=False)}\n\n"
-                        break
-                except queue.Empty:
-                    # 队列为空，继续等待
-                    continue
+                        return
                     
             except Exception as e:
                 import traceback
@@ -643,11 +455,60 @@ def analyze_voc():
                 yield f"data: {json.dumps({'type': 'error', 'message': f'服务器错误: {str(e)}'}, ensure_ascii=False)}\n\n"
                 break
     
-    return Response(generate(), mimetype='text/event-stream', headers={
+    # 整个事件流压缩，每个事件后同步刷新：进度事件即时到达，complete 事件中的Sheet数据压缩传输
+    body, compression_headers = compressed_stream(
+        generate(), request.headers.get('Accept-Encoding', ''), flush_each=True, label='SSE'
+    )
+    return Response(body, mimetype='text/event-stream', headers={
         'Cache-Control': 'no-cache',
-        'X-Accel-Buffering': 'no'
+        'X-Accel-Buffering': 'no',
+        **compression_headers
     })
 
+@app.route('/api/analyze', methods=['POST'])
+def analyze_voc():
+    """提交分析任务并在同一请求中以SSE返回进度与结果"""
+    job, error_response = submit_analysis_job(request.json)
+    if error_response:
+        return error_response
+    return job_event_stream(job)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """提交分析任务（参数同 /api/analyze），立即返回任务ID，进度通过 /api/jobs/<id>/events 订阅"""
+    job, error_response = submit_analysis_job(request.json)
+    if error_response:
+        return error_response
+    return jsonify(job.info()), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.info())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    # 断线重连时从 Last-Event-ID（或 after 参数）之后的事件继续
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        start = int(last_event_id) + 1 if last_event_id is not None else 0
+    except ValueError:
+        start = 0
+    return job_event_stream(job, start)
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_scheduler.cancel(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    print(f"[停止分析] 已终止任务 {job_id}")
+    return jsonify(job.info())
+
 @app.route('/api/analyze/stop', methods=['POST'])
 def stop_analyze():
     data = request.json
@@ -656,13 +517,22 @@ def stop_analyze():
     if not file_id:
         return jsonify({'error': '缺少fileId'}), 400
     
-    if file_id in analysis_tasks:
-        analysis_tasks[file_id]['stop_flag'].set()
+    job = job_scheduler.active_job(file_id)
+    if job is not None:
+        job_scheduler.cancel(job.id)
         print(f"[停止分析] 已设置停止标志 for file_id: {file_id}")
         return jsonify({'message': '分析已终止'})
     else:
         return jsonify({'message': '没有正在进行的分析任务'})
 
+@app.route('/api/taxonomies', methods=['GET'])
+def list_taxonomies():
+    """可用的分类体系（名称、版本与分类列表），分析请求通过 taxonomy 参数选择"""
+    return jsonify({
+        'default': analyzer.taxonomy.name,
+        'taxonomies': analyzer.taxonomies.list()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
 
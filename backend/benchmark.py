@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""性能基准：对比优化后的实现与原实现的耗时，并校验输出一致
+
+用法:
+    python benchmark.py                  # 默认 100000 行 × 20 列
+    python benchmark.py --rows 20000 --cols 10
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from sheet_codec import expand_sheet
+from stats_engine import group_rows
+from workbook_io import dataframe_to_celldata, dataframe_to_compact
+
+
+def legacy_dataframe_to_celldata(df):
+    """原 VOCAnalyzer._dataframe_to_sheet_data 的实现（逐行 iterrows）"""
+    celldata = []
+
+    # 表头
+    for col_idx, col_name in enumerate(df.columns):
+        celldata.append({
+            'r': 0,
+            'c': col_idx,
+            'v': {
+                'v': str(col_name),
+                'm': str(col_name),
+                'ct': {'fa': 'General', 't': 'g'}
+            }
+        })
+
+    # 数据行
+    for row_idx, row in df.iterrows():
+        for col_idx, col_name in enumerate(df.columns):
+            val = row[col_name]
+            if pd.notna(val):
+                val_str = str(val)
+                celldata.append({
+                    'r': row_idx + 1,
+                    'c': col_idx,
+                    'v': {
+                        'v': val_str,
+                        'm': val_str,
+                        'ct': {'fa': 'General', 't': 'g'}
+                    }
+                })
+    return celldata
+
+
+def legacy_group_rows(rows_data, max_col):
+    """原 recalculate_stats 的分组实现（类别与分组顺序用列表查找，按类别筛选分组为 O(类别数 × 分组数)）"""
+    groups = {}
+    total_real_rows = len(rows_data)
+    category_order = []
+    group_order = []
+
+    for row_idx, row in rows_data.items():
+        summary = row.get(0, '未分类') or '未分类'
+        category = row.get(1, '未归类') or '未归类'
+        sentiment = row.get(2, '中性😐') or '中性😐'
+        row_extra_data = []
+        for c in range(3, max_col + 1):
+            row_extra_data.append(row.get(c, ''))
+
+        key = (summary, category, sentiment)
+        if key not in groups:
+            if category not in category_order:
+                category_order.append(category)
+            group_order.append(key)
+            groups[key] = {
+                'summary': summary,
+                'category': category,
+                'sentiment': sentiment,
+                'user_count': 0,
+                'data_rows': []
+            }
+        groups[key]['user_count'] += 1
+        groups[key]['data_rows'].append(row_extra_data)
+
+    result_list = []
+    for cat in category_order:
+        cat_groups = [k for k in group_order if k[1] == cat]
+        for key in cat_groups:
+            group = groups[key]
+            user_pct = (group['user_count'] / total_real_rows * 100) if total_real_rows > 0 else 0
+            result_list.append({
+                'summary': group['summary'],
+                'category': group['category'],
+                'sentiment': group['sentiment'],
+                'user_count': group['user_count'],
+                'user_pct': f"{user_pct:.2f}%",
+                'data_rows': group['data_rows']
+            })
+    return result_list
+
+
+def make_feedback_dataframe(rows, cols, seed=0):
+    """生成测试数据：文本、整数、浮点、日期列混合，约10%为空值"""
+    rng = np.random.RandomState(seed)
+    data = {}
+    for col in range(cols):
+        kind = col % 4
+        if kind == 0:
+            values = pd.Series([f'反馈内容{n}：加载太慢，经常报错' for n in rng.randint(0, 5000, rows)], dtype=object)
+        elif kind == 1:
+            values = pd.Series(rng.randint(0, 100000, rows), dtype=object)
+        elif kind == 2:
+            values = pd.Series(rng.rand(rows) * 100)
+        else:
+            values = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.randint(0, 86400 * 365, rows), unit='s'))
+        values[rng.rand(rows) < 0.1] = None
+        data[f'列{col}'] = values
+    return pd.DataFrame(data)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_dataframe_to_celldata(rows, cols):
+    df = make_feedback_dataframe(rows, cols)
+    print(f"[Benchmark] DataFrame -> celldata: {rows} 行 × {cols} 列")
+    legacy, legacy_time = timed(legacy_dataframe_to_celldata, df)
+    current, current_time = timed(dataframe_to_celldata, df)
+    assert current == legacy, "输出与原实现不一致"
+    print(f"  原实现: {legacy_time:.2f}s  新实现: {current_time:.2f}s  加速: {legacy_time / current_time:.1f}x  单元格数: {len(current)}")
+
+
+def make_stats_rows(rows, seed=0):
+    """生成统计重算的输入：细粒度的问题标题（约 rows/5 个）分布在约 rows/50 个类别中"""
+    rng = np.random.RandomState(seed)
+    categories = max(1, rows // 50)
+    titles = max(1, rows // 5)
+    sentiments = ['负面😞', '中性😐', '正面😊']
+    rows_data = {}
+    for r, title in enumerate(rng.randint(0, titles, rows), start=1):
+        rows_data[r] = {0: f'问题{title}', 1: f'类别{title % categories}', 2: sentiments[title % 3], 3: f'反馈{r}'}
+    return rows_data
+
+
+def bench_group_rows(rows):
+    rows_data = make_stats_rows(rows)
+    print(f"[Benchmark] 统计重算分组: {rows} 行")
+    legacy, legacy_time = timed(legacy_group_rows, rows_data, 3)
+    current, current_time = timed(group_rows, rows_data, 3)
+    assert current == legacy, "分组结果与原实现不一致"
+    print(f"  原实现: {legacy_time:.2f}s  新实现: {current_time:.2f}s  加速: {legacy_time / current_time:.1f}x  分组数: {len(current)}")
+
+
+def bench_compact_sheet(rows, cols):
+    df = make_feedback_dataframe(rows, cols)
+    print(f"[Benchmark] 标准格式 vs 紧凑格式: {rows} 行 × {cols} 列")
+    standard, standard_time = timed(lambda: json.dumps({'celldata': dataframe_to_celldata(df)}, ensure_ascii=False))
+    compact, compact_time = timed(lambda: json.dumps(dataframe_to_compact(df), ensure_ascii=False))
+    assert expand_sheet(json.loads(compact))['celldata'] == json.loads(standard)['celldata'], "紧凑格式还原后不一致"
+    print(f"  标准格式: {standard_time:.2f}s {len(standard) / 1e6:.1f}MB  "
+          f"紧凑格式: {compact_time:.2f}s {len(compact) / 1e6:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VOC分析工具性能基准')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--cols', type=int, default=20)
+    args = parser.parse_args()
+    bench_dataframe_to_celldata(args.rows, args.cols)
+    bench_compact_sheet(args.rows, args.cols)
+    bench_group_rows(args.rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# 分析任务断点（SQLite）：每行的分析结果在完成时立即写入，任务被终止或超时后可从断点继续，已完成的行不再调用AI
+# 任务键 = sha256(fileId + 反馈列 + Prompt版本 + 全部反馈文本)，表格内容变化后自动视为新任务
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class CheckpointStore:
+    def __init__(self, db_path, ttl_days=7):
+        self.db_path = db_path
+        self.ttl = max(0.0, float(ttl_days)) * 86400
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoint_jobs (
+                job_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoint_rows (
+                job_key TEXT NOT NULL,
+                row_idx INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (job_key, row_idx)
+            )
+        """)
+        self._conn.commit()
+        self._purge_expired()
+        print(f"[Checkpoint] 分析断点已启用: {db_path}（保留 {ttl_days} 天）")
+
+    @staticmethod
+    def make_key(file_id, feedback_col, prompt_version, texts):
+        """生成任务键：同一文件、同一反馈列且内容未变时键相同"""
+        digest = hashlib.sha256()
+        digest.update(f"{file_id}\x1f{feedback_col}\x1f{prompt_version}".encode('utf-8'))
+        for text in texts:
+            digest.update(b'\x1e')
+            digest.update(str(text).encode('utf-8'))
+        return digest.hexdigest()
+
+    def start(self, job_key, file_id, total, resume=False):
+        """开始一个任务
+
+        Args:
+            resume: True 时保留已有的断点；否则清空，从头开始
+
+        Returns:
+            dict: {行下标: 分析结果列表}，已完成的行（resume=False 时为空）
+        """
+        now = time.time()
+        with self._lock:
+            if not resume:
+                self._conn.execute('DELETE FROM checkpoint_rows WHERE job_key = ?', (job_key,))
+            self._conn.execute(
+                """INSERT INTO checkpoint_jobs (job_key, file_id, total, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(job_key) DO UPDATE SET updated_at = excluded.updated_at""",
+                (job_key, str(file_id), int(total), now)
+            )
+            self._conn.commit()
+            if not resume:
+                return {}
+            rows = self._conn.execute(
+                'SELECT row_idx, result FROM checkpoint_rows WHERE job_key = ?', (job_key,)
+            ).fetchall()
+        return {row_idx: json.loads(result) for row_idx, result in rows}
+
+    def save(self, job_key, results):
+        """写入一批已完成的行
+
+        Args:
+            results: [(行下标, 分析结果列表), ...]
+        """
+        if not results:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO checkpoint_rows (job_key, row_idx, result) VALUES (?, ?, ?)',
+                [(job_key, int(row_idx), json.dumps(result, ensure_ascii=False)) for row_idx, result in results]
+            )
+            self._conn.execute('UPDATE checkpoint_jobs SET updated_at = ? WHERE job_key = ?', (time.time(), job_key))
+            self._conn.commit()
+
+    def _purge_expired(self):
+        """删除超过保留期未更新的任务"""
+        if not self.ttl:
+            return
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                'SELECT job_key FROM checkpoint_jobs WHERE updated_at < ?', (cutoff,)
+            ).fetchall()]
+            for job_key in expired:
+                self._conn.execute('DELETE FROM checkpoint_rows WHERE job_key = ?', (job_key,))
+                self._conn.execute('DELETE FROM checkpoint_jobs WHERE job_key = ?', (job_key,))
+            self._conn.commit()
+        if expired:
+            print(f"[Checkpoint] 已清理 {len(expired)} 个过期的分析断点")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
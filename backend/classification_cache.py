@@ -0,0 +1,120 @@
+# 分类结果持久化缓存（SQLite）
+# 键 = sha256(Prompt版本 + 模型名称 + 归一化规则版本 + 归一化后的反馈文本)，同一文本重复分析时无需再次调用AI
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from text_utils import NORMALIZE_VERSION, normalize_text
+
+
+class ClassificationCache:
+    def __init__(self, db_path, max_entries=100000):
+        self.db_path = db_path
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications(last_used)')
+        self._conn.commit()
+        print(f"[Cache] 分类缓存已启用: {db_path}（上限 {self.max_entries} 条）")
+
+    @staticmethod
+    def make_key(text, prompt_version, model):
+        """生成内容寻址的缓存键；归一化后为空的文本（纯标点/空白）不缓存，返回None"""
+        normalized = normalize_text(text)
+        if not normalized:
+            return None
+        raw = f"{prompt_version}\x1f{model}\x1f{NORMALIZE_VERSION}\x1f{normalized}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text, prompt_version, model):
+        """读取单条缓存，未命中返回None"""
+        return self.get_many([text], prompt_version, model).get(0)
+
+    def get_many(self, texts, prompt_version, model):
+        """批量读取缓存
+
+        Returns:
+            dict: {输入下标: 分类结果列表}，只包含命中的条目
+        """
+        keys = [self.make_key(text, prompt_version, model) for text in texts]
+        lookup = [key for key in keys if key is not None]
+        if not lookup:
+            return {}
+
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for start in range(0, len(lookup), 500):
+                chunk = lookup[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, result FROM classifications WHERE key IN ({placeholders})', chunk
+                ).fetchall()
+                for key, result in rows:
+                    found[key] = json.loads(result)
+            if found:
+                # 更新最近使用时间，供LRU淘汰使用
+                self._conn.executemany(
+                    'UPDATE classifications SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        return {i: found[key] for i, key in enumerate(keys) if key in found}
+
+    def put(self, text, prompt_version, model, result):
+        """写入一条分类结果"""
+        key = self.make_key(text, prompt_version, model)
+        if key is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO classifications (key, text, model, prompt_version, result, created_at, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET result = excluded.result, last_used = excluded.last_used""",
+                (key, str(text), model, prompt_version, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 100:
+                self._puts_since_evict = 0
+                self._evict_locked()
+
+    def _evict_locked(self):
+        """超出容量时按最近使用时间淘汰最旧的条目（调用方需持有锁）"""
+        count = self._conn.execute('SELECT COUNT(*) FROM classifications').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # 多淘汰10%，避免频繁触发
+        to_delete = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            """DELETE FROM classifications WHERE key IN (
+                   SELECT key FROM classifications ORDER BY last_used ASC LIMIT ?
+               )""",
+            (to_delete,)
+        )
+        self._conn.commit()
+        print(f"[Cache] 缓存超出上限，已淘汰 {to_delete} 条最久未使用的记录")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
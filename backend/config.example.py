@@ -12,5 +12,88 @@ HF_API_TOKEN = None  # 例如: "hf_xxxxxxxxxxxxxxxxxxxxx"
 TONGYI_API_KEY = None  # 例如: "sk-xxxxxxxxxxxxxxxxxxxxx"
 
 # 使用优先级（按顺序尝试）
-# 可选值: "hf_token", "tongyi", "hf_free", "local"
+# 可选值: "hf_token", "tongyi", "hf_free", "local", "local_model"
+# "local_model" 为本地训练的分类模型（见下方 LOCAL_MODEL_*），排在远程API之前时只有低置信度的反馈才调用远程API
 API_PRIORITY = ["hf_token", "tongyi", "hf_free", "local"]
+
+# ---------------- 性能调优（可选，不填写则使用默认值） ----------------
+
+# 分析时同时进行中的AI请求上限（单个事件循环内异步并发），1 表示逐行串行分析
+# 安装 httpx（pip install httpx）后使用原生异步HTTP客户端，否则在线程中执行同步请求
+ANALYSIS_CONCURRENCY = 4
+
+# 每个Prompt打包分析的反馈条数，1 表示逐条分析；
+# 设为 10 左右可将请求数与Prompt token消耗降低约 10 倍，批量结果中缺失的条目会自动单独重新分析
+ANALYSIS_BATCH_SIZE = 1
+
+# 分类结果持久化缓存（SQLite），同一反馈重复分析时直接复用结果，不再调用AI
+CLASSIFICATION_CACHE_ENABLED = True
+# CLASSIFICATION_CACHE_PATH = "/path/to/classification_cache.db"  # 默认位于 backend/ 目录下
+CLASSIFICATION_CACHE_MAX_ENTRIES = 100000  # 超出后按最近最少使用淘汰
+
+# 分析前合并重复反馈（全角/半角、空白、标点差异视为相同），每组只调用一次AI
+ANALYSIS_DEDUP_ENABLED = True
+# 近似重复合并阈值（0~1，MinHash 估计的字符相似度），0 表示只合并完全相同的反馈；建议 0.8
+ANALYSIS_DEDUP_NEAR_THRESHOLD = 0.0
+
+# AI接口的HTTP连接参数：整个分析过程复用长连接（连接池大小与 ANALYSIS_CONCURRENCY 一致）
+HTTP_CONNECT_TIMEOUT = 5   # 建立连接超时（秒）
+HTTP_READ_TIMEOUT = 30     # 等待响应超时（秒）
+HTTP2_ENABLED = False      # 启用HTTP/2需额外安装: pip install "httpx[http2]"
+
+# 自适应限流（每个AI服务独立，单位: 次/秒）：收到429时速率减半并遵守 Retry-After，成功后逐步回升
+RATE_LIMIT_INITIAL_RPS = 10
+RATE_LIMIT_MIN_RPS = 0.2
+RATE_LIMIT_MAX_RPS = 50
+# 熔断：端点连续失败达到次数后，冷却期内（秒）不再调用；503(模型加载中)按预计等待时间熔断
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 60
+
+# 失败的AI端点会被降级（后续行直接使用最近可用的端点），后台按此间隔（秒）重新探测，恢复后自动启用
+PROVIDER_PROBE_INTERVAL = 30
+
+# 响应压缩：按浏览器的 Accept-Encoding 协商 gzip；安装 brotli / zstandard（pip install brotli zstandard）后优先使用 br / zstd
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+
+# 服务端会话：上传文件解析后的表格保存在 backend/sessions/ 下（安装 pyarrow 后使用 Parquet），分析与统计重算通过 fileId 引用
+SESSION_MEMORY_ENTRIES = 8  # 内存中保留的会话数，其余按需从磁盘加载
+SESSION_TTL_DAYS = 7  # 超过该天数未更新的会话会从磁盘删除（0 表示不按时间清理）
+SESSION_MAX_DISK_ENTRIES = 200  # 磁盘上最多保留的会话数，超出后删除最久未更新的（0 表示不限）
+
+# 分析任务断点：每行的分析结果完成后立即保存（SQLite），终止或超时后以 resume 继续分析时已完成的行不再调用AI
+ANALYSIS_CHECKPOINT_ENABLED = True
+# ANALYSIS_CHECKPOINT_PATH = "/path/to/analysis_checkpoints.db"  # 默认位于 backend/ 目录下
+ANALYSIS_CHECKPOINT_TTL_DAYS = 7  # 超过该天数未更新的断点会被清理
+
+# 分析任务队列：固定数量的工作线程执行分析（每个任务内部仍按 ANALYSIS_CONCURRENCY 并发请求AI）
+JOB_WORKERS = 2        # 同时执行的分析任务数
+JOB_QUEUE_LIMIT = 16   # 排队任务上限，超出时新请求返回 429
+JOB_RETENTION = 600    # 已结束的任务保留秒数（可查询状态、重新订阅事件）
+
+# 分析完成后结果Sheet的构建与JSON序列化在子进程中执行，大表格收尾时其他请求（上传、进度推送）不被阻塞；0 表示在当前线程执行
+SHEET_PROCESS_WORKERS = 2
+
+# 本地分类模型：由分类缓存中的AI结果与用户修正（training_data.jsonl）训练，命令: python local_classifier.py train
+# 需在 API_PRIORITY 中加入 "local_model"；重新训练后运行中的服务自动加载新模型
+# LOCAL_MODEL_PATH = "/path/to/local_classifier.npz"  # 默认位于 backend/ 目录下
+LOCAL_MODEL_THRESHOLD = 0.8  # 置信度达到该值的反馈直接采用本地模型的结果
+
+# 分类体系与词表：TAXONOMY_DIR 下每个 *.json 文件定义一个分类体系（文件名即名称，格式见 backend/taxonomy.example.json），
+# 包含Prompt中的角色设定、判别规则、分类列表，以及本地规则分析的情绪/分类关键词；未配置时使用内置的 default
+# 文件修改后运行中的服务自动重新加载（执行中的任务不受影响）；分类体系的版本与内容参与分类缓存键，修改后旧的分类结果不会被复用
+# 分析请求可通过 taxonomy 参数选择分类体系，可用列表见 GET /api/taxonomies
+# TAXONOMY_DIR = "/path/to/taxonomies"  # 默认为 backend/taxonomies/
+TAXONOMY_DEFAULT = "default"
+
+# 生成分析结果Sheet前合并相近的分组（如模型给同一问题的标题措辞略有不同："加载速度慢" / "加载速度太慢"）
+# 按问题标题及组内反馈的字符 n-gram 向量聚类，只合并同一问题归类下的分组，合并后使用行数最多的分组的标题；0 表示不合并，建议 0.75~0.85
+ANALYSIS_GROUP_MERGE_THRESHOLD = 0
+ANALYSIS_GROUP_MERGE_MEMORY_MB = 64  # 聚类的内存预算（MB），与数据行数无关
+
+# 分析流程："per_row" 为每条（去重后的）反馈调用一次AI；
+# "cluster" 为两阶段分析：先在本地按字符 n-gram 相似度将反馈聚类，每簇只把代表样本发给AI得到分类、情绪与问题总标题，再分发给簇内所有行
+# （5万行的导出通常只需几百次调用）；分析请求也可通过 pipeline 参数指定
+ANALYSIS_PIPELINE = "per_row"
+ANALYSIS_CLUSTER_THRESHOLD = 0.7  # 并入同一簇的最小相似度（0~1），越大簇越多、越精细
+ANALYSIS_CLUSTER_SAMPLES = 5      # 每簇发给AI的代表样本数
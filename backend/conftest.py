@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from rate_limit import CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None, text=None):
+        self.status_code = status_code
+        self._body = body
+        self.headers = headers or {}
+        self.text = text if text is not None else str(body)
+        self.content = self.text.encode()
+
+    def json(self):
+        if isinstance(self._body, Exception):
+            raise self._body
+        return self._body
+
+
+class FakeTransport:
+    """按URL返回预设响应（列表依次返回，最后一个重复使用）"""
+
+    def __init__(self, responses):
+        self.responses = {url: list(items) for url, items in responses.items()}
+        self.calls = []
+
+    async def apost(self, url, headers=None, json=None):
+        self.calls.append(url)
+        items = self.responses[url]
+        return items.pop(0) if len(items) > 1 else items[0]
+
+    def post(self, url, headers=None, json=None):
+        return asyncio.run(self.apost(url, headers, json))
+
+
+@pytest.fixture
+def analyzer():
+    from voc_analyzer import VOCAnalyzer
+    analyzer = VOCAnalyzer()
+    analyzer.cache = None
+    analyzer.checkpoints = None
+    analyzer.api_priority = ["hf_free", "local"]
+    analyzer.hf_free_api_urls = ["http://a.test", "http://b.test"]
+    analyzer.circuit_breaker = CircuitBreaker(failure_threshold=1, cooldown=0.01)
+    return analyzer
+
+
+@pytest.fixture
+def fake_response():
+    return FakeResponse
+
+
+@pytest.fixture
+def fake_transport():
+    return FakeTransport
@@ -0,0 +1,94 @@
+# 分析前的反馈去重：相同/近似的反馈只需分析一次，结果分发给同组的其他行
+import zlib
+
+import numpy as np
+
+from text_utils import normalize_text
+
+# MinHash 参数：64 个哈希函数，LSH 分为 16 段、每段 4 行
+_NUM_PERM = 64
+_LSH_BANDS = 16
+_LSH_ROWS = _NUM_PERM // _LSH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, 1 << 31, size=_NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=_NUM_PERM).astype(np.uint64)
+
+
+def _shingles(text, size=2):
+    """字符 n-gram（中文短文本用 2-gram 效果较好）"""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(normalized_text):
+    """计算归一化文本的 MinHash 签名"""
+    hashes = np.array(
+        [zlib.crc32(s.encode('utf-8')) for s in _shingles(normalized_text)],
+        dtype=np.uint64
+    )
+    # (a * x + b) mod p，对每个哈希函数取最小值
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def group_duplicates(texts, near_threshold=None):
+    """将反馈按重复关系分组
+
+    Args:
+        texts: 反馈文本列表
+        near_threshold: 近似重复的 Jaccard 相似度阈值（0~1），为空或 <= 0 时只合并完全相同的文本
+
+    Returns:
+        list[list[int]]: 每组的行下标列表，组内与组间都保持首次出现顺序，组的第一个元素为代表行
+    """
+    # 1. 归一化后完全相同的文本；归一化后为空（空白、纯标点）的行单独成组，不与任何行合并
+    exact_groups = {}
+    for idx, text in enumerate(texts):
+        exact_groups.setdefault(normalize_text(text) or idx, []).append(idx)
+    groups = list(exact_groups.values())
+    keys = [key if isinstance(key, str) else '' for key in exact_groups]
+
+    if not near_threshold or near_threshold <= 0 or len(groups) < 2:
+        return groups
+
+    # 2. MinHash + LSH 找出近似重复的候选组，再用估计的相似度确认
+    parent = list(range(len(groups)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    signatures = [minhash_signature(key) if key else None for key in keys]
+    buckets = {}
+    for group_idx, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        for band in range(_LSH_BANDS):
+            band_key = (band, signature[band * _LSH_ROWS:(band + 1) * _LSH_ROWS].tobytes())
+            buckets.setdefault(band_key, []).append(group_idx)
+
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        first = members[0]
+        for other in members[1:]:
+            root_a, root_b = find(first), find(other)
+            if root_a == root_b:
+                continue
+            similarity = float(np.mean(signatures[first] == signatures[other]))
+            if similarity >= near_threshold:
+                # 保留较早出现的组作为根，代表行即为最早出现的那一行
+                if root_a < root_b:
+                    parent[root_b] = root_a
+                else:
+                    parent[root_a] = root_b
+
+    merged = {}
+    for group_idx, members in enumerate(groups):
+        merged.setdefault(find(group_idx), []).extend(members)
+    return [sorted(members) for _, members in sorted(merged.items())]
@@ -0,0 +1,35 @@
+# 分组工具：分析结果Sheet（VOCAnalyzer.generate_analysis_sheet）与统计重算（stats_engine）共用
+# 基于 dict 的插入顺序实现稳定的“首次出现顺序”，整体为线性时间
+
+
+def group_in_order(items, key, section=None):
+    """按 key 分组，分组按首次出现的顺序排列
+
+    Args:
+        items: 待分组的元素
+        key: 元素 -> 分组键
+        section: 可选，分组键 -> 所属的段（如问题归类）。指定后同段的分组排在一起，
+                 段按首次出现顺序排列，段内仍按分组首次出现顺序
+
+    Returns:
+        [(分组键, [元素, ...]), ...]
+    """
+    groups = {}
+    for item in items:
+        group_key = key(item)
+        members = groups.get(group_key)
+        if members is None:
+            groups[group_key] = members = []
+        members.append(item)
+
+    if section is None:
+        return list(groups.items())
+
+    sections = {}
+    for group_key, members in groups.items():
+        section_key = section(group_key)
+        pairs = sections.get(section_key)
+        if pairs is None:
+            sections[section_key] = pairs = []
+        pairs.append((group_key, members))
+    return [pair for pairs in sections.values() for pair in pairs]
@@ -0,0 +1,185 @@
+# 分析任务调度：固定数量的工作线程 + 优先级队列（同优先级先进先出）+ 准入控制
+# - 排队任务数达到上限时拒绝新任务（SchedulerFull，对应 HTTP 429），不会无限制地创建线程
+# - 每个任务的事件（进度、逐行结果、完成/错误）按顺序保存在任务中，SSE 断开后可从指定位置重新订阅
+# - 同一文件同时只有一个有效任务：提交新任务时终止旧任务
+import itertools
+import queue
+import threading
+import time
+import uuid
+
+
+class SchedulerFull(Exception):
+    """排队任务已满（429）"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.status = 429
+        self.retry_after = retry_after
+
+
+class Job:
+    FINISHED = ('completed', 'failed', 'cancelled')
+
+    def __init__(self, job_id, file_id, priority, run):
+        """
+        Args:
+            priority: 数值越大越先执行
+            run: run(job)，在工作线程中执行；通过 job.emit 发送事件，并设置 job.result 或 job.error
+        """
+        self.id = job_id
+        self.file_id = file_id
+        self.priority = priority
+        self.run = run
+        self.status = 'queued'      # queued / running / completed / failed / cancelled
+        self.stop_flag = threading.Event()
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []            # [(事件类型, *参数)]，以 ('done', None) 结束
+        self._cond = threading.Condition()
+
+    def emit(self, event_type, *args):
+        with self._cond:
+            self.events.append((event_type, *args))
+            self._cond.notify_all()
+
+    def events_since(self, start, timeout=0.5):
+        """返回第 start 个之后的事件，暂无新事件时最多等待 timeout 秒"""
+        with self._cond:
+            if len(self.events) <= start:
+                self._cond.wait(timeout)
+            return self.events[start:]
+
+    def info(self):
+        return {
+            'jobId': self.id,
+            'fileId': self.file_id,
+            'status': self.status,
+            'priority': self.priority,
+            'error': self.error,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'events': len(self.events)
+        }
+
+
+class JobScheduler:
+    def __init__(self, workers=2, max_queued=16, retention=600):
+        """
+        Args:
+            workers: 同时执行的任务数
+            max_queued: 排队中（未开始）的任务上限，超出时拒绝新任务
+            retention: 已结束的任务保留多少秒（供查询状态与重新订阅事件）
+        """
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.retention = retention
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs = {}         # {jobId: Job}
+        self._active = {}       # {fileId: Job}，每个文件当前有效的任务
+        self._queued = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f'analysis-worker-{i}', daemon=True).start()
+        print(f"[Jobs] 任务调度已启动：{self.workers} 个工作线程，最多 {self.max_queued} 个排队任务")
+
+    def submit(self, file_id, run, priority=0):
+        """提交任务，排队已满时抛出 SchedulerFull"""
+        with self._lock:
+            self._purge_locked()
+            previous = self._active.get(file_id)
+            if self._queued - (previous is not None and previous.status == 'queued') >= self.max_queued:
+                raise SchedulerFull(f'当前排队的分析任务已达上限（{self.max_queued} 个），请稍后重试')
+            if previous is not None:
+                print(f"[Jobs] 文件 {file_id} 提交了新任务，终止旧任务 {previous.id}")
+                self._cancel_locked(previous)
+            job = Job(uuid.uuid4().hex, file_id, priority, run)
+            self._jobs[job.id] = job
+            self._active[file_id] = job
+            self._queued += 1
+            # 排队任务数超过空闲线程数时需要等待（按提交顺序粗略估计，不考虑优先级）
+            waiting = self._queued > self.workers - self._running
+            ahead = self._queued - 1
+            self._queue.put((-priority, next(self._seq), job))
+        if waiting:
+            job.emit('progress', 0, 100, f'排队中（前面还有 {ahead} 个任务）...')
+        print(f"[Jobs] 提交任务 {job.id}（文件 {file_id}，优先级 {priority}）")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self, file_id):
+        """文件当前排队或执行中的任务"""
+        with self._lock:
+            job = self._active.get(file_id)
+            return job if job is not None and job.status not in Job.FINISHED else None
+
+    def cancel(self, job_id):
+        """终止任务，任务不存在时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cancel_locked(job)
+            return job
+
+    def _cancel_locked(self, job):
+        job.stop_flag.set()
+        if job.status == 'queued':
+            # 尚未开始的任务直接结束，工作线程取出时跳过
+            self._queued -= 1
+            self._finish_locked(job, 'cancelled')
+            job.error = '分析被用户终止'
+            job.emit('error', job.error)
+            job.emit('done', None)
+
+    def _finish_locked(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        if self._active.get(job.file_id) is job:
+            del self._active[job.file_id]
+
+    def _purge_locked(self):
+        """删除超过保留期的已结束任务"""
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in Job.FINISHED and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                if job.status != 'queued':
+                    continue
+                job.status = 'running'
+                job.started_at = time.time()
+                self._queued -= 1
+                self._running += 1
+            print(f"[Jobs] 开始执行任务 {job.id}（排队 {job.started_at - job.created_at:.1f} 秒）")
+            try:
+                job.run(job)
+            except Exception as e:
+                print(f"[Jobs] 任务 {job.id} 异常: {e}")
+                job.error = f'分析失败: {e}'
+                job.emit('error', job.error)
+            finally:
+                if job.error is None:
+                    status = 'completed'
+                elif job.stop_flag.is_set():
+                    status = 'cancelled'
+                else:
+                    status = 'failed'
+                with self._lock:
+                    self._running -= 1
+                    self._finish_locked(job, status)
+                job.emit('done', None)
+                print(f"[Jobs] 任务 {job.id} 结束: {status}")
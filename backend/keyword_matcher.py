@@ -0,0 +1,104 @@
+# 多关键词匹配（Aho-Corasick 自动机）：本地规则分析（情绪与分类关键词）共用
+# 所有词表编译为一个自动机，每条文本只扫描一遍即可得到各标签的得分；score_many 一次计算整列文本
+from collections import deque
+
+import numpy as np
+
+
+class KeywordMatcher:
+    def __init__(self, lexicons):
+        """
+        Args:
+            lexicons: {标签: [关键词, ...]}，按顺序排列
+                - 标签的得分为文本中出现的关键词个数（与逐个 `kw in text` 计数一致：
+                  同一关键词在列表中重复出现时按重复次数计分，可同时属于多个标签）
+        """
+        self.labels = list(lexicons)
+        keyword_weights = {}    # {关键词: {标签下标: 次数}}
+        for label_idx, keywords in enumerate(lexicons.values()):
+            for keyword in keywords:
+                if not keyword:
+                    continue
+                weights = keyword_weights.setdefault(keyword, {})
+                weights[label_idx] = weights.get(label_idx, 0) + 1
+        self.keywords = list(keyword_weights)
+        self._keyword_labels = [tuple(keyword_weights[keyword].items()) for keyword in self.keywords]
+        # 关键词 × 标签的计分矩阵（score_many 使用）
+        self._weights = np.zeros((len(self.keywords), len(self.labels)), dtype=np.int32)
+        for keyword_id, keyword_labels in enumerate(self._keyword_labels):
+            for label_idx, weight in keyword_labels:
+                self._weights[keyword_id, label_idx] = weight
+        self._build(self.keywords)
+
+    def _build(self, keywords):
+        """构建 goto / fail / output 表"""
+        goto = [{}]
+        output = [[]]
+        for keyword_id, keyword in enumerate(keywords):
+            node = 0
+            for ch in keyword:
+                next_node = goto[node].get(ch)
+                if next_node is None:
+                    goto.append({})
+                    output.append([])
+                    next_node = len(goto) - 1
+                    goto[node][ch] = next_node
+                node = next_node
+            output[node].append(keyword_id)
+
+        # 按层次遍历计算失配指针，并合并后缀节点的输出
+        fail = [0] * len(goto)
+        pending = deque(goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, next_node in goto[node].items():
+                pending.append(next_node)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fallback = goto[state].get(ch, 0)
+                fail[next_node] = fallback if fallback != next_node else 0
+                output[next_node] = output[next_node] + output[fail[next_node]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = [tuple(ids) for ids in output]
+
+    def find(self, text):
+        """文本中出现的关键词（关键词下标集合）"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = set()
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+    def scores(self, text):
+        """各标签的得分列表（与 labels 顺序一致）"""
+        counts = [0] * len(self.labels)
+        for keyword_id in self.find(text):
+            for label_idx, weight in self._keyword_labels[keyword_id]:
+                counts[label_idx] += weight
+        return counts
+
+    def score_many(self, texts):
+        """整列文本的得分矩阵 (len(texts), len(labels))"""
+        if not self.labels:
+            return np.zeros((len(texts), 0), dtype=np.int32)
+        # 收集 (行, 关键词) 命中对，最后一次性累加
+        rows = []
+        keyword_ids = []
+        for row, text in enumerate(texts):
+            found = self.find(text)
+            rows.extend([row] * len(found))
+            keyword_ids.extend(found)
+        rows = np.asarray(rows, dtype=np.int64)
+        hit_weights = self._weights[np.asarray(keyword_ids, dtype=np.int64)]
+        return np.stack([
+            np.bincount(rows, weights=hit_weights[:, label_idx], minlength=len(texts))
+            for label_idx in range(len(self.labels))
+        ], axis=1).astype(np.int32)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""本地分类模型：字符 n-gram 哈希 TF-IDF + softmax 线性模型（NumPy）
+
+由历史AI分类结果（分类缓存）与用户修正（/api/log_feedback 记录的 training_data.jsonl）训练，
+在 API_PRIORITY 中加入 "local_model" 后，高置信度的反馈直接由本地模型给出分类与情绪，其余再调用远程API。
+
+用法:
+    python local_classifier.py train                       # 使用默认的缓存与修正记录，保存到 LOCAL_MODEL_PATH
+    python local_classifier.py train --holdout 0.1 --epochs 20
+    python local_classifier.py train --taxonomy shop        # 只使用分类体系 shop 的分类结果（见 taxonomy.py）
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from ngram_features import HashedNgramVectorizer
+from settings import get_setting
+from text_utils import normalize_text
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_MODEL_PATH = get_setting('LOCAL_MODEL_PATH', os.path.join(BACKEND_DIR, 'local_classifier.npz'))
+
+SENTIMENTS = ('正面😊', '负面😠', '中性😐')
+
+
+def normalize_sentiment(sentiment):
+    """统一情绪标签（AI返回的表情可能不同）"""
+    text = str(sentiment or '')
+    if '正面' in text:
+        return '正面😊'
+    if '负面' in text:
+        return '负面😠'
+    return '中性😐'
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train_softmax(X, y, n_classes, sample_weight=None, epochs=15, batch_size=256, lr=0.05, l2=1e-6, seed=0):
+    """小批量 Adam 训练多分类 softmax 线性模型
+    - 每批只更新出现过的特征维度（稀疏的惰性 Adam），训练耗时与非零元素数成正比
+
+    Returns:
+        (weights (n_features, n_classes), bias (n_classes,))
+    """
+    n_samples = len(X)
+    weights = np.zeros((X.n_features, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes)
+    m_w, v_w = np.zeros_like(weights), np.zeros_like(weights)
+    m_b, v_b = np.zeros_like(bias), np.zeros_like(bias)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    sample_weight = np.ones(n_samples) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    rng = np.random.RandomState(seed)
+    step = 0
+
+    for _ in range(epochs):
+        order = rng.permutation(n_samples)
+        for start in range(0, n_samples, batch_size):
+            batch = order[start:start + batch_size]
+            X_batch = X.rows(batch)
+            probs = _softmax(X_batch.dot(weights) + bias)
+            # 交叉熵对 logits 的梯度，按样本权重加权平均
+            grad_logits = probs
+            grad_logits[np.arange(len(batch)), y[batch]] -= 1
+            batch_weight = sample_weight[batch]
+            grad_logits *= (batch_weight / batch_weight.sum())[:, None]
+
+            features, inverse = np.unique(X_batch.indices, return_inverse=True)
+            contributions = X_batch.data[:, None] * grad_logits[X_batch.row_ids()]
+            grad_w = np.stack([
+                np.bincount(inverse, weights=contributions[:, k], minlength=len(features))
+                for k in range(n_classes)
+            ], axis=1) + l2 * weights[features]
+            grad_b = grad_logits.sum(axis=0)
+
+            step += 1
+            correction1 = 1 - beta1 ** step
+            correction2 = 1 - beta2 ** step
+            m_w[features] = beta1 * m_w[features] + (1 - beta1) * grad_w
+            v_w[features] = beta2 * v_w[features] + (1 - beta2) * grad_w * grad_w
+            weights[features] -= lr * (m_w[features] / correction1) / (np.sqrt(v_w[features] / correction2) + eps)
+            m_b = beta1 * m_b + (1 - beta1) * grad_b
+            v_b = beta2 * v_b + (1 - beta2) * grad_b * grad_b
+            bias -= lr * (m_b / correction1) / (np.sqrt(v_b / correction2) + eps)
+
+    return weights, bias
+
+
+class LocalClassifier:
+    HEADS = ('category', 'sentiment')
+
+    def __init__(self, vectorizer, heads, meta=None):
+        """
+        Args:
+            heads: {'category' | 'sentiment': (标签列表, weights, bias)}
+            meta: 训练信息（样本数、训练时间等）
+        """
+        self.vectorizer = vectorizer
+        self.heads = heads
+        self.meta = meta or {}
+
+    @classmethod
+    def train(cls, samples, n_features=1 << 18, ngram_range=(1, 3), min_label_count=2, **train_options):
+        """训练模型
+
+        Args:
+            samples: [(文本, 分类或None, 情绪或None, 样本权重), ...]
+            min_label_count: 样本数少于该值的分类不参与训练
+        """
+        texts = [sample[0] for sample in samples]
+        vectorizer = HashedNgramVectorizer(n_features, ngram_range).fit(texts)
+        X = vectorizer.transform(texts)
+        weights = np.array([sample[3] for sample in samples], dtype=np.float64)
+
+        heads = {}
+        for head_idx, head in enumerate(cls.HEADS, start=1):
+            labels = [sample[head_idx] for sample in samples]
+            counts = {}
+            for label in labels:
+                if label:
+                    counts[label] = counts.get(label, 0) + 1
+            classes = sorted(label for label, count in counts.items() if count >= min_label_count)
+            if len(classes) < 2:
+                raise ValueError(f'训练样本不足：{head} 至少需要2个类别且每类至少 {min_label_count} 条样本')
+            class_index = {label: i for i, label in enumerate(classes)}
+            rows = np.array([i for i, label in enumerate(labels) if label in class_index], dtype=np.int64)
+            y = np.array([class_index[labels[i]] for i in rows], dtype=np.int64)
+            W, b = train_softmax(X.rows(rows), y, len(classes), weights[rows], **train_options)
+            heads[head] = (classes, W, b)
+            print(f"[Local Model] {head}: {len(rows)} 条样本，{len(classes)} 个类别")
+
+        meta = {'samples': len(samples), 'trained_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+        return cls(vectorizer, heads, meta)
+
+    def predict(self, texts):
+        """预测分类与情绪
+
+        Returns:
+            [{'category', 'sentiment', 'confidence'}, ...]，confidence 取两者概率中较小的一个
+        """
+        if not texts:
+            return []
+        X = self.vectorizer.transform(texts)
+        outputs = {}
+        for head, (classes, W, b) in self.heads.items():
+            probs = _softmax(X.dot(W) + b)
+            best = probs.argmax(axis=1)
+            outputs[head] = ([classes[i] for i in best], probs[np.arange(len(texts)), best])
+        categories, category_conf = outputs['category']
+        sentiments, sentiment_conf = outputs['sentiment']
+        confidence = np.minimum(category_conf, sentiment_conf)
+        return [
+            {'category': category, 'sentiment': sentiment, 'confidence': float(conf)}
+            for category, sentiment, conf in zip(categories, sentiments, confidence)
+        ]
+
+    def save(self, path):
+        arrays = {
+            'n_features': np.array(self.vectorizer.n_features),
+            'ngram_range': np.array(self.vectorizer.ngram_range),
+            'idf': self.vectorizer.idf,
+            'meta': np.array(json.dumps(self.meta, ensure_ascii=False))
+        }
+        for head, (classes, W, b) in self.heads.items():
+            arrays[f'{head}_labels'] = np.array(classes)
+            arrays[f'{head}_weights'] = W
+            arrays[f'{head}_bias'] = b
+        # 先写临时文件再替换，运行中的服务不会读到不完整的模型
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            vectorizer = HashedNgramVectorizer(
+                int(arrays['n_features']), tuple(arrays['ngram_range'].tolist()), arrays['idf']
+            )
+            heads = {
+                head: (arrays[f'{head}_labels'].tolist(), arrays[f'{head}_weights'], arrays[f'{head}_bias'])
+                for head in cls.HEADS
+            }
+            meta = json.loads(str(arrays['meta']))
+        return cls(vectorizer, heads, meta)
+
+
+class LocalModelLoader:
+    """按需加载模型文件，文件更新（重新训练）后自动重新加载；多个分析任务共享"""
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._model = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """返回当前模型，模型文件不存在或加载失败时返回None"""
+        now = time.time()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._model
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                self._model, self._mtime = None, None
+                return None
+            if mtime != self._mtime:
+                try:
+                    self._model = LocalClassifier.load(self.path)
+                    print(f"[Local Model] 已加载本地模型: {self.path}（{self._model.meta}）")
+                except Exception as e:
+                    print(f"[Local Model] 加载失败: {e}")
+                    self._model = None
+                self._mtime = mtime
+            return self._model
+
+
+def _label_suffix(label):
+    """分类的问题标题部分（与 voc_analyzer.split_summary 一致）"""
+    parts = [p.strip() for p in re.split(r'[-—]', str(label), maxsplit=1)]
+    return parts[1] if len(parts) == 2 and parts[0] and parts[1] else str(label).strip()
+
+
+def load_training_samples(cache_path, feedback_path, prompt_version=None, correction_weight=2.0):
+    """读取训练样本
+
+    Args:
+        cache_path: 分类缓存（SQLite），其中的AI分类结果作为标注
+        feedback_path: 用户修正记录（training_data.jsonl），覆盖同一反馈的AI分类
+        prompt_version: 只使用该Prompt版本的缓存结果，为空时使用全部
+        correction_weight: 用户修正的样本权重倍数（再乘以记录中的 confidence_weight）
+
+    Returns:
+        [(文本, 分类或None, 情绪或None, 样本权重), ...]
+    """
+    samples = {}     # {归一化文本: [文本, 分类, 情绪, 权重]}
+
+    if cache_path and os.path.exists(cache_path):
+        conn = sqlite3.connect(cache_path)
+        try:
+            query = 'SELECT text, result FROM classifications'
+            params = ()
+            if prompt_version:
+                query += ' WHERE prompt_version = ?'
+                params = (prompt_version,)
+            for text, result in conn.execute(query, params):
+                try:
+                    opinion = json.loads(result)[0]
+                except (ValueError, IndexError, KeyError, TypeError):
+                    continue
+                category = opinion.get('summary') or opinion.get('category')
+                key = normalize_text(text)
+                if key and category:
+                    samples[key] = [text, category, normalize_sentiment(opinion.get('sentiment')), 1.0]
+        finally:
+            conn.close()
+    print(f"[Local Model] 分类缓存中的AI标注: {len(samples)} 条")
+
+    corrections = 0
+    if feedback_path and os.path.exists(feedback_path):
+        known = {}
+        for _, category, _, _ in samples.values():
+            known.setdefault(category, category)
+            known.setdefault(_label_suffix(category), category)
+        with open(feedback_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                text = record.get('voc_text')
+                label = record.get('inferred_label')
+                if not text or text == 'Unknown' or not label:
+                    continue
+                # 表格中的标签可能只是问题标题，映射回完整分类
+                category = known.get(label, label)
+                weight = correction_weight * float(record.get('confidence_weight') or 1.0)
+                key = normalize_text(text)
+                if not key:
+                    continue
+                if key in samples:
+                    samples[key][1] = category
+                    samples[key][3] = max(samples[key][3], weight)
+                else:
+                    samples[key] = [text, category, None, weight]
+                corrections += 1
+    print(f"[Local Model] 用户修正: {corrections} 条")
+
+    return [tuple(sample) for sample in samples.values()]
+
+
+def _evaluate(model, samples, threshold):
+    """留出集评估：整体准确率，以及置信度达到阈值的覆盖率与准确率"""
+    labeled = [sample for sample in samples if sample[1] and sample[2]]
+    if not labeled:
+        return
+    predictions = model.predict([sample[0] for sample in labeled])
+    correct = np.array([p['category'] == s[1] and p['sentiment'] == s[2] for p, s in zip(predictions, labeled)])
+    confident = np.array([p['confidence'] >= threshold for p in predictions])
+    print(f"[Local Model] 留出集 {len(labeled)} 条：准确率 {correct.mean():.1%}；"
+          f"置信度 ≥ {threshold} 的覆盖率 {confident.mean():.1%}，"
+          f"准确率 {correct[confident].mean() if confident.any() else 0:.1%}")
+
+
+def main():
+    from taxonomy import TaxonomyRegistry
+    from voc_analyzer import CLASSIFICATION_CACHE_PATH, LOCAL_MODEL_THRESHOLD, TAXONOMY_DEFAULT, TAXONOMY_DIR
+
+    parser = argparse.ArgumentParser(description='训练本地分类模型')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train = subparsers.add_parser('train', help='由分类缓存与用户修正训练模型')
+    train.add_argument('--cache', default=CLASSIFICATION_CACHE_PATH, help='分类缓存数据库')
+    train.add_argument('--feedback', default=os.path.join(BACKEND_DIR, 'training_data.jsonl'), help='用户修正记录')
+    train.add_argument('--output', default=LOCAL_MODEL_PATH, help='模型保存路径（.npz）')
+    train.add_argument('--taxonomy', default=TAXONOMY_DEFAULT, help='只使用该分类体系（当前版本）的缓存结果')
+    train.add_argument('--all-prompt-versions', action='store_true', help='同时使用旧Prompt版本与其他分类体系的缓存结果')
+    train.add_argument('--epochs', type=int, default=15)
+    train.add_argument('--features', type=int, default=1 << 18, help='哈希特征维度')
+    train.add_argument('--holdout', type=float, default=0.0, help='留出评估的样本比例（0~1）')
+    args = parser.parse_args()
+
+    taxonomy = TaxonomyRegistry(TAXONOMY_DIR).get(args.taxonomy)
+    if taxonomy is None:
+        parser.error(f'分类体系不存在: {args.taxonomy}')
+    prompt_version = None if args.all_prompt_versions else taxonomy.cache_version
+    samples = load_training_samples(args.cache, args.feedback, prompt_version)
+    evaluation = []
+    if args.holdout > 0:
+        order = np.random.RandomState(0).permutation(len(samples))
+        split = int(len(samples) * args.holdout)
+        evaluation = [samples[i] for i in order[:split]]
+        samples = [samples[i] for i in order[split:]]
+
+    started = time.perf_counter()
+    model = LocalClassifier.train(samples, n_features=args.features, epochs=args.epochs)
+    if prompt_version:
+        # 记录训练数据的分类体系版本，分类体系变化后分析时不再使用该模型
+        model.meta['prompt_version'] = prompt_version
+    print(f"[Local Model] 训练完成，耗时 {time.perf_counter() - started:.1f} 秒")
+    if evaluation:
+        _evaluate(model, evaluation, LOCAL_MODEL_THRESHOLD)
+    model.save(args.output)
+    print(f"[Local Model] 已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# 字符 n-gram 哈希特征（NumPy 实现的稀疏 TF-IDF），本地分类模型使用
+# - n-gram 用 crc32 哈希到固定维度，不需要保存词表，跨进程结果一致
+# - 稀疏矩阵以 CSR 三元组 (indptr, indices, data) 表示，不依赖 scipy
+import zlib
+
+import numpy as np
+
+from text_utils import normalize_text
+
+
+def char_ngrams(text, ngram_range=(1, 3)):
+    """归一化文本的字符 n-gram（含重复）"""
+    normalized = normalize_text(text)
+    low, high = ngram_range
+    grams = []
+    for size in range(low, high + 1):
+        grams.extend(normalized[i:i + size] for i in range(len(normalized) - size + 1))
+    return grams
+
+
+class SparseRows:
+    """CSR 格式的稀疏矩阵（只实现本项目用到的运算）"""
+
+    def __init__(self, indptr, indices, data, n_features):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def rows(self, selection):
+        """按行下标取子矩阵"""
+        starts = self.indptr[selection]
+        lengths = self.indptr[selection + 1] - starts
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        # 每个元素在原矩阵中的位置 = 所在行起点 + 行内偏移
+        offsets = np.arange(indptr[-1]) - np.repeat(indptr[:-1], lengths)
+        positions = np.repeat(starts, lengths) + offsets
+        return SparseRows(indptr, self.indices[positions], self.data[positions], self.n_features)
+
+    def row_ids(self):
+        """每个非零元素所在的行"""
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def dot(self, weights):
+        """稀疏矩阵 × 稠密矩阵 (n_features, k) -> (n_rows, k)"""
+        contributions = self.data[:, None] * weights[self.indices]
+        # 按行求和：前缀和相减，空行自然为0
+        cumulative = np.vstack([np.zeros((1, weights.shape[1])), np.cumsum(contributions, axis=0)])
+        return cumulative[self.indptr[1:]] - cumulative[self.indptr[:-1]]
+
+    def fold(self, dim):
+        """稀疏随机投影：特征下标按 dim 取余折叠为稠密矩阵 (n_rows, dim)，
+        折叠到同一维度的特征由下标的高位决定正负号（内积的期望不变），结果每行重新L2归一化"""
+        row_ids = self.row_ids()
+        signs = 1 - 2 * ((self.indices // dim) & 1)
+        dense = np.bincount(
+            row_ids * dim + self.indices % dim,
+            weights=self.data * signs,
+            minlength=len(self) * dim
+        ).reshape(len(self), dim).astype(np.float32)
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        return dense / np.maximum(norms, 1e-12)
+
+
+class HashedNgramVectorizer:
+    def __init__(self, n_features=1 << 18, ngram_range=(1, 3), idf=None):
+        """
+        Args:
+            n_features: 哈希维度
+            ngram_range: 字符 n-gram 长度范围（含两端）
+            idf: 各维度的 IDF 权重，为空时只使用 TF（见 fit）
+        """
+        self.n_features = int(n_features)
+        self.ngram_range = tuple(int(n) for n in ngram_range)
+        self.idf = idf
+
+    def _hash_rows(self, texts):
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            hashed = np.fromiter(
+                (zlib.crc32(gram.encode('utf-8')) for gram in char_ngrams(text, self.ngram_range)),
+                dtype=np.int64
+            ) % self.n_features
+            row_indices, row_counts = np.unique(hashed, return_counts=True)
+            indices.append(row_indices)
+            counts.append(row_counts)
+            indptr.append(indptr[-1] + len(row_indices))
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        counts = np.concatenate(counts).astype(np.float64) if counts else np.zeros(0)
+        return np.asarray(indptr, dtype=np.int64), indices, counts
+
+    def fit(self, texts):
+        """按文档频率计算平滑IDF：log((1 + n) / (1 + df)) + 1"""
+        indptr, indices, _ = self._hash_rows(texts)
+        df = np.bincount(indices, minlength=self.n_features)
+        self.idf = np.log((1 + (len(indptr) - 1)) / (1 + df)) + 1
+        return self
+
+    def transform(self, texts):
+        """次线性TF（1 + log tf）× IDF，每行L2归一化"""
+        indptr, indices, counts = self._hash_rows(texts)
+        data = 1 + np.log(counts)
+        if self.idf is not None:
+            data *= self.idf[indices]
+        # 每行L2归一化
+        row_ids = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(indptr) - 1))
+        data /= np.maximum(norms[row_ids], 1e-12)
+        return SparseRows(indptr, indices, data, self.n_features)
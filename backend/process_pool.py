@@ -0,0 +1,109 @@
+# CPU密集的结果处理（分析结果Sheet的构建、NaN清理与JSON序列化）在进程池中执行：
+# 大表格收尾时不占用Web进程的GIL，上传、进度推送等其他请求保持响应；结果以序列化好的JSON字节返回
+# - SHEET_PROCESS_WORKERS = 0 时在当前线程执行；进程池不可用（创建失败、子进程崩溃）时自动回退
+# - 子进程崩溃后不再重建进程池（此时Web进程已有其他线程，再 fork 可能使子进程因继承的锁而死锁），之后都在当前线程执行
+# - 支持 fork 的平台上使用 fork 创建子进程（无需在子进程中重新导入 app.py），应在启动其他线程前调用 start_process_pool
+import json
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from settings import get_setting
+
+SHEET_PROCESS_WORKERS = get_setting('SHEET_PROCESS_WORKERS', 2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class EncodedJSON:
+    """已序列化的JSON片段（UTF-8字节），由 encode_json 原样拼接到外层JSON中，不再重新序列化"""
+
+    __slots__ = ('data', 'count')
+
+    def __init__(self, data, count=0):
+        self.data = data
+        self.count = count   # 片段中的元素个数（如Sheet数），用于日志与判空
+
+    def __len__(self):
+        return self.count
+
+
+def clean_json_data(data):
+    """清理JSON数据中的无效值（NaN/Inf 替换为空字符串）"""
+    if isinstance(data, dict):
+        return {k: clean_json_data(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [clean_json_data(v) for v in data]
+    elif isinstance(data, float):
+        if math.isnan(data) or math.isinf(data):
+            return ""
+        return data
+    else:
+        return data
+
+
+def encode_json(data):
+    """清理无效值并序列化为UTF-8字节；data 中的 EncodedJSON 按原样嵌入"""
+    fragments = {}
+
+    def prepare(value):
+        if isinstance(value, EncodedJSON):
+            # 先用占位字符串序列化，再替换为已序列化的片段
+            token = f'\x00encoded-{len(fragments)}\x00'
+            fragments[json.dumps(token).encode('utf-8')] = value.data
+            return token
+        if isinstance(value, dict):
+            return {k: prepare(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [prepare(v) for v in value]
+        return clean_json_data(value)
+
+    encoded = json.dumps(prepare(data), ensure_ascii=False).encode('utf-8')
+    for token, fragment in fragments.items():
+        encoded = encoded.replace(token, fragment, 1)
+    return encoded
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None and int(SHEET_PROCESS_WORKERS) > 0:
+            try:
+                method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+                _executor = ProcessPoolExecutor(
+                    max_workers=int(SHEET_PROCESS_WORKERS),
+                    mp_context=multiprocessing.get_context(method)
+                )
+                print(f"[Process Pool] 已启动 {SHEET_PROCESS_WORKERS} 个结果处理进程")
+            except Exception as e:
+                print(f"[Process Pool] 进程池创建失败，在当前线程处理: {e}")
+                _executor = False
+        return _executor or None
+
+
+def start_process_pool():
+    """预先创建进程池的全部子进程（fork 时一次性创建），在Web进程启动其他线程之前调用"""
+    executor = _get_executor()
+    if executor is not None:
+        executor.submit(int).result()
+
+
+def run_cpu_task(fn, *args):
+    """在进程池中执行 fn(*args) 并等待结果（fn 与参数需可 pickle），未启用进程池时直接调用"""
+    global _executor
+    executor = _get_executor()
+    if executor is None:
+        return fn(*args)
+    try:
+        return executor.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        # 子进程异常退出：停用进程池，之后都在当前线程处理
+        print(f"[Process Pool] 进程池异常，停用进程池，之后在当前线程处理: {e}")
+        with _executor_lock:
+            if _executor is executor:
+                _executor = False
+        executor.shutdown(wait=False)
+        return fn(*args)
@@ -0,0 +1,96 @@
+# AI服务健康状态：记住最近一次可用的服务/端点并优先使用，失败的端点降级后由后台定期重新探测
+import threading
+import time
+
+
+class ProviderHealth:
+    def __init__(self, probe_fn, probe_interval=30.0):
+        """
+        Args:
+            probe_fn: 探测函数 probe_fn(api_type, endpoint) -> bool，端点恢复时返回True
+            probe_interval: 后台探测间隔（秒）
+        """
+        self.probe_fn = probe_fn
+        self.probe_interval = float(probe_interval)
+        self._lock = threading.Lock()
+        self._preferred = None      # (api_type, endpoint)
+        self._demoted = {}          # {endpoint: api_type}
+        self._probe_thread = None
+
+    @property
+    def preferred(self):
+        with self._lock:
+            return self._preferred
+
+    def order_providers(self, api_priority):
+        """按优先级排列API类型，最近可用的API排在最前（local 仍保持其在优先级中的位置）"""
+        preferred = self.preferred
+        if not preferred or preferred[0] not in api_priority:
+            return list(api_priority)
+        preferred_type = preferred[0]
+        # 优先级中排在首选API之前的 local 仍然优先
+        if 'local' in api_priority and api_priority.index('local') < api_priority.index(preferred_type):
+            return list(api_priority)
+        return [preferred_type] + [api_type for api_type in api_priority if api_type != preferred_type]
+
+    def order_endpoints(self, api_type, endpoints):
+        """排除已降级的端点，最近可用的端点排在最前"""
+        with self._lock:
+            available = [endpoint for endpoint in endpoints if endpoint not in self._demoted]
+            preferred = self._preferred
+        if preferred and preferred[0] == api_type and preferred[1] in available:
+            available.remove(preferred[1])
+            available.insert(0, preferred[1])
+        return available
+
+    def is_demoted(self, endpoint):
+        with self._lock:
+            return endpoint in self._demoted
+
+    def mark_working(self, api_type, endpoint):
+        """记录可用端点，后续请求直接使用"""
+        with self._lock:
+            self._demoted.pop(endpoint, None)
+            if self._preferred != (api_type, endpoint):
+                self._preferred = (api_type, endpoint)
+                print(f"[Provider] 首选端点切换为: {api_type} {endpoint}")
+
+    def demote(self, api_type, endpoint):
+        """降级失败的端点：行级请求不再尝试，交由后台探测恢复"""
+        with self._lock:
+            if endpoint in self._demoted:
+                return
+            self._demoted[endpoint] = api_type
+            if self._preferred == (api_type, endpoint):
+                self._preferred = None
+            print(f"[Provider] 端点已降级，{self.probe_interval:.0f}秒后后台重新探测: {api_type} {endpoint}")
+            self._ensure_probe_thread_locked()
+
+    def _ensure_probe_thread_locked(self):
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name='provider-probe', daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                demoted = list(self._demoted.items())
+            if not demoted:
+                # 没有降级端点时退出，下次降级时重新启动
+                with self._lock:
+                    if not self._demoted:
+                        self._probe_thread = None
+                        return
+                continue
+            for endpoint, api_type in demoted:
+                try:
+                    recovered = self.probe_fn(api_type, endpoint)
+                except Exception as e:
+                    print(f"[Provider] 探测 {endpoint} 失败: {e}")
+                    recovered = False
+                if recovered:
+                    with self._lock:
+                        self._demoted.pop(endpoint, None)
+                    print(f"[Provider] 端点已恢复: {api_type} {endpoint}")
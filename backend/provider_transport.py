@@ -0,0 +1,99 @@
+# AI接口的HTTP传输层
+# 整个分析过程复用同一组长连接，避免每条反馈都重新进行TCP+TLS握手
+# 异步分析使用 apost：已安装 httpx 时每个事件循环一个 httpx.AsyncClient，否则在线程中执行同步请求
+import asyncio
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ProviderTransport:
+    def __init__(self, pool_size=4, connect_timeout=5, read_timeout=30, http2=False):
+        """
+        Args:
+            pool_size: 每个域名保持的最大连接数，应不小于分析并发数
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应的超时时间（秒）
+            http2: 是否使用HTTP/2（需要安装 httpx[http2]，未安装时退回 requests）
+        """
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = (connect_timeout, read_timeout)
+        self.http2 = http2
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._http2_client = None
+        if http2:
+            try:
+                import httpx
+                self._http2_client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+                )
+            except ImportError:
+                print("[Transport] 未安装 httpx[http2]，使用 HTTP/1.1 长连接")
+
+        # 异步客户端按事件循环创建（AsyncClient 不能跨事件循环使用）
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+
+        protocol = 'HTTP/2' if self._http2_client else 'HTTP/1.1'
+        print(f"[Transport] 连接池大小: {self.pool_size}，协议: {protocol}，超时: 连接 {connect_timeout}s / 读取 {read_timeout}s")
+
+    def post(self, url, headers=None, json=None):
+        """发送POST请求，返回的响应对象提供 status_code / content / text / json()"""
+        if self._http2_client is not None:
+            return self._http2_client.post(url, headers=headers, json=json)
+        return self.session.post(url, headers=headers, json=json, timeout=self.timeout)
+
+    async def apost(self, url, headers=None, json=None):
+        """异步发送POST请求，响应对象的接口与 post 相同"""
+        client = self._async_client()
+        if client is None:
+            return await asyncio.to_thread(self.post, url, headers=headers, json=json)
+        return await client.post(url, headers=headers, json=json)
+
+    def _async_client(self):
+        """当前事件循环上的 httpx.AsyncClient；未安装 httpx 时返回None"""
+        try:
+            import httpx
+        except ImportError:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._create_async_client(httpx)
+                self._async_clients[loop] = client
+            return client
+
+    def _create_async_client(self, httpx):
+        connect_timeout, read_timeout = self.timeout
+        kwargs = {
+            'limits': httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            'timeout': httpx.Timeout(read_timeout, connect=connect_timeout),
+        }
+        if self.http2:
+            try:
+                return httpx.AsyncClient(http2=True, **kwargs)
+            except ImportError:
+                pass
+        return httpx.AsyncClient(**kwargs)
+
+    async def aclose(self):
+        """关闭当前事件循环上的异步客户端（事件循环结束前调用）"""
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        self.session.close()
+        if self._http2_client is not None:
+            self._http2_client.close()
@@ -0,0 +1,155 @@
+# AI接口的自适应限流与熔断
+# - AdaptiveRateLimiter: 令牌桶限流，收到429时按AIMD（加性增、乘性减）调整速率，并遵守 Retry-After
+# - CircuitBreaker: 端点连续失败后在冷却期内暂停调用，冷却结束后只放行一个探测请求
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, name, rate=10.0, min_rate=0.2, max_rate=50.0, increase_step=0.5, decrease_factor=0.5):
+        """
+        Args:
+            rate: 初始速率（次/秒）
+            min_rate / max_rate: 速率调整范围
+            increase_step: 每秒约增加的速率（加性增）
+            decrease_factor: 收到429时速率乘以该系数（乘性减）
+        """
+        self.name = name
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase_step = float(increase_step)
+        self.decrease_factor = float(decrease_factor)
+
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill_locked(self, now):
+        # 桶容量随速率变化，至少允许1个请求
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _try_take(self):
+        """尝试取一个令牌；成功返回0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill_locked(now)
+            if now >= self._paused_until and self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            if now < self._paused_until:
+                return self._paused_until - now
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self, stop_flag=None):
+        """阻塞直到获得一个令牌；stop_flag 被设置时放弃并返回False"""
+        while True:
+            wait_time = self._try_take()
+            if not wait_time:
+                return True
+            if stop_flag is not None and stop_flag.is_set():
+                return False
+            # 分段等待，以便及时响应停止标志
+            time.sleep(min(wait_time, 0.2))
+
+    async def acquire_async(self, stop_flag=None):
+        """acquire 的异步版本，等待期间不阻塞事件循环"""
+        while True:
+            wait_time = self._try_take()
+            if not wait_time:
+                return True
+            if stop_flag is not None and stop_flag.is_set():
+                return False
+            await asyncio.sleep(min(wait_time, 0.2))
+
+    def on_success(self):
+        """请求成功：加性增加速率（每个成功请求增加 step/rate，约合每秒增加 step）"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step / max(self.rate, 1.0))
+
+    def on_throttle(self, retry_after=None):
+        """收到429：乘性降低速率，并在 Retry-After 期间暂停发放令牌"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._tokens = 0.0
+            return self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, cooldown=60.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown = float(cooldown)
+        self._lock = threading.Lock()
+        # {endpoint: {'failures': int, 'open_until': float, 'probing': bool}}
+        self._states = {}
+
+    def _state(self, endpoint):
+        return self._states.setdefault(endpoint, {'failures': 0, 'open_until': 0.0, 'probing': False})
+
+    def allow(self, endpoint):
+        """端点当前是否可以调用；冷却结束后只放行一个探测请求"""
+        with self._lock:
+            state = self._state(endpoint)
+            if state['open_until'] == 0.0:
+                return True
+            if time.monotonic() < state['open_until'] or state['probing']:
+                return False
+            state['probing'] = True
+            return True
+
+    def is_open(self, endpoint):
+        with self._lock:
+            state = self._states.get(endpoint)
+            return bool(state and state['open_until'] and time.monotonic() < state['open_until'])
+
+    def record_success(self, endpoint):
+        with self._lock:
+            self._states[endpoint] = {'failures': 0, 'open_until': 0.0, 'probing': False}
+
+    def record_failure(self, endpoint):
+        """记录一次失败；连续失败达到阈值（或探测失败）时熔断"""
+        with self._lock:
+            state = self._state(endpoint)
+            state['failures'] += 1
+            if state['probing'] or state['failures'] >= self.failure_threshold:
+                self._open_locked(endpoint, state, self.cooldown)
+
+    def release_probe(self, endpoint):
+        """探测请求结束但未记录成功/失败时（多次429、被停止或取消），恢复为半开状态，下次调用可再次探测"""
+        with self._lock:
+            state = self._states.get(endpoint)
+            if state and state['probing']:
+                state['probing'] = False
+
+    def trip(self, endpoint, cooldown=None):
+        """立即熔断端点（例如模型加载中、已下线）"""
+        with self._lock:
+            self._open_locked(endpoint, self._state(endpoint), cooldown or self.cooldown)
+
+    def _open_locked(self, endpoint, state, cooldown):
+        state['open_until'] = time.monotonic() + cooldown
+        state['probing'] = False
+        print(f"[熔断] {endpoint} 暂停调用 {cooldown:.0f} 秒")
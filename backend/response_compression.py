@@ -0,0 +1,195 @@
+# HTTP响应压缩：按请求的 Accept-Encoding 协商 br / zstd / gzip
+# 表格JSON中大量重复的中文文本与固定键名，压缩后通常只有原来的 1/10 左右
+# - compress_response: 普通（非流式）响应，小于阈值的不压缩
+# - compressed_stream: 流式响应（上传结果、SSE），先预读到阈值再决定是否压缩；
+#   SSE 每个事件后同步刷新（sync flush），客户端收到即可解码，进度推送不会被压缩缓冲延迟
+import itertools
+import zlib
+
+from settings import get_setting
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = get_setting('COMPRESSION_ENABLED', True)
+COMPRESSION_MIN_SIZE = get_setting('COMPRESSION_MIN_SIZE', 1024)
+
+# 压缩级别：偏向速度（br 最高11、gzip 最高9 的压缩率提升有限，但耗时成倍增加）
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def available_encodings():
+    """服务端支持的编码，按优先级排列（brotli / zstandard 为可选依赖）"""
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def negotiate_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择编码，客户端不接受任何可用编码时返回None
+
+    q 值高者优先，q 值相同时按服务端优先级（br > zstd > gzip）。
+    """
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class StreamCompressor:
+    """增量压缩器，统一 gzip / brotli / zstd 的接口"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == 'gzip':
+            # wbits = 16 + MAX_WBITS 输出带 gzip 头的数据
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            raise ValueError(f'不支持的压缩编码: {encoding}')
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """输出目前为止的全部压缩数据（不结束压缩流）"""
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        if self.encoding == 'zstd':
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_bytes(data, encoding):
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_response(response, accept_encoding, min_size=None):
+    """压缩普通响应（用于 after_request），流式响应由 compressed_stream 处理"""
+    if min_size is None:
+        min_size = COMPRESSION_MIN_SIZE
+    if (response.is_streamed or response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or not response.mimetype.startswith(('application/json', 'text/'))):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    compressed = compress_bytes(data, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    print(f"[压缩] {encoding}: {len(data)} -> {len(compressed)} 字节")
+    return response
+
+
+def _encode(chunk):
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def compressed_stream(chunks, accept_encoding, flush_each=False, min_size=None, label='响应'):
+    """压缩流式响应
+
+    先预读数据直到达到阈值（或数据结束）再决定是否压缩，预读的数据原样保留。
+
+    Args:
+        chunks: 输出 str/bytes 的可迭代对象
+        flush_each: 每个分块后同步刷新（SSE 需要，保证事件及时到达客户端）
+
+    Returns:
+        (body 迭代器, 响应头)：未压缩时响应头为空
+    """
+    if min_size is None:
+        min_size = COMPRESSION_MIN_SIZE
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return chunks, {}
+
+    iterator = iter(chunks)
+    head = []
+    head_size = 0
+    if not flush_each:
+        # SSE 不预读（会阻塞首个事件），直接压缩整个事件流
+        for chunk in iterator:
+            chunk = _encode(chunk)
+            head.append(chunk)
+            head_size += len(chunk)
+            if head_size >= min_size:
+                break
+        else:
+            return head, {}
+
+    def generate():
+        compressor = StreamCompressor(encoding)
+        raw_size = compressed_size = 0
+        try:
+            for chunk in itertools.chain(head, iterator):
+                chunk = _encode(chunk)
+                raw_size += len(chunk)
+                output = compressor.compress(chunk)
+                if flush_each:
+                    output += compressor.flush()
+                if output:
+                    compressed_size += len(output)
+                    yield output
+            output = compressor.finish()
+            compressed_size += len(output)
+            yield output
+        finally:
+            # 大小在流式输出时累计，不需要再次序列化整个结果
+            print(f"[压缩] {label} {encoding}: {raw_size} -> {compressed_size} 字节")
+            close = getattr(iterator, 'close', None)
+            if close:
+                close()
+
+    return generate(), {'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'}
@@ -0,0 +1,160 @@
+# 基于字符 n-gram 哈希向量的语义聚类（NumPy，不依赖 sklearn）
+# - 文本向量：字符 1~3-gram 的次线性TF，折叠为 dim 维稠密向量（见 ngram_features.SparseRows.fold）
+# - 聚类：按给定顺序的阈值聚类（leader clustering）——每个元素与已有簇的中心比较余弦相似度，
+#   达到阈值则并入最相近的簇，否则新建一个簇；内存只与簇数 × dim 及分块大小有关，可在固定预算内处理10万级数据
+import numpy as np
+
+from feedback_dedup import group_duplicates
+from ngram_features import HashedNgramVectorizer
+
+# 向量维度与 n-gram 范围
+EMBEDDING_DIM = 256
+NGRAM_RANGE = (1, 3)
+# 每次向量化/比较的元素数上限
+CHUNK_SIZE = 2048
+
+# 哈希维度（折叠前）：远大于 EMBEDDING_DIM，折叠时的正负号由下标高位决定；计算IDF时 df 数组的长度
+HASH_FEATURES = 1 << 20
+
+_vectorizer = HashedNgramVectorizer(n_features=HASH_FEATURES, ngram_range=NGRAM_RANGE)
+
+
+def embed_texts(texts, dim=EMBEDDING_DIM, vectorizer=None):
+    """文本的 L2 归一化向量 (len(texts), dim)，float32
+
+    Args:
+        vectorizer: 已 fit 的 HashedNgramVectorizer（带IDF，常见的口头语权重更低），默认只使用TF
+    """
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    return (vectorizer or _vectorizer).transform([str(text) for text in texts]).fold(dim)
+
+
+def memory_limits(memory_mb, dim=EMBEDDING_DIM):
+    """由内存预算（MB）得到簇数上限：每个簇保存中心与累加向量"""
+    budget = max(1, int(memory_mb)) << 20
+    return max(1, budget // (dim * 4 * 2 * 2))   # 一半给簇，另一半给分块的相似度矩阵
+
+
+def leader_cluster(vector_chunks, threshold, weights=None, blocks=None, max_clusters=None, memory_mb=64):
+    """按顺序的阈值聚类
+
+    Args:
+        vector_chunks: 可迭代的 (n_i, dim) 归一化向量块，按处理顺序排列（建议大的/代表性强的元素在前，它们成为簇的代表）
+        threshold: 并入已有簇的最小余弦相似度
+        weights: 每个元素的权重（如分组的行数），更新簇中心时使用，默认均为1
+        blocks: 每个元素所属的块（整数），只有同一块中的元素可以并入同一个簇；为空时不限制
+        max_clusters: 簇数上限，达到上限后不能并入已有簇的元素各自单独成簇（不再参与比较）；默认由 memory_mb 决定
+        memory_mb: 内存预算（MB）
+
+    Returns:
+        (labels, representatives): 每个元素的簇编号（从0开始，按簇的创建顺序），以及每个簇的代表元素（创建该簇的元素）下标
+    """
+    if max_clusters is None:
+        max_clusters = memory_limits(memory_mb)
+    budget = max(1, int(memory_mb)) << 20
+
+    labels = []
+    representatives = []
+    centroids = None        # (簇数, dim) 归一化中心
+    sums = None             # (簇数, dim) 加权向量和
+    cluster_blocks = []
+    offset = 0
+
+    for chunk in vector_chunks:
+        if len(chunk) == 0:
+            continue
+        if centroids is None:
+            dim = chunk.shape[1]
+            centroids = np.zeros((0, dim), dtype=np.float32)
+            sums = np.zeros((0, dim), dtype=np.float32)
+
+        # 分块再切小，使 (块大小 × 簇数) 的相似度矩阵不超过预算的一半
+        step = max(1, min(len(chunk), budget // 2 // (4 * max(len(centroids), 1))))
+        for start in range(0, len(chunk), step):
+            part = chunk[start:start + step]
+            existing = len(centroids)
+            similarities = part @ centroids.T if existing else np.zeros((len(part), 0), dtype=np.float32)
+            if blocks is not None and existing:
+                part_blocks = np.asarray(blocks[offset + start:offset + start + len(part)])
+                similarities[part_blocks[:, None] != np.asarray(cluster_blocks[:existing])[None, :]] = -1.0
+
+            # 本块中新建的簇：与已有簇的中心在块结束后统一更新
+            new_vectors = np.empty_like(part)
+            new_count = 0
+            updates = []        # (元素在块中的位置, 簇编号)
+            for i, vector in enumerate(part):
+                index = offset + start + i
+                best, best_similarity = -1, threshold
+                if existing:
+                    candidate = int(similarities[i].argmax())
+                    if similarities[i, candidate] >= best_similarity:
+                        best, best_similarity = candidate, similarities[i, candidate]
+                if new_count:
+                    new_similarities = new_vectors[:new_count] @ vector
+                    if blocks is not None:
+                        same_block = np.asarray(cluster_blocks[existing:existing + new_count]) == blocks[index]
+                        new_similarities = np.where(same_block, new_similarities, -1.0)
+                    candidate = int(new_similarities.argmax())
+                    if new_similarities[candidate] > best_similarity or (best < 0 and new_similarities[candidate] >= threshold):
+                        best = existing + candidate
+                if best < 0:
+                    best = len(representatives)
+                    representatives.append(index)
+                    cluster_blocks.append(blocks[index] if blocks is not None else 0)
+                    if existing + new_count < max_clusters:
+                        new_vectors[new_count] = vector
+                        new_count += 1
+                    else:
+                        # 超出簇数上限：单独成簇，但不保存中心
+                        labels.append(best)
+                        continue
+                labels.append(best)
+                updates.append((i, best))
+
+            # 更新簇中心（加权向量和重新归一化）
+            if new_count:
+                centroids = np.vstack([centroids, new_vectors[:new_count]])
+                sums = np.vstack([sums, np.zeros((new_count, sums.shape[1]), dtype=np.float32)])
+            if updates:
+                positions = np.array([i for i, _ in updates])
+                cluster_ids = np.array([cluster for _, cluster in updates])
+                # 超出上限未保存中心的簇不在 sums 中（编号 >= len(sums)）
+                tracked = cluster_ids < len(sums)
+                part_weights = (np.asarray(weights[offset + start:offset + start + len(part)], dtype=np.float32)
+                                if weights is not None else np.ones(len(part), dtype=np.float32))
+                np.add.at(sums, cluster_ids[tracked], part[positions[tracked]] * part_weights[positions[tracked], None])
+                touched = np.unique(cluster_ids[tracked])
+                norms = np.linalg.norm(sums[touched], axis=1, keepdims=True)
+                centroids[touched] = sums[touched] / np.maximum(norms, 1e-12)
+        offset += len(chunk)
+
+    return np.asarray(labels, dtype=np.int64), representatives
+
+
+def cluster_texts(texts, threshold, memory_mb=64):
+    """将文本聚为语义相近的簇（先合并归一化后完全相同的文本）
+
+    Returns:
+        list[list[list[int]]]: 每个簇为若干组完全相同文本的行下标列表；簇内按组的大小排列（第一组为簇的代表），
+            簇按首次出现的行排列
+    """
+    groups = group_duplicates(texts)
+    # 大的组优先成为簇的代表（大小相同时按出现顺序）
+    order = sorted(range(len(groups)), key=lambda g: -len(groups[g]))
+    # IDF 由本次的全部（去重后）文本计算：“感觉”“每次都”等在很多反馈中出现的片段不主导相似度
+    vectorizer = HashedNgramVectorizer(n_features=HASH_FEATURES, ngram_range=NGRAM_RANGE)
+    vectorizer.fit([texts[group[0]] for group in groups])
+
+    def vector_chunks():
+        for start in range(0, len(order), CHUNK_SIZE):
+            yield embed_texts([texts[groups[g][0]] for g in order[start:start + CHUNK_SIZE]], vectorizer=vectorizer)
+
+    labels, representatives = leader_cluster(
+        vector_chunks(), threshold, weights=[len(groups[g]) for g in order], memory_mb=memory_mb
+    )
+    clusters = [[] for _ in representatives]
+    for position, label in enumerate(labels.tolist()):
+        clusters[label].append(groups[order[position]])
+    clusters.sort(key=lambda cluster: min(group[0] for group in cluster))
+    return clusters
@@ -0,0 +1,238 @@
+# 上传文件的服务端会话：按 fileId 保存解析后的表格，分析与统计重算通过 fileId + 版本号引用，
+# 不再重复解析 xlsx，也不需要前端回传整张表的 celldata
+# - 内存中按最近最少使用保留 max_memory 个会话，其余从磁盘按需加载
+# - 磁盘上的会话在启动时与每次保存新会话后清理：超过 ttl_days 未更新的、超出 max_disk 个的（最久未更新的先删除）
+# - 磁盘上每个表格为一个文件：已安装 pyarrow 时使用 Parquet（列式压缩），否则（或表格含混合类型列时）使用 pickle
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (pandas.to_parquet 需要)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+class SessionError(Exception):
+    """会话不存在（404）或版本不一致（409）"""
+
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    def __init__(self, file_id, version, tables):
+        """
+        Args:
+            version: 每次表格更新后加1，前端以此判断引用的数据是否仍是最新
+            tables: {表名: DataFrame}，如 data（分析用的表格）、original（原始数据Sheet的单元格）、
+                    analysis（分析结果Sheet的单元格）
+        """
+        self.file_id = file_id
+        self.version = version
+        self.tables = tables
+        self.files = {}     # {表名: 磁盘文件信息}
+
+
+class SessionStore:
+    def __init__(self, directory, max_memory=8, ttl_days=7, max_disk=200):
+        self.directory = directory
+        self.max_memory = max(1, int(max_memory))
+        self.ttl = max(0.0, float(ttl_days)) * 86400
+        self.max_disk = max(0, int(max_disk))
+        self._sessions = OrderedDict()
+        self._pending = {}      # {fileId: threading.Event}，后台解析中的会话
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._purge_expired()
+        print(f"[Session] 会话存储: {directory}（内存保留 {self.max_memory} 个，格式: {'Parquet' if PARQUET_AVAILABLE else 'pickle'}）")
+
+    def _session_dir(self, file_id):
+        # fileId 来自请求参数，只取文件名部分，防止路径穿越
+        return os.path.join(self.directory, os.path.basename(str(file_id)))
+
+    def reserve(self, file_id):
+        """标记会话即将在后台解析（get 会等待解析完成），返回解析完成后的版本号"""
+        with self._lock:
+            self._pending[file_id] = threading.Event()
+            current = self._load(file_id)
+            return current.version + 1 if current else 1
+
+    def release(self, file_id):
+        """取消 reserve 登记的后台解析，唤醒等待中的 get"""
+        with self._lock:
+            event = self._pending.pop(file_id, None)
+        if event is not None:
+            event.set()
+
+    def ingest_async(self, file_id, loader):
+        """在后台线程中调用 loader() 得到 {表名: DataFrame} 并保存为新会话"""
+        with self._lock:
+            event = self._pending.setdefault(file_id, threading.Event())
+
+        def ingest():
+            try:
+                self.put(file_id, loader())
+            except Exception as e:
+                print(f"[Session] 解析失败 {file_id}: {e}")
+            finally:
+                with self._lock:
+                    if self._pending.get(file_id) is event:
+                        del self._pending[file_id]
+                event.set()
+
+        thread = threading.Thread(target=ingest, daemon=True)
+        thread.start()
+        return thread
+
+    def put(self, file_id, tables):
+        """用新的表格替换会话内容，返回新会话"""
+        with self._lock:
+            current = self._load(file_id)
+            session = Session(file_id, current.version + 1 if current else 1, dict(tables))
+            self._write(session, current)
+            self._remember(session)
+            if current is None:
+                self._purge_expired()
+        print(f"[Session] 已保存 {file_id} v{session.version}: {', '.join(f'{name}{table.shape}' for name, table in tables.items())}")
+        return session
+
+    def update(self, file_id, **tables):
+        """添加或替换会话中的部分表格（会话不存在时新建），返回新会话"""
+        with self._lock:
+            current = self._load(file_id)
+            merged = dict(current.tables) if current else {}
+            merged.update(tables)
+            return self.put(file_id, merged)
+
+    def get(self, file_id, version=None, wait=60):
+        """获取会话；version 不为空时校验版本，后台解析中的会话最多等待 wait 秒"""
+        with self._lock:
+            event = self._pending.get(file_id)
+        if event is not None:
+            event.wait(wait)
+
+        with self._lock:
+            session = self._load(file_id)
+        if session is None:
+            raise SessionError(f'会话不存在: {file_id}', status=404)
+        if version is not None and int(version) != session.version:
+            raise SessionError(f'数据版本不一致（当前 {session.version}，请求 {version}），请重新加载', status=409)
+        return session
+
+    def _remember(self, session):
+        self._sessions[session.file_id] = session
+        self._sessions.move_to_end(session.file_id)
+        while len(self._sessions) > self.max_memory:
+            self._sessions.popitem(last=False)
+
+    def _load(self, file_id):
+        session = self._sessions.get(file_id)
+        if session is not None:
+            self._sessions.move_to_end(file_id)
+            return session
+        session = self._read(file_id)
+        if session is not None:
+            self._remember(session)
+        return session
+
+    def _purge_expired(self):
+        """删除超过保留期未更新、或超出 max_disk 个数的磁盘会话（内存中与后台解析中的会话除外）"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if not os.path.isdir(path) or name in self._sessions or name in self._pending:
+                    continue
+                meta_path = os.path.join(path, 'meta.pkl')
+                try:
+                    updated_at = os.path.getmtime(meta_path if os.path.exists(meta_path) else path)
+                except OSError:
+                    continue
+                entries.append((updated_at, name))
+            entries.sort(reverse=True)
+
+            expired = []
+            keep = max(0, self.max_disk - len(self._sessions)) if self.max_disk else len(entries)
+            cutoff = time.time() - self.ttl if self.ttl else None
+            for i, (updated_at, name) in enumerate(entries):
+                if i >= keep or (cutoff is not None and updated_at < cutoff):
+                    expired.append(name)
+            for name in expired:
+                self._remove_dir(name)
+        if expired:
+            print(f"[Session] 已清理 {len(expired)} 个过期的会话")
+
+    def _remove_dir(self, file_id):
+        self._sessions.pop(file_id, None)
+        shutil.rmtree(self._session_dir(file_id), ignore_errors=True)
+
+    # ---------------- 磁盘读写 ----------------
+
+    def _write(self, session, previous=None):
+        session_dir = self._session_dir(session.file_id)
+        os.makedirs(session_dir, exist_ok=True)
+        for name, table in session.tables.items():
+            if previous is not None and previous.tables.get(name) is table and name in previous.files:
+                # 未变化的表格沿用已写入的文件
+                session.files[name] = previous.files[name]
+            else:
+                session.files[name] = self._write_table(session_dir, f'{name}.v{session.version}', table)
+        meta = {'version': session.version, 'tables': session.files}
+
+        # 先写入新版本的表格，再原子替换元数据，最后删除旧版本的文件
+        meta_path = os.path.join(session_dir, 'meta.pkl')
+        with open(meta_path + '.tmp', 'wb') as f:
+            pickle.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        current_files = {entry['file'] for entry in meta['tables'].values()} | {'meta.pkl'}
+        for filename in os.listdir(session_dir):
+            if filename not in current_files:
+                os.remove(os.path.join(session_dir, filename))
+
+    @staticmethod
+    def _write_table(session_dir, stem, table):
+        if PARQUET_AVAILABLE:
+            # Parquet 要求列名为字符串：按位置命名，原列名保存在元数据中
+            try:
+                filename = stem + '.parquet'
+                stored = table.set_axis([str(i) for i in range(table.shape[1])], axis=1)
+                stored.to_parquet(os.path.join(session_dir, filename), index=True)
+                return {'file': filename, 'columns': list(table.columns)}
+            except Exception as e:
+                print(f"[Session] {stem} 无法保存为 Parquet（{e}），改用 pickle")
+        filename = stem + '.pkl'
+        table.to_pickle(os.path.join(session_dir, filename))
+        return {'file': filename}
+
+    def _read(self, file_id):
+        session_dir = self._session_dir(file_id)
+        meta_path = os.path.join(session_dir, 'meta.pkl')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'rb') as f:
+                meta = pickle.load(f)
+            tables = {}
+            for name, entry in meta['tables'].items():
+                path = os.path.join(session_dir, entry['file'])
+                if entry['file'].endswith('.parquet'):
+                    table = pd.read_parquet(path)
+                    tables[name] = table.set_axis(pd.Index(entry['columns']), axis=1)
+                else:
+                    tables[name] = pd.read_pickle(path)
+            session = Session(file_id, meta['version'], tables)
+            session.files = meta['tables']
+            return session
+        except Exception as e:
+            # 无法读取的会话不会再被加载，删除磁盘上的文件
+            print(f"[Session] 读取会话失败，已删除 {file_id}: {e}")
+            self._remove_dir(file_id)
+            return None
@@ -0,0 +1,32 @@
+# 可选配置读取
+# 必填项（API Key 等）仍由 voc_analyzer.py 直接从 config.py 导入；
+# 新增的调优参数通过 get_setting 读取，旧版 config.py 缺少这些字段时不会影响 Key 的加载。
+import os
+
+try:
+    import config as _user_config
+except ImportError:
+    _user_config = None
+
+
+def get_setting(name, default):
+    """读取可选配置：优先 config.py，其次环境变量，最后使用默认值"""
+    if _user_config is not None and hasattr(_user_config, name):
+        return getattr(_user_config, name)
+
+    env_value = os.getenv(name)
+    if env_value is None:
+        return default
+
+    # 环境变量按默认值的类型转换
+    try:
+        if isinstance(default, bool):
+            return env_value.strip().lower() in ('1', 'true', 'yes', 'on')
+        if isinstance(default, int):
+            return int(env_value)
+        if isinstance(default, float):
+            return float(env_value)
+    except ValueError:
+        print(f"[Settings] 环境变量 {name}={env_value!r} 无法解析，使用默认值 {default!r}")
+        return default
+    return env_value
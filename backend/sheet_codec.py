@@ -0,0 +1,302 @@
+# 表格数据的紧凑编码（可选，请求中指定 format=compact 时使用）
+#
+# 标准格式中每个单元格都是 {'r','c','v':{'v','m','ct':{...}}}，固定的 ct 与重复的 v/m 使数据量约增加两倍。
+# 紧凑格式将 Sheet 的 celldata 替换为 compact 字段，由前端（src/utils/sheetCodec.js）还原：
+#
+#   compact = {
+#       'version': 1,
+#       'strings': [...],                       # 共享字符串表，单元格只保存下标
+#       'columns': [                            # 按列存储
+#           {'c': 列号, 'rows': [[起始行, 行数], ...], 'values': [字符串下标, ...]},
+#           {'c': 列号, 'runs': [[行, 合并行数, 字符串下标], ...]},   # 含合并单元格的分组列（游程编码）
+#       ],                                      # 同一列可以分为多个片段，片段可带 'raw': [[行, 原始值], ...]
+#       'raw': [[行, 列, 原始值], ...],          # 原始值 v 与显示文本 m 不同的单元格（如上传的数字）
+#       'styles': [{...}, ...],                 # 样式表：v/m 以外的键（bg、fc、ct 等）
+#       'cellStyles': [[行, 列, 样式下标], ...],  # 与默认样式（ct=General）不同的单元格
+#   }
+#
+# 上传接口逐块输出 columns（CompactStreamWriter）：每个行块的各列作为单独的片段，原始值放在片段中，
+# 共享字符串表在所有片段之后输出，服务端无需在内存中保留整个Sheet。
+#
+# runs 中合并行数大于1的单元格对应 config.merge 中的单列合并，编码时从 config 中移除，由前端重新生成。
+
+import pandas as pd
+
+COMPACT_VERSION = 1
+DEFAULT_CT = {'fa': 'General', 't': 'g'}
+
+
+def wants_compact(value):
+    """请求参数 format 是否要求紧凑格式"""
+    return str(value or '').lower() == 'compact'
+
+
+class CelldataWriter:
+    """按标准 celldata 格式收集单元格"""
+
+    def __init__(self):
+        self.celldata = []
+
+    def add(self, r, c, text, value=None, style=None):
+        """添加单元格：text 为显示文本，value 为与文本不同的原始值，style 为额外的样式键"""
+        cell_value = {
+            'v': text if value is None else value,
+            'm': text,
+            'ct': {'fa': 'General', 't': 'g'}
+        }
+        if style:
+            cell_value.update(style)
+        self.celldata.append({'r': r, 'c': c, 'v': cell_value})
+
+    def add_column(self, c, rows, texts):
+        for r, text in zip(rows, texts):
+            self.add(r, c, text)
+
+    def sheet(self, config=None, **meta):
+        result = dict(meta)
+        result['celldata'] = self.celldata
+        if config is not None:
+            result['config'] = config
+        return result
+
+
+class CompactSheetWriter:
+    """按紧凑格式收集单元格，接口与 CelldataWriter 相同"""
+
+    def __init__(self):
+        self._strings = []
+        self._string_ids = {}
+        self._columns = {}      # {列号: ([行号], [字符串下标])}
+        self._raw = []
+        self._styles = []
+        self._style_ids = {}
+        self._cell_styles = []
+
+    def _string_id(self, text):
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._string_ids[text] = string_id
+            self._strings.append(text)
+        return string_id
+
+    def _style_id(self, style):
+        key = repr(sorted(style.items()))
+        style_id = self._style_ids.get(key)
+        if style_id is None:
+            style_id = len(self._styles)
+            self._style_ids[key] = style_id
+            self._styles.append(dict(style))
+        return style_id
+
+    def add(self, r, c, text, value=None, style=None):
+        rows, ids = self._columns.setdefault(c, ([], []))
+        rows.append(r)
+        ids.append(self._string_id(text))
+        if value is not None and (type(value) is not str or value != text):
+            self._raw.append([r, c, value])
+        if style:
+            self._cell_styles.append([r, c, self._style_id(style)])
+
+    def add_column(self, c, rows, texts):
+        """批量添加一列无样式的单元格"""
+        column_rows, ids = self._columns.setdefault(c, ([], []))
+        column_rows.extend(rows)
+        string_id = self._string_id
+        ids.extend(string_id(text) for text in texts)
+
+    def sheet(self, config=None, **meta):
+        # 单列合并的左上角单元格改为游程编码，合并配置由前端还原
+        remaining_merge = {}
+        spans = {}
+        column_rows = {}
+        for key, merge in ((config or {}).get('merge') or {}).items():
+            c = merge['c']
+            if c in self._columns and c not in column_rows:
+                column_rows[c] = set(self._columns[c][0])
+            if merge.get('cs', 1) == 1 and merge['r'] in column_rows.get(c, ()):
+                spans[(merge['r'], c)] = merge['rs']
+            else:
+                remaining_merge[key] = merge
+        merged_columns = {c for _, c in spans}
+
+        columns = []
+        for c in sorted(self._columns):
+            rows, ids = self._columns[c]
+            if any(rows[i] > rows[i + 1] for i in range(len(rows) - 1)):
+                order = sorted(range(len(rows)), key=rows.__getitem__)
+                rows = [rows[i] for i in order]
+                ids = [ids[i] for i in order]
+            if c in merged_columns:
+                columns.append({'c': c, 'runs': [[r, spans.get((r, c), 1), i] for r, i in zip(rows, ids)]})
+            else:
+                columns.append({'c': c, 'rows': _row_ranges(rows), 'values': ids})
+
+        result = dict(meta)
+        if config is not None:
+            result['config'] = {**config, 'merge': remaining_merge} if 'merge' in config else config
+        result['compact'] = {
+            'version': COMPACT_VERSION,
+            'strings': self._strings,
+            'columns': columns,
+            'raw': self._raw,
+            'styles': self._styles,
+            'cellStyles': self._cell_styles
+        }
+        return result
+
+
+class CompactStreamWriter(CompactSheetWriter):
+    """按行块输出列片段的紧凑编码（见文件开头的说明），不支持合并单元格"""
+
+    def __init__(self):
+        super().__init__()
+        self.pending = 0        # 尚未输出的单元格数
+
+    def add(self, r, c, text, value=None, style=None):
+        super().add(r, c, text, value=value, style=style)
+        self.pending += 1
+
+    def flush_columns(self):
+        """取出当前行块的列片段（按列号排序），原始值随片段输出"""
+        raw = {}
+        for r, c, value in self._raw:
+            raw.setdefault(c, []).append([r, value])
+        segments = []
+        for c in sorted(self._columns):
+            rows, ids = self._columns[c]
+            segment = {'c': c, 'rows': _row_ranges(rows), 'values': ids}
+            if c in raw:
+                segment['raw'] = raw[c]
+            segments.append(segment)
+        self._columns = {}
+        self._raw = []
+        self.pending = 0
+        return segments
+
+    def tail(self):
+        """所有片段之后的剩余字段：共享字符串表与样式"""
+        return {
+            'strings': self._strings,
+            'raw': [],
+            'styles': self._styles,
+            'cellStyles': self._cell_styles
+        }
+
+
+class CellTableWriter:
+    """按列收集单元格的行号、列号与显示文本（不含样式），用于在服务端保存表格（见 session_store）"""
+
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+        self.texts = []
+
+    def add(self, r, c, text, value=None, style=None):
+        self.rows.append(r)
+        self.cols.append(c)
+        self.texts.append(text)
+
+    def add_column(self, c, rows, texts):
+        self.rows.extend(rows)
+        self.cols.extend([c] * len(rows))
+        self.texts.extend(texts)
+
+    def table(self):
+        """单元格表: DataFrame(r, c, v)，按添加顺序"""
+        return pd.DataFrame({
+            'r': pd.Series(self.rows, dtype='int32'),
+            'c': pd.Series(self.cols, dtype='int32'),
+            'v': pd.Series(self.texts, dtype=object)
+        })
+
+    def sheet(self, config=None, **meta):
+        result = dict(meta)
+        result['cells'] = self.table()
+        if config is not None:
+            result['config'] = config
+        return result
+
+
+def write_table(cells, writer):
+    """将单元格表（见 CellTableWriter.table）按原顺序写入 writer"""
+    for r, c, text in zip(cells['r'].tolist(), cells['c'].tolist(), cells['v'].tolist()):
+        writer.add(r, c, text)
+    return writer
+
+
+def _row_ranges(rows):
+    """有序行号列表 -> 连续区间 [[起始行, 行数], ...]"""
+    ranges = []
+    for r in rows:
+        if ranges and r == ranges[-1][0] + ranges[-1][1]:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([r, 1])
+    return ranges
+
+
+def sheet_writer(compact=False):
+    return CompactSheetWriter() if compact else CelldataWriter()
+
+
+def encode_sheet(sheet):
+    """将标准格式的Sheet（含 celldata）转换为紧凑格式"""
+    writer = CompactSheetWriter()
+    for cell in sheet.get('celldata', []):
+        cell_value = cell['v']
+        if not isinstance(cell_value, dict):
+            writer.add(cell['r'], cell['c'], str(cell_value), value=cell_value)
+            continue
+        text = cell_value['m'] if 'm' in cell_value else str(cell_value.get('v', ''))
+        style = {k: v for k, v in cell_value.items() if k not in ('v', 'm')}
+        if style.get('ct') == DEFAULT_CT:
+            del style['ct']
+        writer.add(cell['r'], cell['c'], text, value=cell_value.get('v'), style=style)
+    meta = {k: v for k, v in sheet.items() if k not in ('celldata', 'config')}
+    return writer.sheet(config=sheet.get('config'), **meta)
+
+
+def expand_sheet(sheet):
+    """紧凑格式 -> 标准格式（与前端 expandCompactSheet 相同，单元格按行优先排序）"""
+    if 'compact' not in sheet:
+        return sheet
+    compact = sheet['compact']
+    strings = compact['strings']
+    raw = {(r, c): value for r, c, value in compact['raw']}
+    styles = {(r, c): compact['styles'][i] for r, c, i in compact['cellStyles']}
+    config = dict(sheet.get('config') or {})
+    merge = dict(config.get('merge') or {})
+
+    cells = []
+    for column in compact['columns']:
+        c = column['c']
+        if 'runs' in column:
+            for r, span, i in column['runs']:
+                cells.append((r, c, strings[i]))
+                if span > 1:
+                    merge[f"{r}_{c}"] = {'r': r, 'c': c, 'rs': span, 'cs': 1}
+        else:
+            ids = iter(column['values'])
+            for start, count in column['rows']:
+                for r in range(start, start + count):
+                    cells.append((r, c, strings[next(ids)]))
+            raw.update(((r, c), value) for r, value in column.get('raw', ()))
+    cells.sort(key=lambda cell: (cell[0], cell[1]))
+
+    celldata = []
+    for r, c, text in cells:
+        cell_value = {
+            'v': raw.get((r, c), text),
+            'm': text,
+            'ct': {'fa': 'General', 't': 'g'}
+        }
+        cell_value.update(styles.get((r, c), {}))
+        celldata.append({'r': r, 'c': c, 'v': cell_value})
+
+    result = {k: v for k, v in sheet.items() if k != 'compact'}
+    result['celldata'] = celldata
+    if merge or 'merge' in config:
+        config['merge'] = merge
+        result['config'] = config
+    return result
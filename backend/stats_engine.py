@@ -0,0 +1,495 @@
+# 分析结果Sheet的统计重算（recalculate_stats）
+# - parse_celldata / group_rows / render_stats_sheet: 全量重算，解析整张表后按(问题总标题, 问题归类, 用户情绪)分组
+# - StatsState: 服务端保存的分组状态（按 fileId），前端提交修改过的单元格后只更新受影响的分组，
+#   返回变化的分组块与新的分组布局，耗时与修改量成正比，而不是与整张表成正比
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from operator import itemgetter
+
+from grouping import group_in_order
+
+# 统计列: 列0-4，原始数据从列5开始
+STATS_HEADERS = ['问题总标题', '问题归类', '用户情绪', '用户数量', '用户占比']
+DATA_COLUMN_OFFSET = len(STATS_HEADERS)
+# 分组键的默认值（单元格为空时）
+KEY_DEFAULTS = ('未分类', '未归类', '中性😐')
+
+MAX_STATES = 32  # 服务端最多保存的分组状态数，超出后淘汰最久未使用的
+
+
+class StatsStateError(Exception):
+    """增量重算无法进行（状态不存在或版本不一致），前端应改用全量重算"""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+def _cell_value(cell):
+    return cell['v'].get('v', '') if isinstance(cell['v'], dict) else cell['v']
+
+
+def parse_celldata(celldata):
+    """解析分析结果Sheet的 celldata（见 parse_cells）"""
+    return parse_cells((cell['r'], cell['c'], _cell_value(cell)) for cell in celldata)
+
+
+def parse_cells(cells):
+    """解析分析结果Sheet的单元格 (行, 列, 值)
+
+    格式: 行0是表头, 列0=问题总标题, 列1=问题归类, 列2=用户情绪, 列3+=其他数据。
+    合并单元格导致的空值用上方同列的值补齐。
+
+    Returns:
+        (headers, rows_data, max_col)：headers 为 {列号: 表头}，rows_data 为 {行号: {列号: 值}}
+    """
+    rows_data = {}
+    headers = {}
+    max_col = 0
+
+    for r, c, v in cells:
+        c = int(c)
+        if r == 0:
+            headers[c] = v
+            max_col = max(max_col, c)
+        else:
+            if r not in rows_data:
+                rows_data[r] = {}
+            rows_data[r][c] = v
+
+    # 补齐合并单元格导致的空值（将上方同列值向下填充）
+    last_summary = None
+    last_category = None
+    for r in sorted(rows_data.keys()):
+        row = rows_data[r]
+        if 0 in row and row[0] != '':
+            last_summary = row[0]
+        elif last_summary is not None:
+            row[0] = last_summary
+        if 1 in row and row[1] != '':
+            last_category = row[1]
+        elif last_category is not None:
+            row[1] = last_category
+
+    return headers, rows_data, max_col
+
+
+def edited_table_cells(table, changes):
+    """单元格表（r, c, v，见 sheet_codec.CellTableWriter）应用修改 [{'r', 'c', 'v'}, ...] 后的 (行, 列, 值)
+
+    修改已有单元格时保持其原有顺序，新增的单元格排在最后。
+    """
+    overrides = {}
+    for change in changes or []:
+        value = _cell_value(change) if 'v' in change else ''
+        overrides[(int(change['r']), int(change['c']))] = '' if value is None else value
+    for r, c, v in zip(table['r'].tolist(), table['c'].tolist(), table['v'].tolist()):
+        yield r, c, overrides.pop((r, c), v)
+    for (r, c), v in overrides.items():
+        yield r, c, v
+
+
+def data_headers(headers, max_col):
+    """动态数据列的表头（从列3开始）"""
+    return [headers[c] for c in range(3, max_col + 1) if c in headers]
+
+
+def group_key(summary, category, sentiment):
+    return (summary or KEY_DEFAULTS[0], category or KEY_DEFAULTS[1], sentiment or KEY_DEFAULTS[2])
+
+
+def group_rows(rows_data, max_col):
+    """按(问题总标题, 问题归类, 用户情绪)分组，按“类别 -> 首次出现顺序”排列
+
+    Returns:
+        [{'summary', 'category', 'sentiment', 'user_count', 'user_pct', 'data_rows'}, ...]
+    """
+    total_real_rows = len(rows_data)
+    data_columns = range(3, max_col + 1)
+    # (分组键, 该行所有其他列的数据)
+    rows = [
+        (group_key(row.get(0, ''), row.get(1, ''), row.get(2, '')), [row.get(c, '') for c in data_columns])
+        for row in rows_data.values()
+    ]
+
+    result_list = []
+    for key, members in group_in_order(rows, key=itemgetter(0), section=itemgetter(1)):
+        result_list.append({
+            'summary': key[0],
+            'category': key[1],
+            'sentiment': key[2],
+            'user_count': len(members),
+            'user_pct': format_pct(len(members), total_real_rows),
+            'data_rows': [data for _, data in members]
+        })
+    return result_list
+
+
+def format_pct(count, total):
+    user_pct = (count / total * 100) if total > 0 else 0
+    return f"{user_pct:.2f}%"
+
+
+def _sentiment_color(sentiment):
+    if '负面' in str(sentiment):
+        return '#FF0000'
+    if '正面' in str(sentiment):
+        return '#008000'
+    return '#000000'
+
+
+def group_cells(group, start_row):
+    """一个分组块的单元格：数据行（列5起）与统计列（列0-4，只在组首行，之后依赖合并）"""
+    cells = []
+    current_row = start_row
+    for row_data in group['data_rows']:
+        for idx, val in enumerate(row_data):
+            val_str = str(val)
+            cells.append({
+                'r': current_row,
+                'c': DATA_COLUMN_OFFSET + idx,
+                'v': {'v': val_str, 'm': val_str, 'ct': {'fa': 'General', 't': 'g'}}
+            })
+        current_row += 1
+
+    for c, key in ((0, 'summary'), (1, 'category')):
+        cells.append({
+            'r': start_row,
+            'c': c,
+            'v': {
+                'v': group[key],
+                'm': group[key],
+                'ct': {'fa': 'General', 't': 'g'},
+                'vt': 1, 'ht': 1,
+                'bg': '#E6F2FF'
+            }
+        })
+    # 用户情绪（带颜色）
+    cells.append({
+        'r': start_row,
+        'c': 2,
+        'v': {
+            'v': group['sentiment'],
+            'm': group['sentiment'],
+            'ct': {'fa': 'General', 't': 'g'},
+            'vt': 1, 'ht': 1,
+            'fc': _sentiment_color(group['sentiment'])
+        }
+    })
+    # 用户数量
+    cells.append({
+        'r': start_row,
+        'c': 3,
+        'v': {
+            'v': group['user_count'],
+            'm': str(group['user_count']),
+            'ct': {'fa': 'General', 't': 'n'},
+            'vt': 1, 'ht': 1
+        }
+    })
+    # 用户占比
+    cells.append({
+        'r': start_row,
+        'c': 4,
+        'v': {
+            'v': group['user_pct'],
+            'm': group['user_pct'],
+            'ct': {'fa': 'General', 't': 'g'},
+            'vt': 1, 'ht': 1
+        }
+    })
+    return cells
+
+
+def group_merges(start_row, rows_count):
+    """分组块统计列（列0-4）的合并配置"""
+    if rows_count <= 1:
+        return {}
+    return {
+        f"{start_row}_{col_idx}": {"r": start_row, "c": col_idx, "rs": rows_count, "cs": 1}
+        for col_idx in range(DATA_COLUMN_OFFSET)
+    }
+
+
+def render_stats_sheet(result_list, original_data_headers):
+    """构建带统计列的分析结果Sheet"""
+    new_celldata = []
+
+    # 新表头: [问题总标题, 问题归类, 用户情绪, 用户数量, 用户占比] + [原始数据列...]
+    for i, header in enumerate(STATS_HEADERS + original_data_headers):
+        new_celldata.append({
+            'r': 0,
+            'c': i,
+            'v': {
+                'v': header,
+                'm': header,
+                'ct': {'fa': 'General', 't': 'g'},
+                'bg': '#EDEBE9',
+                'bl': 1
+            }
+        })
+
+    current_row = 1
+    merge_config = {}
+    for group in result_list:
+        new_celldata.extend(group_cells(group, current_row))
+        merge_config.update(group_merges(current_row, len(group['data_rows'])))
+        current_row += len(group['data_rows'])
+
+    return {
+        'name': '分析结果',
+        'status': 1,  # 设置为活动sheet
+        'celldata': new_celldata,
+        'config': {
+            'merge': merge_config,
+            'columnlen': {
+                '0': 220,  # 问题总标题
+                '1': 120,  # 问题归类
+                '2': 100,  # 用户情绪
+                '3': 70,   # 用户数量
+                '4': 70,   # 用户占比
+                '5': 500   # VOC原声片段（默认第一列原始数据）
+            }
+        }
+    }
+
+
+class StatsState:
+    """全量重算结果的分组状态，坐标与返回给前端的统计Sheet一致（行0为表头，列5起为原始数据）
+
+    增量修改的规则：
+    - 组首行（合并单元格）的列0-2修改作用于整组；非组首行（如取消了合并）只作用于该行
+    - 分组键变为已有分组时并入该分组末尾；新分组放在同类别最后一个分组之后（新类别放在原类别之后）
+    - 修改的目标分组本身也被改名时（互换、链式改名），按修改前的布局整体重新分组，结果与全量重算一致
+    - 列3-4（用户数量、占比）与表头的修改会被忽略，由服务端计算
+    """
+
+    def __init__(self, result_list):
+        self.version = 1
+        self.total = sum(len(group['data_rows']) for group in result_list)
+        self._next_id = 0
+        self.groups = {}        # {分组ID: {'key', 'rows'}}
+        self.order = []         # 分组ID的显示顺序
+        self.key_to_id = {}
+        for group in result_list:
+            group_id = self._new_group((group['summary'], group['category'], group['sentiment']), group['data_rows'])
+            self.order.append(group_id)
+        self._starts = None
+
+    def _new_group(self, key, rows):
+        group_id = self._next_id
+        self._next_id += 1
+        self.groups[group_id] = {'key': key, 'rows': list(rows)}
+        self.key_to_id[key] = group_id
+        return group_id
+
+    def layout(self):
+        """[[分组ID, 行数], ...]（按显示顺序，可据此计算各分组块的起始行与合并范围）"""
+        return [[group_id, len(self.groups[group_id]['rows'])] for group_id in self.order]
+
+    def _locate(self, r):
+        """显示行号 -> (分组ID, 组内偏移)"""
+        if self._starts is None:
+            self._starts = []
+            start = 1
+            for group_id in self.order:
+                self._starts.append(start)
+                start += len(self.groups[group_id]['rows'])
+        i = bisect_right(self._starts, r) - 1
+        if i < 0:
+            return None
+        group_id = self.order[i]
+        offset = r - self._starts[i]
+        if offset >= len(self.groups[group_id]['rows']):
+            return None
+        return group_id, offset
+
+    def group_view(self, group_id):
+        group = self.groups[group_id]
+        summary, category, sentiment = group['key']
+        return {
+            'summary': summary,
+            'category': category,
+            'sentiment': sentiment,
+            'user_count': len(group['rows']),
+            'user_pct': format_pct(len(group['rows']), self.total),
+            'data_rows': group['rows']
+        }
+
+    def _place_after_category(self, group_id, category, anchor_category):
+        """将分组放到同类别最后一个分组之后；类别不存在时放到 anchor_category 类别的最后一个分组之后，保持各类别连续"""
+        index = self.order.index(group_id) if group_id in self.order else len(self.order)
+        if group_id in self.order:
+            self.order.remove(group_id)
+        position = None
+        anchor_position = None
+        for i, other_id in enumerate(self.order):
+            other_category = self.groups[other_id]['key'][1]
+            if other_category == category:
+                position = i + 1
+            elif other_category == anchor_category:
+                anchor_position = i + 1
+        if position is None:
+            position = anchor_position if anchor_position is not None else index
+        self.order.insert(position, group_id)
+
+    def _remove_group(self, group_id):
+        group = self.groups.pop(group_id)
+        if self.key_to_id.get(group['key']) == group_id:
+            del self.key_to_id[group['key']]
+        self.order.remove(group_id)
+
+    def _move_rows(self, rows, new_key, source_id, changed):
+        """将行移入分组键为 new_key 的分组（不存在时新建）"""
+        target_id = self.key_to_id.get(new_key)
+        if target_id is None:
+            target_id = self._new_group(new_key, rows)
+            self._place_after_category(target_id, new_key[1], self.groups[source_id]['key'][1])
+        else:
+            self.groups[target_id]['rows'].extend(rows)
+        changed.add(target_id)
+
+    def apply_changes(self, changes):
+        """应用单元格修改 [{'r', 'c', 'v'}, ...]（坐标为修改前的显示位置），返回变化的分组ID集合"""
+        changed = set()
+        group_edits = {}     # {分组ID: {列号: 值}}
+        row_edits = []       # [(分组ID, 行对象, {列号: 值})]
+        row_edit_index = {}
+
+        # 先按修改前的布局定位所有修改
+        for change in changes:
+            r, c = int(change['r']), int(change['c'])
+            value = _cell_value(change) if 'v' in change else ''
+            if value is None:
+                value = ''
+            location = self._locate(r) if r > 0 else None
+            if location is None:
+                continue
+            group_id, offset = location
+            rows = self.groups[group_id]['rows']
+            if c >= DATA_COLUMN_OFFSET:
+                idx = c - DATA_COLUMN_OFFSET
+                if idx < len(rows[offset]):
+                    rows[offset][idx] = value
+                    changed.add(group_id)
+            elif c < 3:
+                if offset == 0 or len(rows) == 1:
+                    group_edits.setdefault(group_id, {})[c] = value
+                else:
+                    row = rows[offset]
+                    if id(row) not in row_edit_index:
+                        row_edit_index[id(row)] = len(row_edits)
+                        row_edits.append((group_id, row, {}))
+                    row_edits[row_edit_index[id(row)]][2][c] = value
+
+        # 修改后的分组键都按修改前的状态计算；若某个修改的目标正是本次被改名的分组（互换、链式改名，
+        # 或移入随后被改名的分组），逐个合并的结果与全量重算不同，改为按修改前的布局整体重新分组
+        renamed = {}
+        for group_id, edits in group_edits.items():
+            key = self.groups[group_id]['key']
+            new_key = group_key(*(edits.get(c, key[c]) for c in range(3)))
+            if new_key != key:
+                renamed[group_id] = new_key
+        renamed_keys = {self.groups[group_id]['key'] for group_id in renamed}
+        row_targets = [
+            group_key(*(edits.get(c, self.groups[group_id]['key'][c]) for c in range(3)))
+            for group_id, _, edits in row_edits
+        ]
+        if renamed_keys.intersection(renamed.values()) or renamed_keys.intersection(row_targets):
+            return self._regroup(renamed, {id(row): new_key for (_, row, _), new_key in zip(row_edits, row_targets)})
+
+        # 非组首行的单独修改：从原分组取出后移入新分组
+        for group_id, row, edits in row_edits:
+            key = self.groups[group_id]['key']
+            new_key = group_key(*(edits.get(c, key[c]) for c in range(3)))
+            if new_key == key:
+                continue
+            rows = self.groups[group_id]['rows']
+            rows.pop(next(i for i, other in enumerate(rows) if other is row))
+            changed.add(group_id)
+            self._move_rows([row], new_key, group_id, changed)
+            if not rows:
+                self._remove_group(group_id)
+
+        # 整组修改：并入已有分组，或原地修改分组键
+        for group_id, edits in group_edits.items():
+            if group_id not in self.groups:
+                continue
+            key = self.groups[group_id]['key']
+            new_key = group_key(*(edits.get(c, key[c]) for c in range(3)))
+            if new_key == key:
+                continue
+            target_id = self.key_to_id.get(new_key)
+            if target_id is not None:
+                self.groups[target_id]['rows'].extend(self.groups[group_id]['rows'])
+                self._remove_group(group_id)
+                changed.add(target_id)
+            else:
+                del self.key_to_id[key]
+                self.groups[group_id]['key'] = new_key
+                self.key_to_id[new_key] = group_id
+                if new_key[1] != key[1]:
+                    self._place_after_category(group_id, new_key[1], key[1])
+                changed.add(group_id)
+
+        self._starts = None
+        self.version += 1
+        return {group_id for group_id in changed if group_id in self.groups}
+
+    def _regroup(self, renamed, row_keys):
+        """按修改前的显示顺序为每行计算新的分组键后整体重新分组（与 group_rows 的全量重算一致），返回所有分组ID
+
+        Args:
+            renamed: {分组ID: 新分组键}，整组修改
+            row_keys: {id(行对象): 新分组键}，非组首行的单独修改
+        """
+        rows = []
+        for group_id in self.order:
+            current_key = renamed.get(group_id, self.groups[group_id]['key'])
+            for row in self.groups[group_id]['rows']:
+                rows.append((row_keys.get(id(row), current_key), row))
+
+        self.groups = {}
+        self.order = []
+        self.key_to_id = {}
+        for key, members in group_in_order(rows, key=itemgetter(0), section=itemgetter(1)):
+            self.order.append(self._new_group(key, [row for _, row in members]))
+
+        self._starts = None
+        self.version += 1
+        return set(self.order)
+
+    def delta(self, changed):
+        """变化的分组块（行号相对于块首行，从0开始）与新的分组布局"""
+        return {
+            'version': self.version,
+            'total': self.total,
+            'layout': self.layout(),
+            'blocks': [[group_id, group_cells(self.group_view(group_id), 0)] for group_id in sorted(changed)]
+        }
+
+
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def save_state(file_id, state):
+    with _states_lock:
+        _states[file_id] = state
+        _states.move_to_end(file_id)
+        while len(_states) > MAX_STATES:
+            _states.popitem(last=False)
+
+
+def apply_delta(file_id, version, changes):
+    """对 fileId 对应的分组状态应用单元格修改，返回增量结果"""
+    with _states_lock:
+        state = _states.get(file_id)
+        if state is None:
+            raise StatsStateError('统计状态不存在，请全量重新计算', status=404)
+        _states.move_to_end(file_id)
+        if version != state.version:
+            raise StatsStateError(f'统计状态版本不一致（当前 {state.version}，请求 {version}），请全量重新计算')
+        changed = state.apply_changes(changes)
+        return state.delta(changed)
@@ -0,0 +1,256 @@
+# 分类体系与词表配置：分类Prompt中的角色设定、判别规则、分类列表，以及本地规则分析的情绪/分类关键词
+# - 内置 default 分类体系；TAXONOMY_DIR 下的每个 *.json 文件定义一个分类体系（文件名即名称，default.json 覆盖内置的）
+# - 加载时预编译为 Prompt 片段与关键词自动机（KeywordMatcher），分析时不再重复构造
+# - 配置文件修改后自动重新加载（无需重启，已在执行的任务继续使用开始时的版本）；文件有误时保留上一次成功加载的版本
+# - 每个分类体系有缓存版本号（cache_version），分类缓存、断点与本地模型都以它区分，分类体系变化后旧结果不会被复用
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+
+# Prompt版本号：修改Prompt模板（PROMPT_TEMPLATE 或 voc_analyzer 中的Prompt）后需递增，使旧的缓存结果失效
+PROMPT_VERSION = 'v1'
+
+# 未命中任何分类时的类别
+FALLBACK_CATEGORY = '其他问题'
+SENTIMENT_LABELS = ('正面😊', '负面😠', '中性😐')
+
+# 分类Prompt的公共部分（角色设定、判别规则与分类体系）模板
+PROMPT_TEMPLATE = """Role (角色设定):
+{role}
+
+Critical Rules (核心判别规则 - 必须严格遵守):
+{rules}
+
+Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
+{categories}
+"""
+
+DEFAULT_TAXONOMY = {
+    'version': '1',
+    'role': '你是一名拥有10年经验的 B2B SaaS 产品体验分析师。你的任务是清洗用户反馈数据（VOC），精准识别用户痛点，并进行标准化的分类归纳。',
+    'rules': [
+        '1. Bug vs. 灵活性 (最高优先级):',
+        '   - 判定为 [功能 - Bug/稳定性]：当用户描述"操作无效"、"报错"、"显示异常"、"死机"、"明明设置了但没反应"等预期功能失效的情况。',
+        '   - 判定为 [功能 - 灵活性/配置能力]：只有当用户明确表示"希望能自定义..."、"想要支持...功能"、"目前选项太少"等新增需求时。',
+        '   - 案例："主页板块加链接后图片不显示" -> [功能 - Bug/稳定性]。',
+        '',
+        '2. 概括度控制 (归纳法):',
+        '   - 将相似的具体问题向上归纳到父类目。',
+        '   - 案例："新手教程缺失"、"开发文档不全" -> [服务 - 帮助与引导]。',
+    ],
+    # 分类及其关键词（本地规则分析使用，得分相同时取靠前的分类）
+    'categories': {
+        '功能 - Bug/稳定性': ['功能', '不能', '无法', '不支持', '缺少', '没有', '缺失', '不完善', '不完整', '死机', '报错', '失效', '不显示'],
+        '功能 - 灵活性/配置能力': ['自定义', '配置', '选项', '灵活', '更多功能', '支持', '设置'],
+        '功能 - 实用性/完整度': ['半成品', '不好用', '鸡肋', '没用', '奇怪'],
+        '体验 - 操作复杂度': ['难找', '步骤', '复杂', '麻烦', '逻辑', '反人类', '难用'],
+        '体验 - 性能/加载速度': ['慢', '卡', '延迟', '加载', '响应', '卡顿', '速度', '性能', '优化'],
+        '资源 - 模板丰富度': ['模板', '风格', '主题', '样式'],
+        '资源 - 插件生态': ['插件', '扩展', '应用'],
+        '服务 - 帮助与引导': ['文档', '教程', '指引', '说明', '帮助', '客服', '支持'],
+    },
+    # 情绪关键词（正面/负面各自计数，重复的关键词按出现次数计分）
+    'positive_keywords': ['好', '满意', '喜欢', '推荐', '优秀', '棒', '赞', '不错', '很好', '完美',
+                          '赞', '给力', '好用', '方便', '快捷', '流畅', '清晰', '美观', '实用',
+                          '贴心', '专业', '高效', '稳定', '可靠', '值得', '超值', '惊喜'],
+    'negative_keywords': ['差', '不好', '失望', '问题', '错误', '慢', '卡', '崩溃', 'bug', '故障',
+                          '糟糕', '垃圾', '难用', '复杂', '麻烦', '延迟', '卡顿', '闪退', '死机',
+                          '不兼容', '缺失', '不足', '缺陷', '漏洞', '不安全', '贵', '不值'],
+}
+
+
+class TaxonomyError(ValueError):
+    """分类体系配置有误"""
+
+
+def _text_block(value, field):
+    """字符串，或按行拆分的字符串列表"""
+    if isinstance(value, list) and all(isinstance(line, str) for line in value):
+        return '\n'.join(value)
+    if isinstance(value, str):
+        return value
+    raise TaxonomyError(f'{field} 必须是字符串或字符串列表')
+
+
+def _keyword_list(value, field):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(keyword, str) for keyword in value):
+        raise TaxonomyError(f'{field} 必须是字符串列表')
+    return value
+
+
+class Taxonomy:
+    """预编译的分类体系（创建后不再修改，可在多个任务间共享）"""
+
+    def __init__(self, name, definition, cache_version=None):
+        """
+        Args:
+            name: 分类体系名称
+            definition: 配置内容（格式见 DEFAULT_TAXONOMY / taxonomy.example.json）
+            cache_version: 缓存版本号，为空时由 Prompt 版本、配置中的 version 与内容摘要组成
+        """
+        if not isinstance(definition, dict):
+            raise TaxonomyError('分类体系配置必须是JSON对象')
+        categories = definition.get('categories')
+        if not isinstance(categories, dict) or not categories:
+            raise TaxonomyError('categories 必须是非空对象：{分类名称: [关键词, ...]}')
+        for category in categories:
+            if not category.strip():
+                raise TaxonomyError('分类名称不能为空')
+
+        self.name = name
+        self.version = str(definition.get('version', '1'))
+        self.categories = list(categories)
+        self.role = _text_block(definition.get('role', DEFAULT_TAXONOMY['role']), 'role')
+        self.rules = _text_block(definition.get('rules', []), 'rules')
+        self.positive_keywords = _keyword_list(definition.get('positive_keywords'), 'positive_keywords')
+        self.negative_keywords = _keyword_list(definition.get('negative_keywords'), 'negative_keywords')
+        self.category_keywords = {
+            category: _keyword_list(keywords, f'categories[{category}]')
+            for category, keywords in categories.items()
+        }
+
+        # 预编译：Prompt 片段与关键词自动机（得分依次为 [正面, 负面, 各分类...]）
+        self.prompt = PROMPT_TEMPLATE.format(
+            role=self.role,
+            rules=self.rules,
+            categories='\n'.join(f'- {category}' for category in self.categories)
+        )
+        self.matcher = KeywordMatcher({
+            '\x00positive': self.positive_keywords,
+            '\x00negative': self.negative_keywords,
+            **self.category_keywords
+        })
+
+        if cache_version is None:
+            # 摘要覆盖 Prompt 与全部词表：即使修改配置时忘记修改 version，旧的结果也不会被复用
+            digest = hashlib.sha256(json.dumps(
+                [self.prompt, self.positive_keywords, self.negative_keywords, self.category_keywords],
+                ensure_ascii=False
+            ).encode('utf-8')).hexdigest()[:12]
+            cache_version = f'{PROMPT_VERSION}/{name}@{self.version}/{digest}'
+        self.cache_version = cache_version
+
+    def info(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'cacheVersion': self.cache_version,
+            'categories': self.categories
+        }
+
+    def classify(self, text):
+        """关键词规则分类：(情绪, 分类)"""
+        scores = self.matcher.scores(str(text))
+        positive, negative, category_scores = scores[0], scores[1], scores[2:]
+        if positive > negative and positive > 0:
+            sentiment = SENTIMENT_LABELS[0]
+        elif negative > 0:
+            sentiment = SENTIMENT_LABELS[1]
+        else:
+            sentiment = SENTIMENT_LABELS[2]
+        return sentiment, self._best_category(category_scores)
+
+    def classify_many(self, texts):
+        """批量的 classify：整列文本一次计算关键词得分，判定按列向量化"""
+        scores = self.matcher.score_many([str(text) for text in texts])
+        positive, negative, category_scores = scores[:, 0], scores[:, 1], scores[:, 2:]
+        sentiments = np.where((positive > negative) & (positive > 0), 0, np.where(negative > 0, 1, 2))
+        best = category_scores.argmax(axis=1)
+        matched = category_scores[np.arange(len(best)), best] > 0
+        return [
+            (SENTIMENT_LABELS[sentiment], self.categories[category] if has_category else FALLBACK_CATEGORY)
+            for sentiment, category, has_category in zip(sentiments.tolist(), best.tolist(), matched.tolist())
+        ]
+
+    def categorize(self, text):
+        """关键词规则得到的分类"""
+        return self._best_category(self.matcher.scores(str(text))[2:])
+
+    def _best_category(self, category_scores):
+        """得分最高的类别（得分相同时取靠前的），没有命中任何关键词时为“其他问题”"""
+        best = max(range(len(category_scores)), key=category_scores.__getitem__)
+        if category_scores[best] > 0:
+            return self.categories[best]
+        return FALLBACK_CATEGORY
+
+
+class TaxonomyRegistry:
+    """按名称提供分类体系，配置目录中的文件新增、修改或删除后自动重新加载；多个分析任务共享"""
+
+    def __init__(self, directory, default='default', check_interval=5.0):
+        """
+        Args:
+            directory: 分类体系配置目录（*.json），不存在时只有内置的 default
+            default: 请求未指定分类体系时使用的名称
+            check_interval: 检查配置文件变化的最短间隔（秒）
+        """
+        self.directory = directory
+        self.default = default
+        self.check_interval = check_interval
+        # 内置分类体系沿用原有的缓存版本号，已有的分类缓存继续有效
+        self._builtin = Taxonomy('default', DEFAULT_TAXONOMY, cache_version=PROMPT_VERSION)
+        self._taxonomies = {'default': self._builtin}
+        self._mtimes = {}           # {文件路径: 修改时间}
+        self._loaded = {}           # {文件路径: Taxonomy}，最近一次成功加载的版本
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        """返回分类体系，名称不存在时返回None"""
+        with self._lock:
+            self._refresh_locked()
+            return self._taxonomies.get(name or self.default)
+
+    def list(self):
+        with self._lock:
+            self._refresh_locked()
+            return [taxonomy.info() for taxonomy in self._taxonomies.values()]
+
+    def _refresh_locked(self):
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        mtimes = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                continue
+        if mtimes == self._mtimes:
+            return
+
+        for path, mtime in mtimes.items():
+            if self._mtimes.get(path) == mtime:
+                continue
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    definition = json.load(f)
+                taxonomy = Taxonomy(name, definition)
+            except (OSError, ValueError) as e:
+                previous = self._loaded.get(path)
+                print(f"[Taxonomy] 加载失败 {path}: {e}"
+                      + (f"，继续使用版本 {previous.cache_version}" if previous else ''))
+                continue
+            self._loaded[path] = taxonomy
+            print(f"[Taxonomy] 已加载分类体系 {name}（{len(taxonomy.categories)} 个分类，缓存版本 {taxonomy.cache_version}）")
+        for path in set(self._loaded) - set(mtimes):
+            print(f"[Taxonomy] 配置文件已删除: {path}")
+            del self._loaded[path]
+        self._mtimes = mtimes
+
+        taxonomies = {'default': self._builtin}
+        for taxonomy in self._loaded.values():
+            taxonomies[taxonomy.name] = taxonomy
+        self._taxonomies = taxonomies
@@ -0,0 +1,88 @@
+import numpy as np
+
+from classification_cache import ClassificationCache
+from feedback_dedup import group_duplicates, minhash_signature
+from text_utils import normalize_text
+
+
+def exact_groups_reference(texts):
+    """逐条比较归一化文本的直接实现（归一化后为空的行各自成组）"""
+    groups = []
+    for idx, text in enumerate(texts):
+        for group in groups:
+            if normalize_text(text) and normalize_text(texts[group[0]]) == normalize_text(text):
+                group.append(idx)
+                break
+        else:
+            groups.append([idx])
+    return groups
+
+
+def test_empty_and_single_input():
+    assert group_duplicates([]) == []
+    assert group_duplicates([], near_threshold=0.8) == []
+    assert group_duplicates(['登录失败']) == [[0]]
+    assert group_duplicates(['登录失败'], near_threshold=0.8) == [[0]]
+
+
+def test_all_duplicates_collapse_into_first_row():
+    texts = ['登录失败！', '登录 失败', '登录失败']
+    assert group_duplicates(texts) == [[0, 1, 2]]
+    assert group_duplicates(texts, near_threshold=0.9) == [[0, 1, 2]]
+
+
+def test_exact_groups_match_reference():
+    texts = ['App 很卡', 'app很卡！', '闪退', None, '', '闪退。', 'Ａｐｐ很卡', '？？', '无法登录']
+    assert group_duplicates(texts) == exact_groups_reference(texts)
+    assert group_duplicates(texts, near_threshold=0) == exact_groups_reference(texts)
+
+
+def test_symbols_and_emoji_are_kept():
+    assert normalize_text('好评 👍！') == '好评👍'
+    assert normalize_text('价格 > 预期') == '价格>预期'
+    texts = ['👍', '😡', '???', '!!!', '好评👍', '好评😡']
+    assert group_duplicates(texts) == [[0], [1], [2], [3], [4], [5]]
+    assert group_duplicates(texts, near_threshold=0.5) == [[0], [1], [2], [3], [4], [5]]
+
+
+def test_empty_keys_are_never_grouped():
+    texts = ['', '。。。', None, '   ', '闪退', '闪退！']
+    assert group_duplicates(texts) == [[0], [1], [2], [3], [4, 5]]
+    assert group_duplicates(texts, near_threshold=0.1) == [[0], [1], [2], [3], [4, 5]]
+
+
+def test_cache_skips_empty_keys_and_keeps_emoji_apart(tmp_path):
+    cache = ClassificationCache(str(tmp_path / 'cache.db'))
+    try:
+        cache.put('？？？', 'v1', 'model', [{'category': '其他'}])
+        assert cache.get('！！！', 'v1', 'model') is None
+        assert cache.get_many(['？？？', ''], 'v1', 'model') == {}
+
+        cache.put('好评👍', 'v1', 'model', [{'sentiment': '正面'}])
+        assert cache.get('好评😡', 'v1', 'model') is None
+        assert cache.get_many(['', '好评 👍'], 'v1', 'model') == {1: [{'sentiment': '正面'}]}
+    finally:
+        cache.close()
+
+
+def test_near_duplicates_merge_only_above_threshold():
+    texts = [
+        '每次打开应用都会闪退，希望尽快修复这个问题',
+        '完全无关的反馈：界面颜色太暗了',
+        '每次打开应用都会闪退，希望尽快修复这个问题吧',
+    ]
+    assert group_duplicates(texts, near_threshold=0.7) == [[0, 2], [1]]
+    # 只有一半内容相同的反馈不会在高阈值下合并
+    half_similar = ['每次打开应用都会闪退', '每次打开设置页面都很慢']
+    assert group_duplicates(half_similar, near_threshold=0.9) == [[0], [1]]
+
+
+def test_minhash_similarity_tracks_jaccard():
+    a = normalize_text('每次打开应用都会闪退希望尽快修复')
+    b = normalize_text('每次打开应用都会闪退希望尽快修复啊')
+    c = normalize_text('界面颜色太暗看不清楚')
+    same = np.mean(minhash_signature(a) == minhash_signature(b))
+    different = np.mean(minhash_signature(a) == minhash_signature(c))
+    assert same > 0.7
+    assert different < 0.2
+    assert np.array_equal(minhash_signature(a), minhash_signature(a))
@@ -0,0 +1,67 @@
+from operator import itemgetter
+
+from grouping import group_in_order
+from stats_engine import format_pct, group_key, group_rows
+
+
+def legacy_group_rows(rows_data, max_col):
+    """改为 group_in_order 之前的 group_rows 实现"""
+    total_real_rows = len(rows_data)
+    groups = {}
+    category_order = []
+    group_order = []
+    for row in rows_data.values():
+        key = group_key(row.get(0, ''), row.get(1, ''), row.get(2, ''))
+        row_extra_data = [row.get(c, '') for c in range(3, max_col + 1)]
+        if key not in groups:
+            if key[1] not in category_order:
+                category_order.append(key[1])
+            group_order.append(key)
+            groups[key] = {'summary': key[0], 'category': key[1], 'sentiment': key[2], 'user_count': 0, 'data_rows': []}
+        groups[key]['user_count'] += 1
+        groups[key]['data_rows'].append(row_extra_data)
+    result_list = []
+    for cat in category_order:
+        for key in [k for k in group_order if k[1] == cat]:
+            group = groups[key]
+            group['user_pct'] = format_pct(group['user_count'], total_real_rows)
+            result_list.append(group)
+    return result_list
+
+
+def test_group_in_order_edge_cases():
+    assert group_in_order([], key=str) == []
+    assert group_in_order([], key=str, section=len) == []
+    assert group_in_order(['a'], key=str) == [('a', ['a'])]
+    assert group_in_order(['a', 'a', 'a'], key=str) == [('a', ['a', 'a', 'a'])]
+
+
+def test_group_in_order_keeps_first_appearance():
+    items = [('b', 1), ('a', 2), ('b', 3), ('c', 4), ('a', 5)]
+    assert group_in_order(items, key=itemgetter(0)) == [
+        ('b', [('b', 1), ('b', 3)]),
+        ('a', [('a', 2), ('a', 5)]),
+        ('c', [('c', 4)]),
+    ]
+
+
+def test_group_in_order_sections_are_contiguous():
+    items = ['x1', 'y1', 'x2', 'z1', 'y2', 'x1']
+    grouped = group_in_order(items, key=str, section=itemgetter(0))
+    assert [key for key, _ in grouped] == ['x1', 'x2', 'y1', 'y2', 'z1']
+    assert grouped[0] == ('x1', ['x1', 'x1'])
+
+
+def test_group_rows_matches_legacy_implementation():
+    rows_data = {
+        1: {0: '登录失败', 1: '功能', 2: '负面', 3: 'a'},
+        2: {0: '卡顿', 1: '体验', 2: '负面', 3: 'b'},
+        3: {0: '登录失败', 1: '功能', 2: '负面', 3: 'c', 4: 'extra'},
+        4: {0: '', 1: '', 2: '', 3: 'd'},
+        5: {0: '界面好看', 1: '体验', 2: '正面', 3: 'e'},
+        6: {0: '登录失败', 1: '功能', 2: '中性', 3: 'f'},
+    }
+    assert group_rows(rows_data, 4) == legacy_group_rows(rows_data, 4)
+    assert group_rows({}, 3) == legacy_group_rows({}, 3) == []
+    single = {1: {0: 'A', 1: 'B', 2: 'C', 3: 'x'}}
+    assert group_rows(single, 3) == legacy_group_rows(single, 3)
@@ -0,0 +1,56 @@
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+
+LEXICONS = {
+    '负面': ['卡', '卡顿', '闪退', '不好', '好'],
+    '正面': ['好', '好用', '流畅'],
+    '功能': ['登录', '登录失败', '录失', '失败'],
+    '重复': ['卡', '卡'],
+}
+
+TEXTS = [
+    '',
+    '卡',
+    '很卡顿，还闪退',
+    '不好用',
+    '登录失败了',
+    '好好好',
+    '没有任何关键词',
+    '卡卡顿顿流畅好用',
+]
+
+
+def substring_scores(lexicons, text):
+    """改用自动机之前的逐个关键词子串判断"""
+    return [sum(1 for keyword in keywords if keyword in text) for keywords in lexicons.values()]
+
+
+def test_scores_match_substring_scan():
+    matcher = KeywordMatcher(LEXICONS)
+    assert matcher.labels == list(LEXICONS)
+    for text in TEXTS:
+        assert matcher.scores(text) == substring_scores(LEXICONS, text), text
+
+
+def test_overlapping_and_nested_keywords():
+    matcher = KeywordMatcher(LEXICONS)
+    found = {matcher.keywords[i] for i in matcher.find('登录失败')}
+    assert found == {'登录', '登录失败', '录失', '失败'}
+    assert {matcher.keywords[i] for i in matcher.find('不好用')} == {'不好', '好', '好用'}
+
+
+def test_score_many_matches_scores():
+    matcher = KeywordMatcher(LEXICONS)
+    expected = np.array([matcher.scores(text) for text in TEXTS])
+    assert np.array_equal(matcher.score_many(TEXTS), expected)
+    assert matcher.score_many([]).shape == (0, len(LEXICONS))
+
+
+def test_empty_lexicons():
+    matcher = KeywordMatcher({})
+    assert matcher.scores('任何文本') == []
+    assert matcher.score_many(['a', 'b']).shape == (2, 0)
+    matcher = KeywordMatcher({'空': []})
+    assert matcher.scores('任何文本') == [0]
+    assert matcher.score_many(['a']).tolist() == [[0]]
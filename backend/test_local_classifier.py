@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from local_classifier import LocalClassifier, LocalModelLoader, normalize_sentiment
+from ngram_features import HashedNgramVectorizer, char_ngrams
+
+SAMPLES = [
+    ('登录总是失败', '账号-登录失败', '负面😠', 1.0),
+    ('无法登录账号', '账号-登录失败', '负面😠', 1.0),
+    ('登录一直报错', '账号-登录失败', '负面😠', 1.0),
+    ('界面很好看', '体验-界面美观', '正面😊', 1.0),
+    ('界面设计漂亮', '体验-界面美观', '正面😊', 1.0),
+    ('界面颜色好看', '体验-界面美观', '正面😊', 1.0),
+]
+
+
+def dense(matrix):
+    result = np.zeros((len(matrix), matrix.n_features))
+    for row in range(len(matrix)):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        np.add.at(result[row], matrix.indices[start:end], matrix.data[start:end])
+    return result
+
+
+def test_char_ngrams():
+    assert char_ngrams('') == []
+    assert char_ngrams('A b!', (1, 2)) == ['a', 'b', 'ab']
+
+
+def test_sparse_operations_match_dense():
+    texts = ['登录失败', '', '界面好看好看', '登录']
+    vectorizer = HashedNgramVectorizer(64, (1, 2)).fit(texts)
+    X = vectorizer.transform(texts)
+    X_dense = dense(X)
+    norms = np.linalg.norm(X_dense, axis=1)
+    assert np.allclose(norms, [1, 0, 1, 1])
+
+    weights = np.random.RandomState(0).rand(64, 3)
+    assert np.allclose(X.dot(weights), X_dense @ weights)
+    selection = np.array([2, 0])
+    assert np.allclose(dense(X.rows(selection)), X_dense[selection])
+    assert X.row_ids().tolist() == [row for row in range(len(X)) for _ in range(X.indptr[row + 1] - X.indptr[row])]
+
+
+def test_train_predict_and_persist(tmp_path):
+    model = LocalClassifier.train(SAMPLES, n_features=1 << 12, epochs=30, batch_size=4, lr=0.2)
+    assert model.predict([]) == []
+    predictions = model.predict(['登录失败了', '界面真好看'])
+    assert [p['category'] for p in predictions] == ['账号-登录失败', '体验-界面美观']
+    assert [p['sentiment'] for p in predictions] == ['负面😠', '正面😊']
+    assert all(0 < p['confidence'] <= 1 for p in predictions)
+
+    path = str(tmp_path / 'model.npz')
+    model.save(path)
+    loaded = LocalClassifier.load(path)
+    assert loaded.predict(['登录失败了', '界面真好看']) == predictions
+    assert loaded.meta['samples'] == len(SAMPLES)
+
+
+def test_train_requires_two_classes():
+    single_class = [(text, '账号-登录失败', '负面😠', 1.0) for text, *_ in SAMPLES]
+    with pytest.raises(ValueError):
+        LocalClassifier.train(single_class, n_features=1 << 10)
+    with pytest.raises(ValueError):
+        LocalClassifier.train(SAMPLES[:1], n_features=1 << 10)
+
+
+def test_loader_without_model_file(tmp_path):
+    assert LocalModelLoader(str(tmp_path / 'missing.npz')).get() is None
+
+
+def test_normalize_sentiment():
+    assert normalize_sentiment('负面😞') == '负面😠'
+    assert normalize_sentiment('正面') == '正面😊'
+    assert normalize_sentiment(None) == '中性😐'
@@ -0,0 +1,62 @@
+import json
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+import process_pool
+from process_pool import EncodedJSON, encode_json, run_cpu_task
+from voc_analyzer import build_packed_result_sheets, build_result_sheets, pack_opinions
+
+
+def test_encode_json_embeds_fragments_and_cleans_nan():
+    fragment = EncodedJSON(encode_json([{'v': float('nan')}]), 1)
+    assert json.loads(encode_json({'sheets': fragment, 'x': float('inf')})) == {'sheets': [{'v': ''}], 'x': ''}
+
+
+def test_broken_pool_falls_back_to_inline_permanently(monkeypatch):
+    class BrokenExecutor:
+        submitted = 0
+
+        def submit(self, fn, *args):
+            BrokenExecutor.submitted += 1
+            raise BrokenProcessPool('child died')
+
+        def shutdown(self, wait=True):
+            pass
+
+    monkeypatch.setattr(process_pool, '_executor', BrokenExecutor())
+    assert run_cpu_task(sum, [1, 2]) == 3
+    assert process_pool._executor is False
+    # 不再重建（fork）进程池
+    assert run_cpu_task(sum, [3, 4]) == 7
+    assert BrokenExecutor.submitted == 1
+
+
+def make_opinions(df):
+    rows = df.to_dict('records')
+    summaries = ['登录失败-功能', '界面卡顿-体验', '登录失败-功能']
+    return [{
+        'row_id': i + 1,
+        'summary': summaries[i],
+        'sentiment': '负面😞',
+        'snippet': row['反馈'],
+        'full_feedback': row['反馈'],
+        'row_data': row
+    } for i, row in enumerate(rows)]
+
+
+def test_packed_sheets_match_direct_build():
+    df = pd.DataFrame({'反馈': ['登录不了', '很卡', '密码错误'], '评分': [1, 2, None]})
+    columns = df.columns.tolist()
+    opinions = make_opinions(df)
+
+    for needs_df in (True, False):
+        # 不需要 DataFrame 时原始数据Sheet已给出，各行的数据随精简记录发送
+        original_sheet_data = None if needs_df else {'name': '原始数据'}
+        args = (len(opinions), columns, df if needs_df else None, original_sheet_data, None,
+                False, False, True, True, 0.0)
+        expected, expected_cells = build_result_sheets(opinions, *args)
+        packed = pack_opinions(opinions, columns, with_values=not needs_df)
+        actual, actual_cells = build_packed_result_sheets(packed, '反馈', *args)
+        assert actual.data == expected.data
+        assert actual_cells.equals(expected_cells)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limit import CircuitBreaker, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def test_breaker_allows_single_probe_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.01)
+    breaker.record_failure("u")
+    assert breaker.allow("u")
+    breaker.record_failure("u")
+    assert not breaker.allow("u")
+    time.sleep(0.02)
+    assert breaker.allow("u")
+    assert not breaker.allow("u")
+    breaker.record_success("u")
+    assert breaker.allow("u")
+
+
+def test_release_probe_returns_to_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.01)
+    breaker.trip("u")
+    time.sleep(0.02)
+    assert breaker.allow("u")
+    breaker.release_probe("u")
+    assert breaker.allow("u")
+    # 探测失败后重新熔断
+    breaker.record_failure("u")
+    assert not breaker.allow("u")
+
+
+def test_unresolved_probe_does_not_block_endpoint(analyzer, fake_response, fake_transport):
+    url = "http://a.test"
+    throttled = fake_response(429, headers={"Retry-After": "0"})
+    analyzer.transport = fake_transport({url: [throttled]})
+    analyzer.hf_free_api_urls = [url]
+    analyzer.circuit_breaker.trip(url)
+    time.sleep(0.02)
+
+    assert asyncio.run(analyzer._generate_with_api("hf_free", "prompt", include_demoted=True)) is None
+    assert len(analyzer.transport.calls) == 3
+    # 探测请求多次429后未记录成功/失败，端点恢复为半开，可以再次探测
+    assert analyzer.circuit_breaker.allow(url)
+
+
+def test_cancelled_probe_does_not_block_endpoint(analyzer):
+    url = "http://a.test"
+
+    class HangingTransport:
+        async def apost(self, url, headers=None, json=None):
+            await asyncio.sleep(10)
+
+    analyzer.transport = HangingTransport()
+    analyzer.hf_free_api_urls = [url]
+    analyzer.circuit_breaker.trip(url)
+    time.sleep(0.02)
+
+    async def run():
+        task = asyncio.ensure_future(analyzer._generate_with_api("hf_free", "prompt", include_demoted=True))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert analyzer.circuit_breaker.allow(url)
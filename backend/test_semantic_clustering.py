@@ -0,0 +1,85 @@
+import numpy as np
+
+from feedback_dedup import group_duplicates
+from semantic_clustering import cluster_texts, embed_texts, leader_cluster
+
+
+def naive_leader_cluster(vectors, threshold):
+    """逐个元素与各簇代表向量比较的直接实现（单个向量块内 leader_cluster 的行为）"""
+    labels = []
+    representatives = []
+    for index, vector in enumerate(vectors):
+        similarities = [float(vectors[rep] @ vector) for rep in representatives]
+        if similarities and max(similarities) >= threshold:
+            labels.append(int(np.argmax(similarities)))
+        else:
+            labels.append(len(representatives))
+            representatives.append(index)
+    return labels, representatives
+
+
+def random_unit_vectors(n, dim=16, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(4, dim)
+    vectors = centers[rng.randint(0, 4, size=n)] + 0.3 * rng.randn(n, dim)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_empty_input():
+    labels, representatives = leader_cluster(iter([]), 0.5)
+    assert labels.tolist() == [] and representatives == []
+    labels, representatives = leader_cluster([np.zeros((0, 8), dtype=np.float32)], 0.5)
+    assert labels.tolist() == [] and representatives == []
+
+
+def test_single_item():
+    labels, representatives = leader_cluster([embed_texts(['登录失败'])], 0.5)
+    assert labels.tolist() == [0] and representatives == [0]
+
+
+def test_all_duplicates_form_one_cluster():
+    vectors = embed_texts(['登录失败'] * 5)
+    labels, representatives = leader_cluster([vectors[:2], vectors[2:]], 0.9)
+    assert labels.tolist() == [0] * 5 and representatives == [0]
+
+
+def test_single_chunk_matches_naive_reference():
+    vectors = random_unit_vectors(60)
+    for threshold in (0.3, 0.7, 0.95):
+        labels, representatives = leader_cluster([vectors], threshold)
+        assert (labels.tolist(), representatives) == naive_leader_cluster(vectors, threshold)
+
+
+def test_blocks_and_cluster_limit():
+    vectors = embed_texts(['登录失败', '登录失败', '登录失败'])
+    labels, _ = leader_cluster([vectors], 0.5, blocks=[0, 1, 0])
+    assert labels.tolist() == [0, 1, 0]
+    # 簇数达到上限后，新元素单独成簇
+    vectors = embed_texts(['登录失败', '界面很卡', '界面很卡'])
+    labels, representatives = leader_cluster([vectors], 0.9, max_clusters=1)
+    assert labels.tolist() == [0, 1, 2]
+    assert representatives == [0, 1, 2]
+
+
+def test_embed_texts():
+    assert embed_texts([]).shape == (0, 256)
+    vectors = embed_texts(['登录失败', '登录失败了', '界面颜色'])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_cluster_texts_edge_cases():
+    assert cluster_texts([], 0.5) == []
+    assert cluster_texts(['登录失败'], 0.5) == [[[0]]]
+    assert cluster_texts(['登录失败', '登录失败！', '登录 失败'], 0.5) == [[[0, 1, 2]]]
+
+
+def test_cluster_texts_without_merging_matches_exact_dedup():
+    texts = ['界面卡顿', '登录失败', '界面很卡顿', '登录失败了', '界面卡顿。']
+    assert cluster_texts(texts, 1.01) == [[group] for group in group_duplicates(texts)]
+
+
+def test_cluster_texts_groups_similar_feedback():
+    texts = ['界面卡顿', '登录失败', '界面很卡顿', '登录失败了', '界面卡顿']
+    # 大的组成为簇的代表，簇按首次出现的行排列
+    assert cluster_texts(texts, 0.4) == [[[0, 4], [2]], [[1], [3]]]
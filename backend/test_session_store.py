@@ -0,0 +1,66 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from session_store import SessionError, SessionStore
+
+
+def table(value):
+    return {'data': pd.DataFrame({'反馈': [value, value + '2']})}
+
+
+def test_put_and_reload_from_disk(tmp_path):
+    store = SessionStore(str(tmp_path), max_memory=1)
+    store.put('a', table('x'))
+    store.put('b', table('y'))
+    session = store.get('a', version=1)
+    assert session.tables['data']['反馈'].tolist() == ['x', 'x2']
+    with pytest.raises(SessionError) as excinfo:
+        store.get('a', version=2)
+    assert excinfo.value.status == 409
+
+
+def test_expired_sessions_are_purged_on_startup(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.put('old', table('x'))
+    store.put('new', table('y'))
+    stale = time.time() - 10 * 86400
+    os.utime(tmp_path / 'old' / 'meta.pkl', (stale, stale))
+
+    store = SessionStore(str(tmp_path), ttl_days=7)
+    assert sorted(os.listdir(tmp_path)) == ['new']
+    with pytest.raises(SessionError):
+        store.get('old', wait=0)
+
+
+def test_oldest_sessions_are_purged_beyond_max_disk(tmp_path):
+    store = SessionStore(str(tmp_path), max_memory=1, max_disk=2)
+    for i, file_id in enumerate(['a', 'b', 'c']):
+        store.put(file_id, table(file_id))
+        updated = time.time() - 100 + i
+        os.utime(tmp_path / file_id / 'meta.pkl', (updated, updated))
+    store.put('d', table('d'))
+    assert sorted(os.listdir(tmp_path)) == ['c', 'd']
+
+
+def test_unreadable_session_is_removed(tmp_path):
+    store = SessionStore(str(tmp_path), max_memory=1)
+    store.put('a', table('x'))
+    store.put('b', table('y'))
+    (tmp_path / 'a' / 'meta.pkl').write_bytes(b'broken')
+    with pytest.raises(SessionError):
+        store.get('a', wait=0)
+    assert not (tmp_path / 'a').exists()
+
+
+def test_release_wakes_waiting_get(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.reserve('a')
+    store.release('a')
+    started = time.monotonic()
+    with pytest.raises(SessionError) as excinfo:
+        store.get('a', wait=5)
+    assert excinfo.value.status == 404
+    assert time.monotonic() - started < 1
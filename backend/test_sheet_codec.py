@@ -0,0 +1,87 @@
+import pandas as pd
+
+from sheet_codec import CelldataWriter, CompactSheetWriter, CompactStreamWriter, encode_sheet, expand_sheet
+from voc_analyzer import VOCAnalyzer
+from workbook_io import dataframe_to_celldata, dataframe_to_compact
+
+
+def sorted_cells(celldata):
+    return sorted(celldata, key=lambda cell: (cell['r'], cell['c']))
+
+
+def test_empty_sheet_round_trip():
+    sheet = {'name': 'S', 'celldata': []}
+    assert expand_sheet(encode_sheet(sheet)) == sheet
+    assert expand_sheet(CompactSheetWriter().sheet(name='S')) == sheet
+
+
+def test_single_cell_round_trip():
+    writer = CelldataWriter()
+    writer.add(0, 0, '1', value=1)
+    sheet = writer.sheet(name='S')
+    assert expand_sheet(encode_sheet(sheet)) == sheet
+
+
+def test_round_trip_keeps_values_styles_and_merges():
+    writer = CelldataWriter()
+    writer.add(0, 0, '标题', style={'bg': '#EDEBE9', 'bl': 1})
+    writer.add(0, 1, '数量', style={'bg': '#EDEBE9', 'bl': 1})
+    writer.add(1, 0, '登录失败', style={'vt': 1, 'ht': 1})
+    writer.add(1, 1, '3', value=3)
+    writer.add(2, 1, '3.5', value=3.5)
+    writer.add(3, 0, '登录失败')
+    writer.add(3, 1, '登录失败')
+    config = {'merge': {'1_0': {'r': 1, 'c': 0, 'rs': 2, 'cs': 1}, '0_0': {'r': 0, 'c': 0, 'rs': 1, 'cs': 2}},
+              'columnlen': {'0': 220}}
+    sheet = writer.sheet(config=config, name='S', index=1)
+
+    compact = encode_sheet(sheet)
+    assert 'celldata' not in compact
+    # 单列合并改为游程编码，其他合并保留在 config 中
+    assert compact['config']['merge'] == {'0_0': config['merge']['0_0']}
+    # 重复文本只保存一次
+    assert compact['compact']['strings'].count('登录失败') == 1
+
+    expanded = expand_sheet(compact)
+    assert expanded['celldata'] == sorted_cells(sheet['celldata'])
+    assert expanded['config'] == config
+    assert {k: v for k, v in expanded.items() if k not in ('celldata', 'config')} == {'name': 'S', 'index': 1}
+
+
+def test_compact_analysis_sheet_matches_standard():
+    opinions = [
+        {'row_id': 1, 'summary': '登录失败-功能', 'sentiment': '负面😞', 'row_data': {'反馈': '登录不了', '评分': 1}},
+        {'row_id': 2, 'summary': '卡顿-体验', 'sentiment': '负面😞', 'row_data': {'反馈': '很卡', '评分': 2}},
+        {'row_id': 3, 'summary': '登录失败-功能', 'sentiment': '负面😞', 'row_data': {'反馈': '登录不了', '评分': None}},
+    ]
+    standard = VOCAnalyzer.generate_analysis_sheet(opinions, 3, '分析结果', original_columns=['反馈', '评分'])
+    compact = VOCAnalyzer.generate_analysis_sheet(opinions, 3, '分析结果', original_columns=['反馈', '评分'], compact=True)
+    expanded = expand_sheet(compact)
+    assert expanded['celldata'] == sorted_cells(standard['celldata'])
+    assert expanded['config'] == standard['config']
+
+
+def test_dataframe_compact_matches_celldata():
+    df = pd.DataFrame({'反馈': ['a', None, 'a'], '评分': [1.0, 2.5, None]})
+    expanded = expand_sheet(dataframe_to_compact(df, name='原始数据'))
+    assert expanded['celldata'] == sorted_cells(dataframe_to_celldata(df))
+    assert expand_sheet(dataframe_to_compact(pd.DataFrame(), name='空'))['celldata'] == []
+
+
+def test_stream_writer_segments_round_trip():
+    standard = CelldataWriter()
+    writer = CompactStreamWriter()
+    columns = []
+    for r in range(5):
+        for c, value in enumerate([f'反馈{r % 2}', r, 0.5 * r]):
+            standard.add(r, c, str(value), value=value)
+            writer.add(r, c, str(value), value=value)
+        if writer.pending >= 6:
+            columns.extend(writer.flush_columns())
+    columns.extend(writer.flush_columns())
+    assert writer.pending == 0
+    # 每个行块的每一列各为一个片段
+    assert [segment['c'] for segment in columns] == [0, 1, 2, 0, 1, 2, 0, 1, 2]
+
+    compact = {'name': 'S', 'compact': {'version': 1, 'columns': columns, **writer.tail()}}
+    assert expand_sheet(compact)['celldata'] == standard.sheet(name='S')['celldata']
@@ -0,0 +1,92 @@
+import pytest
+
+import stats_engine
+from stats_engine import StatsState, group_rows
+
+# 显示布局（行0为表头）:
+# 1-2: (A, c1, 负面)  3: (B, c1, 正面)  4-5: (C, c2, 中性)
+ROWS = {
+    1: {0: 'A', 1: 'c1', 2: '负面', 3: 'a1'},
+    2: {0: 'A', 1: 'c1', 2: '负面', 3: 'a2'},
+    3: {0: 'B', 1: 'c1', 2: '正面', 3: 'b1'},
+    4: {0: 'C', 1: 'c2', 2: '中性', 3: 'c1'},
+    5: {0: 'C', 1: 'c2', 2: '中性', 3: 'c2'},
+}
+MAX_COL = 3
+
+
+def new_state():
+    return StatsState(group_rows({r: dict(row) for r, row in ROWS.items()}, MAX_COL))
+
+
+def full_recalculation(changes):
+    """按增量重算的规则在修改前的表上应用修改后全量重算：组首行的列0-2作用于整组，其他行只作用于该行"""
+    heads = {}
+    start = 1
+    for group in group_rows(ROWS, MAX_COL):
+        for r in range(start, start + group['user_count']):
+            heads[r] = start
+        start += group['user_count']
+    head_edits = {}
+    row_edits = {}
+    for change in changes:
+        r, c = change['r'], change['c']
+        target = head_edits if heads[r] == r else row_edits
+        target.setdefault(r, {})[c] = change['v']
+    rows_data = {}
+    for r, row in ROWS.items():
+        row = dict(row)
+        row.update(head_edits.get(heads[r], {}))
+        row.update(row_edits.get(r, {}))
+        rows_data[r] = row
+    return group_rows(rows_data, MAX_COL)
+
+
+def delta_result(changes):
+    state = new_state()
+    state.apply_changes(changes)
+    return [state.group_view(group_id) for group_id in state.order]
+
+
+def test_group_title_swap_matches_full_recalculation():
+    changes = [{'r': 1, 'c': 0, 'v': 'B'}, {'r': 1, 'c': 2, 'v': '正面'},
+               {'r': 3, 'c': 0, 'v': 'A'}, {'r': 3, 'c': 2, 'v': '负面'}]
+    result = delta_result(changes)
+    assert result == full_recalculation(changes)
+    assert [group['user_count'] for group in result] == [2, 1, 2]
+
+
+def test_chained_renames_match_full_recalculation():
+    # A -> B, B -> D：A 的行应成为 B，原 B 的行成为 D，而不是全部并入 D
+    changes = [{'r': 1, 'c': 0, 'v': 'B'}, {'r': 1, 'c': 2, 'v': '正面'},
+               {'r': 3, 'c': 0, 'v': 'D'}]
+    result = delta_result(changes)
+    assert result == full_recalculation(changes)
+    assert {group['summary']: group['user_count'] for group in result} == {'B': 2, 'D': 1, 'C': 2}
+
+
+def test_row_moved_into_renamed_group_matches_full_recalculation():
+    # 第2行移入 C，同时 C 改名为 E：第2行应留在 C
+    changes = [{'r': 2, 'c': 0, 'v': 'C'}, {'r': 2, 'c': 1, 'v': 'c2'}, {'r': 2, 'c': 2, 'v': '中性'},
+               {'r': 4, 'c': 0, 'v': 'E'}]
+    result = delta_result(changes)
+    assert result == full_recalculation(changes)
+    assert {group['summary']: group['user_count'] for group in result} == {'A': 1, 'B': 1, 'C': 1, 'E': 2}
+
+
+def test_merge_into_existing_group_is_incremental():
+    state = new_state()
+    changed = state.apply_changes([{'r': 3, 'c': 0, 'v': 'A'}, {'r': 3, 'c': 2, 'v': '负面'}])
+    assert [group_id for group_id, _ in state.layout()] == [0, 2]
+    assert changed == {0}
+    assert state.group_view(0)['data_rows'] == [['a1'], ['a2'], ['b1']]
+
+
+def test_apply_delta_rejects_stale_version():
+    stats_engine.save_state('test-file', new_state())
+    delta = stats_engine.apply_delta('test-file', 1, [{'r': 1, 'c': 5, 'v': 'x'}])
+    assert delta['version'] == 2
+    assert [group_id for group_id, _ in delta['blocks']] == [0]
+    with pytest.raises(stats_engine.StatsStateError) as excinfo:
+        stats_engine.apply_delta('test-file', 1, [])
+    assert excinfo.value.status == 409
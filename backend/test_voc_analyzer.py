@@ -0,0 +1,80 @@
+import asyncio
+
+
+def run_generate(analyzer, api_type="hf_free"):
+    return asyncio.run(analyzer._generate_with_api(api_type, "prompt"))
+
+
+def test_invalid_json_body_falls_through_to_next_endpoint(analyzer, fake_response, fake_transport):
+    analyzer.transport = fake_transport({
+        "http://a.test": [fake_response(200, ValueError("Expecting value"), text="<html>")],
+        "http://b.test": [fake_response(200, [{"generated_text": "ok"}])],
+    })
+
+    assert run_generate(analyzer) == "ok"
+    assert analyzer.provider_health.is_demoted("http://a.test")
+    assert analyzer.provider_health.preferred == ("hf_free", "http://b.test")
+
+
+def test_unexpected_shape_falls_through_to_next_endpoint(analyzer, fake_response, fake_transport):
+    analyzer.transport = fake_transport({
+        "http://a.test": [fake_response(200, [42])],
+        "http://b.test": [fake_response(200, {"text": "ok"})],
+    })
+
+    assert run_generate(analyzer) == "ok"
+    assert analyzer.provider_health.is_demoted("http://a.test")
+
+
+def test_unexpected_tongyi_shape_is_a_failure(analyzer, fake_response, fake_transport):
+    analyzer.tongyi_key = "key"
+    analyzer.transport = fake_transport({
+        analyzer.tongyi_api_url: [fake_response(200, {"output": {"choices": [{"message": {}}]}})],
+    })
+
+    assert run_generate(analyzer, "tongyi") is None
+    assert analyzer.provider_health.is_demoted(analyzer.tongyi_api_url)
+
+
+def test_malformed_response_moves_on_to_next_provider(analyzer, fake_response, fake_transport):
+    analyzer.tongyi_key = "key"
+    analyzer.api_priority = ["tongyi", "hf_free", "local"]
+    analyzer.transport = fake_transport({
+        analyzer.tongyi_api_url: [fake_response(200, {"output": {"choices": []}, "unexpected": True})],
+        "http://a.test": [fake_response(200, [{"generated_text": "from hf"}])],
+    })
+
+    result, reached_local = asyncio.run(analyzer._generate_by_priority("prompt", lambda text: text))
+    assert (result, reached_local) == ("from hf", False)
+
+
+def make_opinions(summaries):
+    return [
+        {'row_id': i + 1, 'summary': summary, 'sentiment': '负面😠', 'full_feedback': summary.split('-')[-1]}
+        for i, summary in enumerate(summaries)
+    ]
+
+
+def test_merge_similar_groups_edge_cases():
+    from voc_analyzer import merge_similar_groups
+
+    assert merge_similar_groups([], 0.5) == []
+    single = make_opinions(['功能-登录失败'])
+    assert merge_similar_groups(single, 0.5) is single
+    duplicates = make_opinions(['功能-登录失败'] * 3)
+    assert merge_similar_groups(duplicates, 0.5) is duplicates
+
+
+def test_merge_similar_groups_within_category():
+    from voc_analyzer import merge_similar_groups
+
+    opinions = make_opinions([
+        '功能-登录失败', '功能-登录失败', '体验-界面卡顿', '功能-登录总是失败', '体验-登录失败',
+    ])
+    merged = merge_similar_groups(opinions, 0.5)
+    assert [opinion['summary'] for opinion in merged] == [
+        '功能-登录失败', '功能-登录失败', '体验-界面卡顿', '功能-登录失败', '体验-登录失败',
+    ]
+    assert merged[3]['row_id'] == 4 and merged[3]['full_feedback'] == opinions[3]['full_feedback']
+    # 阈值为1时没有可合并的分组，原样返回
+    assert merge_similar_groups(opinions, 1.0) is opinions
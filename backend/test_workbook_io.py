@@ -0,0 +1,95 @@
+import json
+
+import openpyxl
+import pytest
+
+import workbook_io
+from sheet_codec import expand_sheet
+from workbook_io import open_workbook, stream_upload_json
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = '反馈'
+    ws.append(['反馈', '评分'])
+    ws.append(['登录不了', 1])
+    ws.append(['很卡', 2])
+    wb.create_sheet('其他').append(['x'])
+    path = tmp_path / 'upload.xlsx'
+    wb.save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_stream_upload_json_is_valid_json(workbook_path, compact):
+    chunks = list(stream_upload_json(open_workbook(workbook_path), workbook_path, 'f1', dumps, compact=compact, version=1))
+    data = json.loads(''.join(chunks))
+    assert data['fileId'] == 'f1'
+    assert data['version'] == 1
+    assert data['originalSheets'] == ['反馈', '其他']
+    assert [sheet['name'] for sheet in data['sheets']] == ['反馈', '其他']
+    assert 'error' not in data
+    if compact:
+        data['sheets'] = [expand_sheet(sheet) for sheet in data['sheets']]
+    assert {'r': 1, 'c': 0, 'v': {'v': '登录不了', 'm': '登录不了', 'ct': {'fa': 'General', 't': 'g'}}} in data['sheets'][0]['celldata']
+    assert {'r': 2, 'c': 1, 'v': {'v': 2, 'm': '2', 'ct': {'fa': 'General', 't': 'g'}}} in data['sheets'][0]['celldata']
+
+
+def test_first_chunk_contains_first_sheet_cells(workbook_path):
+    first_chunk = next(stream_upload_json(open_workbook(workbook_path), workbook_path, 'f1', dumps))
+    assert '登录不了' in first_chunk
+
+
+def test_failure_before_first_chunk_raises(workbook_path, monkeypatch):
+    def broken(ws):
+        raise ValueError('bad sheet')
+        yield
+
+    monkeypatch.setattr(workbook_io, 'iter_sheet_cells', broken)
+    with pytest.raises(ValueError):
+        next(stream_upload_json(open_workbook(workbook_path), workbook_path, 'f1', dumps))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_failure_mid_stream_ends_with_error_field(workbook_path, monkeypatch, compact):
+    original = workbook_io.iter_sheet_cells
+    calls = []
+
+    def fails_on_second_sheet(ws):
+        calls.append(ws.title)
+        if len(calls) > 1:
+            yield 0, 0, 'partial'
+            raise ValueError('bad cell')
+        yield from original(ws)
+
+    monkeypatch.setattr(workbook_io, 'iter_sheet_cells', fails_on_second_sheet)
+    chunks = stream_upload_json(open_workbook(workbook_path), workbook_path, 'f1', dumps, compact=compact)
+    data = json.loads(''.join(chunks))
+    assert data['error'] == '处理文件失败: bad cell'
+    assert [sheet['name'] for sheet in data['sheets']] == ['反馈', '其他']
+
+
+def test_large_compact_sheet_is_sent_in_chunks(tmp_path, monkeypatch):
+    wb = openpyxl.Workbook()
+    for i in range(100):
+        wb.active.append([f'反馈{i % 7}', i])
+    path = str(tmp_path / 'large.xlsx')
+    wb.save(path)
+    monkeypatch.setattr(workbook_io, 'CELLS_PER_CHUNK', 20)
+
+    chunks = list(stream_upload_json(open_workbook(path), path, 'f1', dumps, compact=True))
+    # 200 个单元格每 20 个输出一块，另有结尾的字符串表与 config
+    assert len(chunks) >= 10
+    # 第一块已包含列片段，共享字符串表在最后一块
+    assert '"values"' in chunks[0] and '"strings"' not in chunks[0]
+
+    compact = json.loads(''.join(chunks))['sheets'][0]
+    standard = json.loads(''.join(stream_upload_json(open_workbook(path), path, 'f1', dumps)))['sheets'][0]
+    assert len(compact['compact']['columns']) == 20
+    assert expand_sheet(compact)['celldata'] == standard['celldata']
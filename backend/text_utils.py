@@ -0,0 +1,22 @@
+# 反馈文本的通用处理函数
+import unicodedata
+
+# 归一化规则版本，规则变化时更新，避免旧的缓存键命中
+NORMALIZE_VERSION = 2
+
+
+def _is_stripped(ch):
+    # 只去除空白和Unicode标点（P*），保留符号与表情（S*）
+    return ch.isspace() or unicodedata.category(ch).startswith('P')
+
+
+def normalize_text(text):
+    """归一化反馈文本，用于缓存键与去重
+    - 全角/半角统一（NFKC）
+    - 英文统一小写
+    - 去除所有空白和标点（表情、符号保留）
+    """
+    if text is None:
+        return ''
+    normalized = unicodedata.normalize('NFKC', str(text)).lower()
+    return ''.join(ch for ch in normalized if not _is_stripped(ch))
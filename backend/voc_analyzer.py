@@ -1,9 +1,13 @@
 import openpyxl
-import requests
+import copy
 import json
 import re
 import os
 import math
+import threading
+import asyncio
+import weakref
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from openpyxl import load_workbook
@@ -19,6 +23,97 @@ except ImportError:
     TONGYI_MODEL = "qwen-turbo"
     API_PRIORITY = ["hf_token", "tongyi", "hf_free", "local"]
 
+from settings import get_setting
+from classification_cache import ClassificationCache
+from checkpoint_store import CheckpointStore
+from local_classifier import LOCAL_MODEL_PATH, LocalModelLoader, normalize_sentiment
+from feedback_dedup import group_duplicates
+from provider_transport import ProviderTransport
+from rate_limit import AdaptiveRateLimiter, CircuitBreaker, parse_retry_after
+from provider_health import ProviderHealth
+from workbook_io import dataframe_to_celldata, dataframe_to_compact, iter_sheet_cells, read_analysis_sheet, sheet_cell_text
+from sheet_codec import CellTableWriter, CelldataWriter, sheet_writer, write_table
+from grouping import group_in_order
+from semantic_clustering import CHUNK_SIZE, cluster_texts, embed_texts, leader_cluster
+from text_utils import normalize_text
+from taxonomy import TaxonomyError, TaxonomyRegistry
+from process_pool import EncodedJSON, encode_json, run_cpu_task
+
+# 同时进行中的AI请求上限（1 表示逐行串行分析）
+ANALYSIS_CONCURRENCY = get_setting('ANALYSIS_CONCURRENCY', 4)
+# 每个Prompt打包的反馈条数（1 表示逐条分析）
+ANALYSIS_BATCH_SIZE = get_setting('ANALYSIS_BATCH_SIZE', 1)
+# 分类结果持久化缓存
+CLASSIFICATION_CACHE_ENABLED = get_setting('CLASSIFICATION_CACHE_ENABLED', True)
+CLASSIFICATION_CACHE_PATH = get_setting('CLASSIFICATION_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classification_cache.db'))
+CLASSIFICATION_CACHE_MAX_ENTRIES = get_setting('CLASSIFICATION_CACHE_MAX_ENTRIES', 100000)
+# 分析任务断点：逐行保存分析结果，终止或超时后可继续分析
+ANALYSIS_CHECKPOINT_ENABLED = get_setting('ANALYSIS_CHECKPOINT_ENABLED', True)
+ANALYSIS_CHECKPOINT_PATH = get_setting('ANALYSIS_CHECKPOINT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_checkpoints.db'))
+ANALYSIS_CHECKPOINT_TTL_DAYS = get_setting('ANALYSIS_CHECKPOINT_TTL_DAYS', 7)
+# 分析前合并重复反馈：归一化后完全相同的反馈只分析一次
+ANALYSIS_DEDUP_ENABLED = get_setting('ANALYSIS_DEDUP_ENABLED', True)
+# 近似重复的相似度阈值（0~1，基于 MinHash 估计的 Jaccard 相似度），0 表示不合并近似重复
+ANALYSIS_DEDUP_NEAR_THRESHOLD = get_setting('ANALYSIS_DEDUP_NEAR_THRESHOLD', 0.0)
+# 结果Sheet生成前合并相近的分组（问题标题+归类及其反馈的 n-gram 向量余弦相似度阈值，0~1），0 表示不合并
+ANALYSIS_GROUP_MERGE_THRESHOLD = get_setting('ANALYSIS_GROUP_MERGE_THRESHOLD', 0.0)
+ANALYSIS_GROUP_MERGE_MEMORY_MB = get_setting('ANALYSIS_GROUP_MERGE_MEMORY_MB', 64)
+# 分析流程：per_row 为逐条（去重后）调用AI；cluster 为先在本地按 n-gram 相似度聚类，每簇只把代表样本发给AI，结果分发给簇内所有行
+ANALYSIS_PIPELINE = get_setting('ANALYSIS_PIPELINE', 'per_row')
+ANALYSIS_CLUSTER_THRESHOLD = get_setting('ANALYSIS_CLUSTER_THRESHOLD', 0.7)
+ANALYSIS_CLUSTER_SAMPLES = get_setting('ANALYSIS_CLUSTER_SAMPLES', 5)
+# 本地分类模型（API_PRIORITY 中的 local_model）：置信度达到阈值的反馈不再调用远程API
+LOCAL_MODEL_THRESHOLD = get_setting('LOCAL_MODEL_THRESHOLD', 0.8)
+# 分类体系与词表配置目录（每个 *.json 一个分类体系，修改后自动重新加载）及默认使用的分类体系
+TAXONOMY_DIR = get_setting('TAXONOMY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxonomies'))
+TAXONOMY_DEFAULT = get_setting('TAXONOMY_DEFAULT', 'default')
+# AI接口的HTTP连接参数
+HTTP_CONNECT_TIMEOUT = get_setting('HTTP_CONNECT_TIMEOUT', 5.0)
+HTTP_READ_TIMEOUT = get_setting('HTTP_READ_TIMEOUT', 30.0)
+HTTP2_ENABLED = get_setting('HTTP2_ENABLED', False)
+# 每个AI服务的自适应限流（次/秒）：收到429时速率减半，成功后逐步回升
+RATE_LIMIT_INITIAL_RPS = get_setting('RATE_LIMIT_INITIAL_RPS', 10.0)
+RATE_LIMIT_MIN_RPS = get_setting('RATE_LIMIT_MIN_RPS', 0.2)
+RATE_LIMIT_MAX_RPS = get_setting('RATE_LIMIT_MAX_RPS', 50.0)
+# 熔断：端点连续失败次数达到阈值后，在冷却期（秒）内不再调用
+CIRCUIT_FAILURE_THRESHOLD = get_setting('CIRCUIT_FAILURE_THRESHOLD', 3)
+CIRCUIT_COOLDOWN = get_setting('CIRCUIT_COOLDOWN', 60.0)
+# 已降级的AI端点由后台定期重新探测的间隔（秒）
+PROVIDER_PROBE_INTERVAL = get_setting('PROVIDER_PROBE_INTERVAL', 30.0)
+
+# 各API类型的日志标签
+API_LOG_TAGS = {
+    "hf_token": "HF Token API",
+    "tongyi": "通义千问API",
+    "hf_free": "HF Free API",
+}
+
+def split_summary(summary_text):
+    """拆分分类：前半部分为归类（功能/体验），后半部分为总问题标题
+
+    Returns:
+        (问题标题, 问题归类)
+    """
+    if not summary_text:
+        return "其他问题", ""
+    text = str(summary_text).strip()
+    parts = [p.strip() for p in re.split(r'[-—]', text, maxsplit=1)]
+    if len(parts) == 2 and parts[0] and parts[1]:
+        return parts[1], parts[0]  # (问题标题, 问题归类)
+    return text, ""  # 没有明确归类时，整句作为标题
+
+
+def cell_text(val):
+    """原始列的单元格文本，NaN/inf 显示为空"""
+    if isinstance(val, float) and (math.isnan(val) or math.isinf(val)):
+        return ""
+    return str(val)
+
+
+class AnalysisStopped(Exception):
+    """分析被用户终止（异步分析中使用，同步入口会转换为 KeyboardInterrupt）"""
+
+
 class VOCAnalyzer:
     def __init__(self):
         # 加载API配置
@@ -49,6 +144,76 @@ class VOCAnalyzer:
         self.current_api_index = 0
         self.use_local_analysis = False
         self.stop_flag = None
+        # 增量模式下每完成一批行就调用 row_callback(opinions)
+        self.row_callback = None
+        # 分析完成后调用 table_callback(cells)：分析结果Sheet的单元格表（见 sheet_codec.CellTableWriter），供服务端会话保存
+        self.table_callback = None
+        # 断点：checkpoint_job 为任务标识（通常是 fileId），为空时不保存断点；resume=True 时跳过断点中已完成的行
+        self.checkpoint_job = None
+        self.resume = False
+        self.max_concurrency = max(1, int(ANALYSIS_CONCURRENCY))
+        self.batch_size = max(1, int(ANALYSIS_BATCH_SIZE))
+        self.dedup_enabled = ANALYSIS_DEDUP_ENABLED
+        self.dedup_near_threshold = float(ANALYSIS_DEDUP_NEAR_THRESHOLD or 0)
+        self.group_merge_threshold = float(ANALYSIS_GROUP_MERGE_THRESHOLD or 0)
+        # 分析流程（per_row / cluster），可按任务修改
+        self.pipeline = ANALYSIS_PIPELINE
+        self.cluster_threshold = float(ANALYSIS_CLUSTER_THRESHOLD)
+        self.cluster_samples = max(1, int(ANALYSIS_CLUSTER_SAMPLES))
+        
+        # 共享的HTTP连接池，大小与分析并发数一致
+        self.transport = ProviderTransport(
+            pool_size=self.max_concurrency,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            http2=HTTP2_ENABLED
+        )
+        
+        # 每个AI服务一个限流器；熔断按端点（URL）记录
+        self.rate_limiters = {
+            api_type: AdaptiveRateLimiter(
+                api_type,
+                rate=RATE_LIMIT_INITIAL_RPS,
+                min_rate=RATE_LIMIT_MIN_RPS,
+                max_rate=RATE_LIMIT_MAX_RPS
+            )
+            for api_type in ("hf_token", "tongyi", "hf_free")
+        }
+        self.circuit_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN)
+        # 每个事件循环一个请求信号量，限制同时进行中的AI请求数
+        self._request_semaphores = weakref.WeakKeyDictionary()
+        self._semaphore_lock = threading.Lock()
+        # 记住最近可用的端点；失败端点降级后由后台探测恢复
+        self.provider_health = ProviderHealth(self._probe_endpoint, PROVIDER_PROBE_INTERVAL)
+        
+        # 分类结果缓存
+        self.cache = None
+        if CLASSIFICATION_CACHE_ENABLED:
+            try:
+                self.cache = ClassificationCache(CLASSIFICATION_CACHE_PATH, CLASSIFICATION_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                print(f"[VOC Analyzer] 分类缓存初始化失败，将不使用缓存: {e}")
+        
+        # 本地分类模型（python local_classifier.py train 生成），模型文件更新后自动重新加载
+        self.local_model = LocalModelLoader(LOCAL_MODEL_PATH)
+        self.local_model_threshold = float(LOCAL_MODEL_THRESHOLD)
+        
+        # 分类体系（Prompt与本地词表），配置文件修改后自动重新加载；每个任务开始时固定使用当时的版本（见 for_job）
+        self.taxonomies = TaxonomyRegistry(TAXONOMY_DIR, TAXONOMY_DEFAULT)
+        self._taxonomy = None
+        
+        # 分析任务断点
+        self.checkpoints = None
+        if ANALYSIS_CHECKPOINT_ENABLED:
+            try:
+                self.checkpoints = CheckpointStore(ANALYSIS_CHECKPOINT_PATH, ANALYSIS_CHECKPOINT_TTL_DAYS)
+            except Exception as e:
+                print(f"[VOC Analyzer] 分析断点初始化失败，将不保存断点: {e}")
+        
+        # 单次分析的统计信息（缓存命中等），多线程下通过锁更新
+        self._stats_lock = threading.Lock()
+        self.run_stats = {}
+        self.reset_run_stats()
         
         # 打印配置信息
         print(f"[VOC Analyzer] 初始化完成")
@@ -57,43 +222,95 @@ class VOCAnalyzer:
         if self.tongyi_key:
             print(f"[VOC Analyzer] 通义千问API Key已配置，模型: {self.tongyi_model}")
         print(f"[VOC Analyzer] API优先级: {', '.join(self.api_priority)}")
+        print(f"[VOC Analyzer] 分析并发数: {self.max_concurrency}，每批反馈数: {self.batch_size}")
+        print(f"[VOC Analyzer] 默认分类体系: {self.taxonomy.name}（缓存版本 {self.taxonomy.cache_version}）")
     
     def set_stop_flag(self, stop_flag):
         """设置停止标志"""
         self.stop_flag = stop_flag
-    
-    def analyze_with_ai(self, text):
-        """使用Qwen AI分析文本情感和分类，按优先级尝试不同的API"""
-        if self.use_local_analysis:
-            return self.local_analyze(text)
-        
-        # 构造prompt
-        prompt = f"""Role (角色设定):
-你是一名拥有10年经验的 B2B SaaS 产品体验分析师。你的任务是清洗用户反馈数据（VOC），精准识别用户痛点，并进行标准化的分类归纳。
-
-Critical Rules (核心判别规则 - 必须严格遵守):
-1. Bug vs. 灵活性 (最高优先级):
-   - 判定为 [功能 - Bug/稳定性]：当用户描述"操作无效"、"报错"、"显示异常"、"死机"、"明明设置了但没反应"等预期功能失效的情况。
-   - 判定为 [功能 - 灵活性/配置能力]：只有当用户明确表示"希望能自定义..."、"想要支持...功能"、"目前选项太少"等新增需求时。
-   - 案例："主页板块加链接后图片不显示" -> [功能 - Bug/稳定性]。
-
-2. 概括度控制 (归纳法):
-   - 将相似的具体问题向上归纳到父类目。
-   - 案例："新手教程缺失"、"开发文档不全" -> [服务 - 帮助与引导]。
-
-Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
-- 功能 - Bug/稳定性
-- 功能 - 灵活性/配置能力
-- 功能 - 实用性/完整度
-- 体验 - 操作复杂度
-- 体验 - 性能/加载速度
-- 资源 - 模板丰富度
-- 资源 - 插件生态
-- 服务 - 帮助与引导
 
+    @property
+    def taxonomy(self):
+        """当前使用的分类体系：任务分析器为任务开始时的版本，否则为默认分类体系的最新版本"""
+        return self._taxonomy or self.taxonomies.get() or self.taxonomies.get('default')
+
+    def for_job(self, taxonomy=None):
+        """为单个分析任务创建分析器
+        - 共享连接池、限流、熔断、端点健康状态、分类缓存与断点存储
+        - 停止标志、回调、断点设置与统计信息各自独立，并发任务互不覆盖
+        - 分类体系在创建时固定（taxonomy 为名称，为空时使用默认分类体系），任务执行中配置被修改也不受影响
+        """
+        job_analyzer = copy.copy(self)
+        job_analyzer._taxonomy = self.taxonomies.get(taxonomy) if taxonomy else self.taxonomy
+        if job_analyzer._taxonomy is None:
+            raise TaxonomyError(f'分类体系不存在: {taxonomy}')
+        job_analyzer.stop_flag = None
+        job_analyzer.progress_callback = None
+        job_analyzer.row_callback = None
+        job_analyzer.table_callback = None
+        job_analyzer.checkpoint_job = None
+        job_analyzer.resume = False
+        job_analyzer._stats_lock = threading.Lock()
+        job_analyzer.reset_run_stats()
+        return job_analyzer
+
+    def reset_run_stats(self):
+        """重置单次分析的统计信息"""
+        with self._stats_lock:
+            self.run_stats = {'cache_hits': 0, 'cache_misses': 0, 'dedup_saved': 0, 'resumed': 0, 'local_model_hits': 0}
+
+    def _add_stat(self, name, count=1):
+        with self._stats_lock:
+            self.run_stats[name] = self.run_stats.get(name, 0) + count
+
+    def get_run_stats(self):
+        """返回当前统计信息的副本"""
+        with self._stats_lock:
+            return dict(self.run_stats)
+
+    def _report_progress(self, current, total, message):
+        """通过 progress_callback 汇报进度，附带去重与缓存命中情况"""
+        if not (hasattr(self, 'progress_callback') and self.progress_callback):
+            return
+        stats = self.get_run_stats()
+        details = []
+        if stats.get('resumed'):
+            details.append(f"从断点恢复 {stats['resumed']} 条")
+        if stats.get('dedup_saved'):
+            details.append(f"去重节省 {stats['dedup_saved']} 次调用")
+        if stats.get('cluster_saved'):
+            details.append(f"聚类节省 {stats['cluster_saved']} 次调用")
+        if self.cache is not None:
+            details.append(f"缓存命中 {stats['cache_hits']}，未命中 {stats['cache_misses']}")
+        if stats.get('local_model_hits'):
+            details.append(f"本地模型 {stats['local_model_hits']} 条")
+        if details:
+            message = f"{message}（{'；'.join(details)}）"
+        self.progress_callback(current, total, message)
+
+    def cache_model_name(self):
+        """缓存键中的模型标识：按优先级列出会被调用的远程API及模型
+        - 优先级中 local 排在所有远程API之前时返回None，不使用缓存
+        """
+        parts = []
+        for api_type in self.api_priority:
+            if api_type == "local":
+                break
+            if api_type == "hf_token" and self.hf_token:
+                parts.append("hf_token")
+            elif api_type == "tongyi" and self.tongyi_key:
+                parts.append(f"tongyi:{self.tongyi_model}")
+            elif api_type == "hf_free":
+                parts.append("hf_free")
+        return '|'.join(parts) or None
+    
+    def build_prompt(self, text):
+        """构造单条反馈的分类Prompt"""
+        taxonomy = self.taxonomy
+        return f"""{taxonomy.prompt}
 请分析以下用户反馈，返回一个JSON对象：
 {{
-    "category": "必须从上方Taxonomy列表中选择一个标准的分类名称 (例如: 功能 - Bug/稳定性)",
+    "category": "必须从上方Taxonomy列表中选择一个标准的分类名称 (例如: {taxonomy.categories[0]})",
     "sentiment": "正面😊/负面😠/中性😐",
     "rationale": "简短的分类理由"
 }}
@@ -101,75 +318,349 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
 用户反馈：{text}
 
 请只返回单个JSON对象："""
+
+    def build_batch_prompt(self, items):
+        """构造多条反馈的批量分类Prompt
+
+        Args:
+            items: [(feedback_id, text), ...]，每条反馈带一个稳定ID，模型需原样返回
+        """
+        feedback_lines = []
+        for feedback_id, text in items:
+            # 每条反馈压成一行，避免换行打乱ID与内容的对应关系
+            single_line = ' '.join(str(text).split())
+            feedback_lines.append(f"[{feedback_id}] {single_line}")
+        feedback_block = '\n'.join(feedback_lines)
+        taxonomy = self.taxonomy
+
+        return f"""{taxonomy.prompt}
+请逐条分析以下 {len(items)} 条用户反馈（每条以方括号内的ID开头），返回一个JSON数组，每条反馈对应数组中的一个对象：
+[
+    {{
+        "id": "反馈的ID，必须与方括号内的ID完全一致 (例如: r1)",
+        "category": "必须从上方Taxonomy列表中选择一个标准的分类名称 (例如: {taxonomy.categories[0]})",
+        "sentiment": "正面😊/负面😠/中性😐"
+    }}
+]
+
+用户反馈列表：
+{feedback_block}
+
+请只返回JSON数组，每条反馈恰好对应一个对象："""
+
+    def build_cluster_prompt(self, samples):
+        """构造一簇相似反馈的分类Prompt：返回整簇的分类、情绪与问题总标题
+
+        Args:
+            samples: 簇的代表样本
+        """
+        taxonomy = self.taxonomy
+        sample_lines = '\n'.join(f"- {' '.join(str(text).split())}" for text in samples)
+
+        return f"""{taxonomy.prompt}
+以下 {len(samples)} 条用户反馈内容相近，反映的是同一类问题。请概括这组反馈，返回一个JSON对象：
+{{
+    "category": "必须从上方Taxonomy列表中选择一个标准的分类名称 (例如: {taxonomy.categories[0]})",
+    "sentiment": "正面😊/负面😠/中性😐",
+    "title": "问题总标题：用一句简短的话（不超过15个字）概括这组反馈反映的具体问题"
+}}
+
+用户反馈：
+{sample_lines}
+
+请只返回单个JSON对象："""
+
+    def analyze_with_ai(self, text):
+        """使用Qwen AI分析文本情感和分类，按优先级尝试不同的API（同步入口）"""
+        return self._run_sync(self.analyze_with_ai_async, text)
+
+    def analyze_batch_with_ai(self, texts):
+        """批量分析多条反馈（同步入口），见 analyze_batch_with_ai_async"""
+        return self._run_sync(self.analyze_batch_with_ai_async, texts)
+
+    def _run_sync(self, coro_fn, *args):
+        """在新的事件循环中运行异步分析，结束时关闭该循环上的HTTP连接"""
+        async def runner():
+            try:
+                return await coro_fn(*args)
+            finally:
+                await self.transport.aclose()
+        return asyncio.run(runner())
+
+    def _request_semaphore(self):
+        """当前事件循环上的请求并发信号量，同时进行中的AI请求不超过 max_concurrency"""
+        loop = asyncio.get_running_loop()
+        with self._semaphore_lock:
+            semaphore = self._request_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._request_semaphores[loop] = semaphore
+            return semaphore
+
+    async def analyze_with_ai_async(self, text):
+        """异步分析单条反馈：先查缓存，未命中时按优先级调用API"""
+        if self.use_local_analysis:
+            return self.local_analyze(text)
+        
+        # 先查缓存，命中则无需任何网络请求
+        model_name = self.cache_model_name() if self.cache is not None else None
+        if model_name:
+            cached = self.cache.get(text, self.taxonomy.cache_version, model_name)
+            if cached:
+                self._add_stat('cache_hits')
+                return cached
+            self._add_stat('cache_misses')
+        
+        # 本地模型作为第一层：高置信度的直接返回，其余再调用远程API
+        if self._local_model_first():
+            local_result = self.local_model_classify([text], self.local_model_threshold)[0]
+            if local_result:
+                self._add_stat('local_model_hits')
+                return local_result
         
-        # 按优先级尝试不同的API
+        return await self._classify_with_api(text, model_name)
+
+    async def label_cluster_async(self, samples):
+        """两阶段分析的第二步：由一簇反馈的代表样本得到整簇的分类、情绪与问题总标题
+        - 结果按代表样本缓存（与逐条分析的缓存互不影响）
+        - 远程API都不可用时，对第一条样本做本地分析
+        """
+        if self.use_local_analysis:
+            return self.local_analyze(samples[0])
+
+        key_text = '\n'.join(str(text) for text in samples)
+        prompt_version = f'{self.taxonomy.cache_version}/cluster'
+        model_name = self.cache_model_name() if self.cache is not None else None
+        if model_name:
+            cached = self.cache.get(key_text, prompt_version, model_name)
+            if cached:
+                self._add_stat('cache_hits')
+                return cached
+            self._add_stat('cache_misses')
+
+        result, reached_local = await self._generate_by_priority(
+            self.build_cluster_prompt(samples),
+            lambda generated_text: self.parse_cluster_result(generated_text, samples[0]),
+            max_tokens=200
+        )
+        if result:
+            if model_name:
+                self.cache.put(key_text, prompt_version, model_name, result)
+            return result
+        if not reached_local:
+            print("[Qwen API] 所有API都不可用，使用本地分析")
+        return self._fallback_analyze(samples[0])
+
+    def _local_model_first(self):
+        """优先级中 local_model 排在所有远程API（及 local）之前"""
         for api_type in self.api_priority:
-            if api_type == "hf_token" and self.hf_token:
-                result = self._try_huggingface_token(prompt, text)
-                if result:
-                    return result
-            elif api_type == "tongyi" and self.tongyi_key:
-                result = self._try_tongyi_api(prompt, text)
-                if result:
-                    return result
-            elif api_type == "hf_free":
-                result = self._try_huggingface_free(prompt, text)
-                if result:
-                    return result
-            elif api_type == "local":
-                print("[Qwen API] 使用本地分析")
-                return self.local_analyze(text)
+            if api_type == "local_model":
+                return True
+            if api_type in API_LOG_TAGS or api_type == "local":
+                return False
+        return False
+
+    def local_model_classify(self, texts, min_confidence=None):
+        """用本地分类模型分析多条反馈，返回与输入顺序一致的结果列表
+        - 优先级中没有 local_model、模型尚未训练或置信度低于 min_confidence 的条目为None
+        - 模型由其他分类体系（缓存版本）的结果训练时不使用
+        """
+        model = self.local_model.get() if "local_model" in self.api_priority else None
+        if model is not None and model.meta.get('prompt_version') not in (None, self.taxonomy.cache_version):
+            model = None
+        if model is None:
+            return [None] * len(texts)
+        results = []
+        for text, prediction in zip(texts, model.predict([str(text) for text in texts])):
+            if min_confidence is not None and prediction['confidence'] < min_confidence:
+                results.append(None)
+                continue
+            results.append([{
+                'sentiment': prediction['sentiment'],
+                'summary': prediction['category'],
+                'snippet': text,
+                'confidence': round(prediction['confidence'], 4)
+            }])
+        return results
+
+    def _fallback_analyze(self, text):
+        """远程API不可用时的本地分析：有本地模型时直接采用其结果（不论置信度），否则使用关键词规则"""
+        return self.local_model_classify([text])[0] or self.local_analyze(text)
+
+    def _fallback_analyze_many(self, texts):
+        """批量的 _fallback_analyze"""
+        results = self.local_model_classify(texts)
+        if any(result is None for result in results):
+            # 没有可用的本地模型
+            return self.local_analyze_many(texts)
+        return results
+
+    async def _classify_with_api(self, text, model_name=None):
+        """不经过缓存查询，直接按优先级调用API分析单条反馈；远程API的结果写入缓存"""
+        # 构造prompt
+        prompt = self.build_prompt(text)
+        
+        result, reached_local = await self._generate_by_priority(
+            prompt, lambda generated_text: self.parse_ai_result({'generated_text': generated_text}, text)
+        )
+        if result:
+            if model_name:
+                self.cache.put(text, self.taxonomy.cache_version, model_name, result)
+            return result
+        if reached_local:
+            print("[Qwen API] 使用本地分析")
+            return self._fallback_analyze(text)
         
         # 所有API都失败，使用本地分析
         print("[Qwen API] 所有API都不可用，使用本地分析")
-        return self.local_analyze(text)
-    
-    def _try_huggingface_token(self, prompt, text):
-        """尝试使用Hugging Face API Token"""
-        for api_url in self.hf_api_urls:
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {self.hf_token}"
-                }
-                payload = {
-                    "inputs": prompt,
-                    "parameters": {
-                        "max_new_tokens": 150,
-                        "temperature": 0.3,
-                        "return_full_text": False
-                    }
-                }
-                
-                print(f"[HF Token API] 尝试调用: {api_url}")
-                response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    print(f"[HF Token API] 调用成功")
-                    return self.parse_ai_result(result, text)
-                elif response.status_code == 503:
-                    error_info = response.json() if response.content else {}
-                    estimated_time = error_info.get('estimated_time', 0)
-                    print(f"[HF Token API] 模型正在加载，预计等待时间: {estimated_time}秒")
-                    if estimated_time and estimated_time < 30:
-                        import time
-                        time.sleep(min(estimated_time + 2, 30))
-                        retry_response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                        if retry_response.status_code == 200:
-                            return self.parse_ai_result(retry_response.json(), text)
-                    continue
-                else:
-                    print(f"[HF Token API] 错误 {response.status_code}: {response.text[:200]}")
+        return self._fallback_analyze(text)
+
+    async def _generate_by_priority(self, prompt, parse, max_tokens=150):
+        """按优先级（最近可用的API优先）调用远程API并解析结果
+
+        Returns:
+            (解析结果或None, 是否按优先级轮到了 local)
+        - 所有端点都已降级时，再尝试一轮已降级的端点，避免单一服务偶发失败后整批退回本地分析
+        """
+        for include_demoted in (False, True):
+            if include_demoted and self._has_healthy_endpoint():
+                break
+            for api_type in self.provider_health.order_providers(self.api_priority):
+                if api_type == "local":
+                    return None, True
+                if api_type == "local_model":
+                    # 本地模型在调用远程API前已处理（见 analyze_with_ai_async）
                     continue
-            except Exception as e:
-                print(f"[HF Token API] 调用失败: {e}")
+                generated_text = await self._generate_with_api(api_type, prompt, max_tokens, include_demoted)
+                if generated_text:
+                    parsed = parse(generated_text)
+                    if parsed:
+                        return parsed, False
+        return None, False
+
+    def _has_healthy_endpoint(self):
+        """优先级中（local 之前）是否还有未降级的远程端点"""
+        for api_type in self.api_priority:
+            if api_type == "local":
+                break
+            for api_url in self._provider_endpoints(api_type):
+                if not self.provider_health.is_demoted(api_url):
+                    return True
+        return False
+
+    async def analyze_batch_with_ai_async(self, texts):
+        """将多条反馈打包到一个Prompt中批量分析，返回与输入顺序一致的结果列表
+        - 已缓存的条目不再请求AI
+        - 回复中缺失或格式错误的条目会单独重新分析
+        """
+        if self.use_local_analysis:
+            return self.local_analyze_many(texts)
+        if len(texts) == 1:
+            return [await self.analyze_with_ai_async(texts[0])]
+
+        results = [None] * len(texts)
+        model_name = self.cache_model_name() if self.cache is not None else None
+        if model_name:
+            for i, cached in self.cache.get_many(texts, self.taxonomy.cache_version, model_name).items():
+                results[i] = cached
+            hits = sum(1 for r in results if r is not None)
+            self._add_stat('cache_hits', hits)
+            self._add_stat('cache_misses', len(texts) - hits)
+        pending = [i for i, r in enumerate(results) if r is None]
+        if pending and self._local_model_first():
+            local_results = self.local_model_classify([texts[i] for i in pending], self.local_model_threshold)
+            for i, local_result in zip(pending, local_results):
+                results[i] = local_result
+            hits = sum(1 for local_result in local_results if local_result)
+            if hits:
+                self._add_stat('local_model_hits', hits)
+                pending = [i for i in pending if results[i] is None]
+        if not pending:
+            return results
+        if len(pending) == 1:
+            results[pending[0]] = await self._classify_with_api(texts[pending[0]], model_name)
+            return results
+
+        # 批次内的稳定ID：r1, r2, ...（只包含未命中缓存的条目）
+        id_to_index = {f"r{n}": i for n, i in enumerate(pending, 1)}
+        id_to_text = {feedback_id: texts[i] for feedback_id, i in id_to_index.items()}
+        prompt = self.build_batch_prompt(list(id_to_text.items()))
+        # 每条结果约需几十个token，整体设上限
+        max_tokens = min(60 + 80 * len(id_to_text), 2000)
+
+        parsed, _ = await self._generate_by_priority(
+            prompt, lambda generated_text: self.parse_batch_result(generated_text, id_to_text), max_tokens
+        )
+        parsed = parsed or {}
+
+        fallback_count = 0
+        for feedback_id, text in id_to_text.items():
+            if feedback_id in parsed:
+                results[id_to_index[feedback_id]] = parsed[feedback_id]
+                if model_name:
+                    self.cache.put(text, self.taxonomy.cache_version, model_name, parsed[feedback_id])
+            else:
+                fallback_count += 1
+                results[id_to_index[feedback_id]] = await self._classify_with_api(text, model_name)
+        if fallback_count:
+            print(f"[Batch] {len(id_to_text)} 条中有 {fallback_count} 条未在批量结果中找到，已单独分析")
+        return results
+
+    async def _generate_with_api(self, api_type, prompt, max_tokens=150, include_demoted=False):
+        """调用指定类型的远程API，返回模型生成的文本；未配置或调用失败时返回None
+        - 最近可用的端点优先，已降级（include_demoted=False 时）或熔断中的端点直接跳过，不产生网络请求
+        """
+        log_tag = API_LOG_TAGS.get(api_type, api_type)
+        endpoints = self._provider_endpoints(api_type)
+        if not include_demoted:
+            endpoints = self.provider_health.order_endpoints(api_type, endpoints)
+        for api_url in endpoints:
+            if not self.circuit_breaker.allow(api_url):
                 continue
+            headers, payload = self._build_request(api_type, prompt, max_tokens)
+            if api_type == "tongyi":
+                print(f"[{log_tag}] 尝试调用模型: {self.tongyi_model}")
+            else:
+                print(f"[{log_tag}] 尝试调用: {api_url}")
+            try:
+                result = await self._post_json(api_type, api_url, headers, payload, log_tag)
+            finally:
+                # 冷却后放行的探测请求若未记录成功/失败（多次429、被停止或取消），恢复为半开状态
+                self.circuit_breaker.release_probe(api_url)
+            if result is None:
+                continue
+            
+            try:
+                if api_type == "tongyi":
+                    generated_text = self._extract_tongyi_text(result)
+                else:
+                    generated_text = self._extract_generated_text(result)
+            except (KeyError, IndexError, TypeError, AttributeError):
+                generated_text = None
+            if generated_text and isinstance(generated_text, str):
+                print(f"[{log_tag}] 调用成功，返回文本长度: {len(generated_text)}")
+                self.circuit_breaker.record_success(api_url)
+                self.provider_health.mark_working(api_type, api_url)
+                return generated_text
+            # 响应结构异常与调用失败同样处理，继续尝试下一个端点
+            print(f"[{log_tag}] 响应格式异常，未找到生成的文本: {str(result)[:200]}")
+            self.circuit_breaker.record_failure(api_url)
+            self.provider_health.demote(api_type, api_url)
         return None
-    
-    def _try_tongyi_api(self, prompt, text):
-        """尝试使用通义千问API"""
-        try:
+
+    def _provider_endpoints(self, api_type):
+        """API类型对应的端点列表，未配置Key时为空"""
+        if api_type == "hf_token":
+            return self.hf_api_urls if self.hf_token else []
+        elif api_type == "tongyi":
+            return [self.tongyi_api_url] if self.tongyi_key else []
+        elif api_type == "hf_free":
+            return self.hf_free_api_urls
+        return []
+
+    def _build_request(self, api_type, prompt, max_tokens):
+        """构造请求头与请求体"""
+        if api_type == "tongyi":
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.tongyi_key}"
@@ -185,240 +676,202 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
                     ]
                 },
                 "parameters": {
-                    "max_tokens": 150,
+                    "max_tokens": max_tokens,
                     "temperature": 0.3
                 }
             }
-            
-            print(f"[通义千问API] 尝试调用模型: {self.tongyi_model}")
-            response = requests.post(self.tongyi_api_url, headers=headers, json=payload, timeout=30)
-            
+            return headers, payload
+        
+        headers = {"Content-Type": "application/json"}
+        if api_type == "hf_token":
+            headers["Authorization"] = f"Bearer {self.hf_token}"
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": max_tokens,
+                "temperature": 0.3,
+                "return_full_text": False
+            }
+        }
+        return headers, payload
+
+    def _probe_endpoint(self, api_type, api_url):
+        """后台探测已降级的端点（极短的Prompt，只看是否返回200）"""
+        if not self.circuit_breaker.allow(api_url):
+            return False
+        try:
+            headers, payload = self._build_request(api_type, "ping", 1)
+            try:
+                response = self.transport.post(api_url, headers=headers, json=payload)
+            except Exception:
+                self.circuit_breaker.record_failure(api_url)
+                return False
             if response.status_code == 200:
-                result = response.json()
-                print(f"[通义千问API] 响应状态: 200")
-                
-                # 通义千问API的响应格式可能是两种：
-                # 1. 新格式: result['output']['text'] 直接包含文本
-                # 2. 旧格式: result['output']['choices'][0]['message']['content']
-                generated_text = None
-                
-                if result.get('output'):
-                    output = result['output']
-                    # 尝试新格式（text字段）
-                    if 'text' in output:
-                        generated_text = output['text']
-                        print(f"[通义千问API] 使用text字段获取结果")
-                    # 尝试旧格式（choices字段）
-                    elif 'choices' in output and len(output['choices']) > 0:
-                        generated_text = output['choices'][0]['message']['content']
-                        print(f"[通义千问API] 使用choices字段获取结果")
-                
-                if generated_text:
-                    print(f"[通义千问API] 调用成功，返回文本长度: {len(generated_text)}")
-                    # 解析结果
-                    return self.parse_ai_result({'generated_text': generated_text}, text)
-                else:
-                    print(f"[通义千问API] 响应格式异常，未找到text或choices: {result}")
-                    return None
-            elif response.status_code == 429:
-                # 速率限制，等待后重试
-                error_info = response.json() if response.content else {}
-                wait_time = 2  # 默认等待2秒
-                print(f"[通义千问API] 速率限制(429)，等待{wait_time}秒后重试...")
-                import time
-                time.sleep(wait_time)
-                # 重试一次
-                retry_response = requests.post(self.tongyi_api_url, headers=headers, json=payload, timeout=30)
-                if retry_response.status_code == 200:
-                    result = retry_response.json()
-                    if result.get('output'):
-                        output = result['output']
-                        if 'text' in output:
-                            generated_text = output['text']
-                        elif 'choices' in output and len(output['choices']) > 0:
-                            generated_text = output['choices'][0]['message']['content']
-                        else:
-                            generated_text = None
-                        
-                        if generated_text:
-                            print(f"[通义千问API] 重试成功")
-                            return self.parse_ai_result({'generated_text': generated_text}, text)
-                print(f"[通义千问API] 重试后仍失败，返回None以尝试下一个API")
-                return None
-            else:
-                print(f"[通义千问API] 错误 {response.status_code}: {response.text[:200]}")
-                return None
-        except Exception as e:
-            print(f"[通义千问API] 调用失败: {e}")
-            import traceback
-            print(f"[通义千问API] 错误详情: {traceback.format_exc()}")
+                self.circuit_breaker.record_success(api_url)
+                return True
+            self.circuit_breaker.record_failure(api_url)
+            return False
+        finally:
+            self.circuit_breaker.release_probe(api_url)
+
+    @staticmethod
+    def _extract_generated_text(result):
+        """从API响应中取出生成的文本（兼容HF的列表格式与dict格式）"""
+        if isinstance(result, list):
+            result = result[0] if result else {}
+        if isinstance(result, dict):
+            return result.get('generated_text') or result.get('text')
+        if isinstance(result, str):
+            return result
+        return None
+
+    @staticmethod
+    def _extract_tongyi_text(result):
+        """通义千问API的响应格式可能是两种：
+        1. 新格式: result['output']['text'] 直接包含文本
+        2. 旧格式: result['output']['choices'][0]['message']['content']
+        """
+        output = result.get('output') if isinstance(result, dict) else None
+        if not output:
             return None
+        if 'text' in output:
+            return output['text']
+        if 'choices' in output and len(output['choices']) > 0:
+            return output['choices'][0]['message']['content']
+        return None
     
-    def _try_huggingface_free(self, prompt, text):
-        """尝试使用Hugging Face免费API（无需Token）"""
-        for api_url in self.hf_free_api_urls:
+    async def _post_json(self, api_type, url, headers, payload, log_tag):
+        """经过限流与熔断发送请求，返回200响应的JSON；失败返回None
+        - 200: 熔断的成功记录由调用方在取出生成文本后进行，响应结构异常时记为失败
+        - 429: 按AIMD降低该API的速率并遵守 Retry-After，最多重试2次
+        - 503（模型加载中）/410（模型下线）: 熔断该端点，冷却期内不再调用
+        - 其他错误与网络异常: 记为失败，连续失败达到阈值后熔断
+        - 除429外的失败都会降级该端点，之后的行不再尝试，由后台探测恢复
+        """
+        limiter = self.rate_limiters[api_type]
+        for attempt in range(3):
+            if not await limiter.acquire_async(self.stop_flag):
+                return None
             try:
-                headers = {"Content-Type": "application/json"}
-                payload = {
-                    "inputs": prompt,
-                    "parameters": {
-                        "max_new_tokens": 150,
-                        "temperature": 0.3,
-                        "return_full_text": False
-                    }
-                }
-                
-                print(f"[HF Free API] 尝试调用: {api_url}")
-                response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    print(f"[HF Free API] 调用成功")
-                    return self.parse_ai_result(result, text)
-                elif response.status_code == 503:
-                    error_info = response.json() if response.content else {}
-                    estimated_time = error_info.get('estimated_time', 0)
-                    print(f"[HF Free API] 模型正在加载，预计等待时间: {estimated_time}秒")
-                    if estimated_time and estimated_time < 30:
-                        import time
-                        time.sleep(min(estimated_time + 2, 30))
-                        retry_response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-                        if retry_response.status_code == 200:
-                            return self.parse_ai_result(retry_response.json(), text)
-                    continue
-                elif response.status_code == 410:
-                    print(f"[HF Free API] 模型不可用(410 - Gone)")
-                    continue
-                elif response.status_code == 429:
-                    print(f"[HF Free API] 请求过多(429)")
-                    import time
-                    time.sleep(2)
-                    continue
-                else:
-                    print(f"[HF Free API] 错误 {response.status_code}: {response.text[:200]}")
-                    continue
+                # 信号量限制同时进行中的请求数，等待限流令牌时不占用名额
+                async with self._request_semaphore():
+                    response = await self.transport.apost(url, headers=headers, json=payload)
             except Exception as e:
-                print(f"[HF Free API] 调用失败: {e}")
+                print(f"[{log_tag}] 调用失败: {e}")
+                self.circuit_breaker.record_failure(url)
+                self.provider_health.demote(api_type, url)
+                return None
+
+            if response.status_code == 200:
+                limiter.on_success()
+                try:
+                    return response.json()
+                except ValueError as e:
+                    print(f"[{log_tag}] 响应不是有效的JSON: {e}")
+                    self.circuit_breaker.record_failure(url)
+                    self.provider_health.demote(api_type, url)
+                    return None
+            elif response.status_code == 429:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                new_rate = limiter.on_throttle(retry_after)
+                print(f"[{log_tag}] 速率限制(429)，速率降至 {new_rate:.2f} 次/秒" +
+                      (f"，{retry_after:.0f}秒后重试" if retry_after else ""))
                 continue
+            elif response.status_code == 503:
+                try:
+                    error_info = response.json() if response.content else {}
+                except ValueError:
+                    error_info = {}
+                estimated_time = error_info.get('estimated_time', 0) if isinstance(error_info, dict) else 0
+                print(f"[{log_tag}] 服务不可用(503)，预计等待时间: {estimated_time}秒")
+                self.circuit_breaker.trip(url, cooldown=estimated_time or None)
+                self.provider_health.demote(api_type, url)
+                return None
+            elif response.status_code == 410:
+                print(f"[{log_tag}] 模型不可用(410 - Gone)")
+                self.circuit_breaker.trip(url, cooldown=3600)
+                self.provider_health.demote(api_type, url)
+                return None
+            else:
+                print(f"[{log_tag}] 错误 {response.status_code}: {response.text[:200]}")
+                self.circuit_breaker.record_failure(url)
+                self.provider_health.demote(api_type, url)
+                return None
+
+        print(f"[{log_tag}] 多次速率限制，放弃本次请求")
         return None
     
     def local_analyze(self, text):
         """本地规则分析（备用方案）"""
-        text_lower = text.lower()
-        
-        # 情感分析关键词（更全面的中文关键词）
-        positive_keywords = ['好', '满意', '喜欢', '推荐', '优秀', '棒', '赞', '不错', '很好', '完美', 
-                            '赞', '给力', '好用', '方便', '快捷', '流畅', '清晰', '美观', '实用', 
-                            '贴心', '专业', '高效', '稳定', '可靠', '值得', '超值', '惊喜']
-        negative_keywords = ['差', '不好', '失望', '问题', '错误', '慢', '卡', '崩溃', 'bug', '故障',
-                            '糟糕', '垃圾', '难用', '复杂', '麻烦', '延迟', '卡顿', '闪退', '死机',
-                            '不兼容', '缺失', '不足', '缺陷', '漏洞', '不安全', '贵', '不值']
-        
-        positive_count = sum(1 for kw in positive_keywords if kw in text)
-        negative_count = sum(1 for kw in negative_keywords if kw in text)
-        
-        # 判断情感
-        if positive_count > negative_count and positive_count > 0:
-            sentiment = '正面'
-        elif negative_count > 0:
-            sentiment = '负面'
-        else:
-            sentiment = '中性'
-        
-        # 简单分类
-        summary = self.categorize_text(text)
-        
-        # 添加简单表情
-        sentiment_emoji = {
-            '正面': '正面😊',
-            '负面': '负面😠',
-            '中性': '中性😐'
-        }
-        
+        sentiment, category = self.taxonomy.classify(text)
         return [{
-            'sentiment': sentiment_emoji.get(sentiment, sentiment),
-            'summary': summary,
+            'sentiment': sentiment,
+            'summary': category,
             'snippet': text,
             'confidence': 0.7
         }]
+
+    def local_analyze_many(self, texts):
+        """批量本地规则分析：整列文本一次计算关键词得分，结果与逐条 local_analyze 一致"""
+        texts = [str(text) for text in texts]
+        return [
+            [{
+                'sentiment': sentiment,
+                'summary': category,
+                'snippet': text,
+                'confidence': 0.7
+            }]
+            for text, (sentiment, category) in zip(texts, self.taxonomy.classify_many(texts))
+        ]
     
     def categorize_text(self, text):
         """简单的文本分类"""
-        text_lower = text.lower()
-        
-        categories = {
-            '功能 - Bug/稳定性': ['功能', '不能', '无法', '不支持', '缺少', '没有', '缺失', '不完善', '不完整', '死机', '报错', '失效', '不显示'],
-            '功能 - 灵活性/配置能力': ['自定义', '配置', '选项', '灵活', '更多功能', '支持', '设置'],
-            '功能 - 实用性/完整度': ['半成品', '不好用', '鸡肋', '没用', '奇怪'],
-            '体验 - 操作复杂度': ['难找', '步骤', '复杂', '麻烦', '逻辑', '反人类', '难用'],
-            '体验 - 性能/加载速度': ['慢', '卡', '延迟', '加载', '响应', '卡顿', '速度', '性能', '优化'],
-            '资源 - 模板丰富度': ['模板', '风格', '主题', '样式'],
-            '资源 - 插件生态': ['插件', '扩展', '应用'],
-            '服务 - 帮助与引导': ['文档', '教程', '指引', '说明', '帮助', '客服', '支持'],
-        }
+        return self.taxonomy.categorize(text)
+    
+    def _parse_json_items(self, generated_text):
+        """从模型生成的文本中解析出JSON对象列表（兼容数组、单个对象与markdown代码块）"""
+        # 清理可能的markdown标记
+        clean_text = generated_text.strip()
+        if clean_text.startswith('```json'):
+            clean_text = clean_text[7:]
+        if clean_text.startswith('```'):
+            clean_text = clean_text[3:]
+        if clean_text.endswith('```'):
+            clean_text = clean_text[:-3]
+        clean_text = clean_text.strip()
         
-        # 计算每个类别的匹配分数
-        category_scores = {}
-        for category, keywords in categories.items():
-            score = sum(1 for kw in keywords if kw in text)
-            if score > 0:
-                category_scores[category] = score
+        # 找到JSON数组部分
+        start = clean_text.find('[')
+        end = clean_text.rfind(']') + 1
         
-        # 返回得分最高的类别
-        if category_scores:
-            return max(category_scores.items(), key=lambda x: x[1])[0]
+        parsed = None
+        if start != -1 and end != -1:
+            json_str = clean_text[start:end]
+            try:
+                parsed = json.loads(json_str)
+            except:
+                pass
         
-        return '其他问题'
-    
+        # 如果没找到数组，尝试解析整个文本为对象
+        if not parsed:
+             try:
+                parsed = json.loads(clean_text)
+                if isinstance(parsed, dict):
+                    parsed = [parsed]
+             except:
+                pass
+
+        return parsed or None
+
     def parse_ai_result(self, result, text):
         """解析AI返回的JSON结果"""
-        import json
         try:
-            generated_text = ""
             # 获取生成的文本
-            if isinstance(result, dict):
-                if 'generated_text' in result:
-                    generated_text = result['generated_text']
-                elif 'text' in result:
-                     generated_text = result['text']
-            elif isinstance(result, str):
-                generated_text = result
-
+            generated_text = self._extract_generated_text(result)
             if not generated_text:
                 return None
 
-            # 尝试解析JSON
-            # 清理可能的markdown标记
-            clean_text = generated_text.strip()
-            if clean_text.startswith('```json'):
-                clean_text = clean_text[7:]
-            if clean_text.startswith('```'):
-                clean_text = clean_text[3:]
-            if clean_text.endswith('```'):
-                clean_text = clean_text[:-3]
-            clean_text = clean_text.strip()
-            
-            # 找到JSON数组部分
-            start = clean_text.find('[')
-            end = clean_text.rfind(']') + 1
-            
-            parsed = None
-            if start != -1 and end != -1:
-                json_str = clean_text[start:end]
-                try:
-                    parsed = json.loads(json_str)
-                except:
-                    pass
-            
-            # 如果没找到数组，尝试解析整个文本为对象
-            if not parsed:
-                 try:
-                    parsed = json.loads(clean_text)
-                    if isinstance(parsed, dict):
-                        parsed = [parsed]
-                 except:
-                    pass
-
+            parsed = self._parse_json_items(generated_text)
             if not parsed:
                 return None
                 
@@ -441,138 +894,289 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
         except Exception as e:
             print(f"[Parse] Error: {str(e)}")
             return None
+
+    def parse_cluster_result(self, generated_text, text):
+        """解析一簇反馈的分类结果：问题归类取分类的前半部分，问题总标题为“分类后半部分：AI概括的标题”"""
+        try:
+            parsed = self._parse_json_items(generated_text) or []
+        except Exception as e:
+            print(f"[Parse] Cluster error: {str(e)}")
+            return None
+        item = next((item for item in parsed if isinstance(item, dict)), None)
+        if not item or not (item.get('category') or item.get('summary')):
+            return None
+
+        summary = str(item.get('category') or item.get('summary')).strip()
+        title = ' '.join(str(item.get('title') or '').split())
+        if title:
+            sub_title, category = split_summary(summary)
+            if category:
+                summary = f"{category} - {sub_title}：{title}"
+            else:
+                # 没有归类时整句作为标题，标题中的连字符会被 split_summary 误认为归类分隔符
+                summary = f"{sub_title}：{re.sub(r'[-—]', ' ', title)}"
+        return [{
+            'sentiment': item.get('sentiment') or '中性😐',
+            'summary': summary,
+            'snippet': text,
+            'confidence': 0.85
+        }]
+
+    def parse_batch_result(self, generated_text, id_to_text):
+        """解析批量分类返回的JSON数组
+
+        Returns:
+            dict: {feedback_id: [opinion]}，ID缺失、未知、重复或缺少分类的条目会被丢弃
+        """
+        try:
+            parsed = self._parse_json_items(generated_text) or []
+        except Exception as e:
+            print(f"[Parse] Batch error: {str(e)}")
+            return {}
+
+        results = {}
+        for item in parsed:
+            if not isinstance(item, dict):
+                continue
+            feedback_id = str(item.get('id', '')).strip().strip('[]')
+            if feedback_id not in id_to_text or feedback_id in results:
+                continue
+            summary = item.get('category') or item.get('summary')
+            if not summary:
+                continue
+            results[feedback_id] = [{
+                'sentiment': item.get('sentiment') or '中性😐',
+                'summary': summary,
+                'snippet': id_to_text[feedback_id],
+                'confidence': 0.85
+            }]
+        return results
             
     def analyze_and_categorize(self, rows_data, feedback_col):
-        """分析并分类数据（支持多观点拆分）"""
+        """分析并分类数据（同步入口），见 analyze_rows"""
+        try:
+            return self._run_sync(self.analyze_rows, rows_data, feedback_col)
+        except AnalysisStopped as e:
+            raise KeyboardInterrupt(str(e))
+
+    async def analyze_rows(self, rows_data, feedback_col):
+        """分析并分类数据（支持多观点拆分）
+        - 重复（及可选的近似重复）反馈只分析一次，结果分发给同组所有行
+        - batch_size > 1 时每 batch_size 条反馈合并为一个Prompt
+        - 所有工作单元在同一个事件循环中并发执行，同时进行中的AI请求不超过 max_concurrency，结果仍按输入顺序返回
+        - 设置 checkpoint_job 时每完成一个单元即写入断点，resume=True 时直接复用断点中已完成的行
+        - pipeline == 'cluster' 时先在本地聚类，每簇只把代表样本发给AI（见 label_cluster_async），结果分发给簇内所有行
+        - 设置停止标志后抛出 AnalysisStopped
+        """
         print(f"[Analyze] Analyzing {len(rows_data)} rows...")
         
+        total_rows = len(rows_data)
+        self.reset_run_stats()
+        texts = [row_info[feedback_col] for row_info in rows_data]
+        prompt_version = self.taxonomy.cache_version
+        analyze_unit = None
+        
+        if self.pipeline == 'cluster':
+            # 聚类：每簇为一组，代表样本为簇内最大的几组相同反馈
+            clusters = cluster_texts([str(text) for text in texts], self.cluster_threshold)
+            duplicate_groups = [sorted(row_idx for group in cluster for row_idx in group) for cluster in clusters]
+            rep_texts = [[texts[group[0]] for group in cluster[:self.cluster_samples]] for cluster in clusters]
+            analyze_unit = self._label_cluster_unit
+            prompt_version = f'{prompt_version}/cluster'
+            saved = total_rows - len(rep_texts)
+            if saved:
+                self._add_stat('cluster_saved', saved)
+            print(f"[Analyze] 聚类为 {len(rep_texts)} 组（相似度阈值 {self.cluster_threshold}），节省 {saved} 次AI调用")
+        else:
+            # 去重：每组只分析代表行（组内第一行），结果再分发给组内其他行
+            if self.dedup_enabled:
+                duplicate_groups = group_duplicates(texts, self.dedup_near_threshold)
+            else:
+                duplicate_groups = [[i] for i in range(total_rows)]
+            rep_texts = [texts[group[0]] for group in duplicate_groups]
+            saved = total_rows - len(rep_texts)
+            if saved:
+                self._add_stat('dedup_saved', saved)
+                print(f"[Analyze] 去重后需分析 {len(rep_texts)} 条，节省 {saved} 次AI调用")
+        
+        total_units = len(rep_texts)
+        self._report_progress(0, total_units, f'开始分析，共 {total_rows} 条反馈...')
+        
+        # 断点：resume 时读取已完成的行，否则清空旧断点
+        job_key = None
+        restored = {}
+        if self.checkpoints is not None and self.checkpoint_job:
+            job_key = CheckpointStore.make_key(self.checkpoint_job, feedback_col, prompt_version, texts)
+            done = self.checkpoints.start(job_key, self.checkpoint_job, total_rows, resume=self.resume)
+            for rep_idx, group in enumerate(duplicate_groups):
+                analysis_list = next((done[row_idx] for row_idx in group if row_idx in done), None)
+                if analysis_list is not None:
+                    restored[rep_idx] = analysis_list
+        
+        # 工作单元：每个单元是一组代表行下标，对应一次AI请求（已从断点恢复的代表行不再分析）；聚类时每簇一个单元
+        remaining = [rep_idx for rep_idx in range(total_units) if rep_idx not in restored]
+        unit_size = 1 if analyze_unit else self.batch_size
+        units = [remaining[start:start + unit_size]
+                 for start in range(0, len(remaining), unit_size)]
+        
         # 扁平化的所有意见列表，包含 row_id 用于计算用户数
-        all_opinions = []
+        all_opinions = [None] * total_rows
         
-        total_rows = len(rows_data)
-        if hasattr(self, 'progress_callback') and self.progress_callback:
-            self.progress_callback(0, total_rows, f'开始分析，共 {total_rows} 条反馈...')
-            
-        for idx, row_info in enumerate(rows_data, 1):
-            if self.stop_flag and self.stop_flag.is_set():
-                raise KeyboardInterrupt("分析被用户终止")
-                
-            if hasattr(self, 'progress_callback') and self.progress_callback:
-                self.progress_callback(idx, total_rows, f'正在分析第 {idx}/{total_rows} 条反馈...')
-            
-            # AI 分析返回列表
-            analysis_list = self.analyze_with_ai(row_info[feedback_col])
-            
-            # API 延迟
-            if self.tongyi_key and idx < total_rows:
-                import time
-                time.sleep(0.3)
-            
-            # 扁平化存储 (不拆分，直接存)
-            # 兼容返回列表的情况（如果有）
-            first_opinion = analysis_list[0] if analysis_list and len(analysis_list) > 0 else {
-                'summary': '其他问题', 'sentiment': '中性😐'
-            }
+        def on_unit_done(unit, unit_results, save=True):
+            """代表行完成后，将结果分发给同组所有行并写入断点；增量模式下立即推送这些行"""
+            finished = []
+            checkpoint_rows = []
+            for rep_idx, analysis_list in zip(unit, unit_results):
+                for row_idx in duplicate_groups[rep_idx]:
+                    opinion = self._build_opinion(row_idx, rows_data[row_idx], analysis_list, feedback_col)
+                    all_opinions[row_idx] = opinion
+                    finished.append(opinion)
+                    checkpoint_rows.append((row_idx, analysis_list))
+            if save and job_key is not None:
+                self.checkpoints.save(job_key, checkpoint_rows)
+            if self.row_callback:
+                finished.sort(key=lambda opinion: opinion['row_id'])
+                self.row_callback(finished)
+        
+        if restored:
+            restored_units = list(restored)
+            on_unit_done(restored_units, [restored[rep_idx] for rep_idx in restored_units], save=False)
+            resumed_rows = sum(len(duplicate_groups[rep_idx]) for rep_idx in restored_units)
+            self._add_stat('resumed', resumed_rows)
+            print(f"[Analyze] 从断点恢复 {resumed_rows} 行，剩余 {len(remaining)} 条需要分析")
+            self._report_progress(len(restored), total_units, f'已从断点恢复 {resumed_rows} 条，继续分析剩余 {len(remaining)} 条...')
+        
+        await self._analyze_units(rep_texts, units, on_unit_done, completed=len(restored), analyze_unit=analyze_unit)
+        return all_opinions
 
-            
-            all_opinions.append({
-                'row_id': idx,
-                'summary': first_opinion['summary'],
-                'sentiment': first_opinion['sentiment'],
-                'snippet': row_info[feedback_col], # snippet直接等于全文
-                'full_feedback': row_info[feedback_col],
-                'row_data': row_info
-            })
+    def _build_opinion(self, row_idx, row_info, analysis_list, feedback_col):
+        """由行数据与AI分析结果构建意见记录（row_id 从1开始）"""
+        # 扁平化存储 (不拆分，直接存)
+        # 兼容返回列表的情况（如果有）
+        first_opinion = analysis_list[0] if analysis_list and len(analysis_list) > 0 else {
+            'summary': '其他问题', 'sentiment': '中性😐'
+        }
+        return {
+            'row_id': row_idx + 1,
+            'summary': first_opinion['summary'],
+            'sentiment': first_opinion['sentiment'],
+            'snippet': row_info[feedback_col], # snippet直接等于全文
+            'full_feedback': row_info[feedback_col],
+            'row_data': row_info
+        }
+
+    @staticmethod
+    def row_result(opinion):
+        """增量推送的单行结果：行号（从0开始）、问题标题、归类、情绪与原始列文本"""
+        title, category = split_summary(opinion.get('summary'))
+        return {
+            'row': opinion['row_id'] - 1,
+            'title': title,
+            'category': category,
+            'sentiment': opinion['sentiment'],
+            'values': [cell_text(val) for val in opinion['row_data'].values()]
+        }
+
+    async def _analyze_units(self, texts, units, on_unit_done=None, completed=0, analyze_unit=None):
+        """并发执行工作单元，每个单元完成时调用 on_unit_done(unit, unit_results)
+        - 任务窗口为并发数的2倍，使请求信号量始终有任务在排队，同时避免一次性创建全部任务
+        - completed: 不在 units 中、已完成的条数（如从断点恢复），用于汇报进度
+        - analyze_unit: 分析单元的协程函数，默认为 _analyze_unit
+        """
+        analyze_unit = analyze_unit or self._analyze_unit
+        total_rows = len(texts)
+        results = [None] * total_rows
+        max_tasks = self.max_concurrency * 2
+        print(f"[Analyze] 异步并发分析，最大并发请求数: {self.max_concurrency}")
+        
+        pending = {}
+        next_unit = 0
+        try:
+            while next_unit < len(units) or pending:
+                if self.stop_flag and self.stop_flag.is_set():
+                    raise AnalysisStopped("分析被用户终止")
                 
-        return all_opinions
+                while next_unit < len(units) and len(pending) < max_tasks:
+                    unit = units[next_unit]
+                    task = asyncio.ensure_future(analyze_unit([texts[i] for i in unit]))
+                    pending[task] = unit
+                    next_unit += 1
+                
+                # 短超时等待，以便及时响应停止标志
+                done, _ = await asyncio.wait(pending, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    unit = pending.pop(task)
+                    unit_results = task.result()
+                    for row_idx, analysis_list in zip(unit, unit_results):
+                        results[row_idx] = analysis_list
+                    if on_unit_done:
+                        on_unit_done(unit, unit_results)
+                    completed += len(unit)
+                    self._report_progress(completed, total_rows, f'已完成 {completed}/{total_rows} 条反馈分析...')
+        finally:
+            # 停止或出错时取消尚未完成的任务
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return results
+
+    async def _analyze_unit(self, unit_texts):
+        """分析一个工作单元（单条或一批反馈），异常时回退到本地分析"""
+        try:
+            if len(unit_texts) == 1:
+                return [await self.analyze_with_ai_async(unit_texts[0])]
+            return await self.analyze_batch_with_ai_async(unit_texts)
+        except Exception as e:
+            print(f"[Analyze] 分析失败，使用本地分析: {e}")
+            return self._fallback_analyze_many([str(text) for text in unit_texts])
 
-    def generate_analysis_sheet(self, all_opinions, total_users, sheet_name, sort_by='user', original_columns=None):
+    async def _label_cluster_unit(self, unit_samples):
+        """分析一个聚类工作单元（每项为一个簇的代表样本），异常时回退到本地分析"""
+        results = []
+        for samples in unit_samples:
+            try:
+                results.append(await self.label_cluster_async(samples))
+            except Exception as e:
+                print(f"[Analyze] 簇分析失败，使用本地分析: {e}")
+                results.append(self._fallback_analyze(str(samples[0])))
+        return results
+
+    @classmethod
+    def generate_analysis_sheet(cls, all_opinions, total_users, sheet_name, sort_by='user', original_columns=None, compact=False, writer=None):
         """生成归类后的分析Sheet (包含原始列)
         - 将同类VOC行放在一起，并为分组创建合并的总问题标题
         - 功能/体验等分类单独放一列，不与问题标题混在一起
+        - compact=True 时直接生成紧凑格式（见 sheet_codec）；writer 可指定其他单元格写入器
         """
         if original_columns is None:
             original_columns = []
 
-        # 先按“问题标题”分组，保持出现顺序
-        grouped = []
-        group_map = {}
-
-        def split_summary(summary_text):
-            """拆分分类：前半部分为归类（功能/体验），后半部分为总问题标题"""
-            if not summary_text:
-                return "其他问题", ""
-            text = str(summary_text).strip()
-            parts = [p.strip() for p in re.split(r'[-—]', text, maxsplit=1)]
-            if len(parts) == 2 and parts[0] and parts[1]:
-                return parts[1], parts[0]  # (问题标题, 问题归类)
-            return text, ""  # 没有明确归类时，整句作为标题
-
-        for opinion in all_opinions:
-            title, category = split_summary(opinion.get('summary'))
-            key = (title, category)
-            if key not in group_map:
-                group_map[key] = []
-                grouped.append((key, group_map[key]))
-            group_map[key].append({**opinion, 'title': title, 'category': category})
+        grouped = cls._group_opinions(all_opinions)
 
         # 构建Sheet Data
-        celldata = []
+        if writer is None:
+            writer = sheet_writer(compact)
 
         # 表头: [问题总标题, 问题归类, 用户情绪] + 原始列
         headers = ['问题总标题', '问题归类', '用户情绪'] + original_columns
 
         for col_idx, header in enumerate(headers):
-            celldata.append({
-                'r': 0,
-                'c': col_idx,
-                'v': {
-                    'v': header,
-                    'm': header,
-                    'ct': {'fa': 'General', 't': 'g'},
-                    'bg': '#EDEBE9',
-                    'bl': 1
-                }
-            })
+            writer.add(0, col_idx, header, style={'bg': '#EDEBE9', 'bl': 1})
 
         current_row = 1
-        config = {'merge': {}, 'columnlen': {}}
 
         # 按分组填充数据，并对分组列做合并
         for (title, category), opinions in grouped:
             start_row = current_row
-            group_rows = len(opinions)
 
             for opinion in opinions:
                 row_idx = current_row
 
                 # 问题总标题 & 问题归类 & 用户情绪（只在组首生成，之后依赖合并）
                 if row_idx == start_row:
-                    celldata.append({
-                        'r': row_idx,
-                        'c': 0,
-                        'v': {
-                            'v': title,
-                            'm': title,
-                            'ct': {'fa': 'General', 't': 'g'},
-                            'vt': 1,
-                            'ht': 1,
-                            'bg': '#F6F8FA'
-                        }
-                    })
-
-                    celldata.append({
-                        'r': row_idx,
-                        'c': 1,
-                        'v': {
-                            'v': category or '未分类',
-                            'm': category or '未分类',
-                            'ct': {'fa': 'General', 't': 'g'},
-                            'vt': 1,
-                            'ht': 1,
-                            'bg': '#F6F8FA'
-                        }
-                    })
+                    writer.add(row_idx, 0, title, style={'vt': 1, 'ht': 1, 'bg': '#F6F8FA'})
+                    writer.add(row_idx, 1, category or '未分类', style={'vt': 1, 'ht': 1, 'bg': '#F6F8FA'})
 
                     font_color = '#000000'
                     if '负面' in str(opinion['sentiment']):
@@ -580,49 +1184,61 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
                     elif '正面' in str(opinion['sentiment']):
                         font_color = '#008000'
 
-                    celldata.append({
-                        'r': row_idx,
-                        'c': 2,
-                        'v': {
-                            'v': opinion['sentiment'],
-                            'm': opinion['sentiment'],
-                            'ct': {'fa': 'General', 't': 'g'},
-                            'fc': font_color,
-                            'vt': 1,
-                            'ht': 1
-                        }
-                    })
+                    writer.add(row_idx, 2, opinion['sentiment'], style={'fc': font_color, 'vt': 1, 'ht': 1})
 
                 # 原始列数据（从列3开始）
                 for col_i, col_name in enumerate(original_columns):
-                    val = opinion['row_data'].get(col_name, '')
-                    if isinstance(val, float):
-                        import math
-                        if math.isnan(val) or math.isinf(val):
-                            val = ""
-                    val_str = str(val)
-
-                    celldata.append({
-                        'r': row_idx,
-                        'c': 3 + col_i,
-                        'v': {
-                            'v': val_str,
-                            'm': val_str,
-                            'ct': {'fa': 'General', 't': 'g'}
-                        }
-                    })
+                    writer.add(row_idx, 3 + col_i, cell_text(opinion['row_data'].get(col_name, '')))
 
                 current_row += 1
 
+        return writer.sheet(config=cls._analysis_sheet_config(grouped), name=sheet_name)
+
+    @classmethod
+    def analysis_sheet_layout(cls, all_opinions, sheet_name, original_columns=None):
+        """分析Sheet的布局信息（增量模式使用，单元格内容已通过逐行结果推送）
+        - headers: 表头
+        - groups: 按显示顺序排列的分组，每组为行号列表（从0开始），组首行显示问题标题/归类/情绪
+        - labels: 每组的 [问题标题, 问题归类]（合并相近分组后可能与组首行推送的标题不同）
+        - config: 合并与列宽配置，与 generate_analysis_sheet 一致
+        """
+        grouped = cls._group_opinions(all_opinions)
+        return {
+            'name': sheet_name,
+            'layout': {
+                'headers': ['问题总标题', '问题归类', '用户情绪'] + list(original_columns or []),
+                'groups': [[opinion['row_id'] - 1 for opinion in opinions] for _, opinions in grouped],
+                'labels': [[title, category] for (title, category), _ in grouped]
+            },
+            'config': cls._analysis_sheet_config(grouped)
+        }
+
+    @staticmethod
+    def _group_opinions(all_opinions):
+        """按（问题标题, 问题归类）分组，保持出现顺序"""
+        opinions = []
+        for opinion in all_opinions:
+            title, category = split_summary(opinion.get('summary'))
+            opinions.append({**opinion, 'title': title, 'category': category})
+        return group_in_order(opinions, key=lambda opinion: (opinion['title'], opinion['category']))
+
+    @staticmethod
+    def _analysis_sheet_config(grouped):
+        """分析Sheet的合并与列宽配置"""
+        merge = {}
+        start_row = 1
+        for _, opinions in grouped:
+            group_rows = len(opinions)
             # 生成合并配置（将同组的“问题总标题”“问题归类”“用户情绪”列合并）
             if group_rows > 1:
                 for col_idx in (0, 1, 2):
-                    config['merge'][f"{start_row}_{col_idx}"] = {
+                    merge[f"{start_row}_{col_idx}"] = {
                         "r": start_row,
                         "c": col_idx,
                         "rs": group_rows,
                         "cs": 1
                     }
+            start_row += group_rows
 
         # 列宽配置
         column_len = {
@@ -630,66 +1246,39 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
             '1': 120,  # 问题归类（功能/体验等）
             '2': 100,  # 用户情绪
         }
-
-        return {
-            'name': sheet_name,
-            'celldata': celldata,
-            'config': {
-                'merge': config.get('merge', {}),
-                'columnlen': column_len
-            }
-        }
+        return {'merge': merge, 'columnlen': column_len}
 
     def create_sheet_data(self, ws, sheet_name, sheet_idx):
         """将Worksheet转换为Luckysheet格式的数据"""
-        celldata = []
-        max_row = ws.max_row
-        max_col = ws.max_column
-        
-        # 读取所有单元格
-        for row in range(1, max_row + 1):
-            for col in range(1, max_col + 1):
-                cell = ws.cell(row=row, column=col)
-                if cell.value is not None:
-                    # 处理各种类型的值，确保不会产生NaN
-                    try:
-                        raw_value = cell.value
-                        cell_value = str(raw_value)
-                        
-                        # 检查特殊值
-                        lower_val = cell_value.lower()
-                        if lower_val == 'nan' or lower_val == 'inf' or lower_val == '-inf':
-                            cell_value = ""
-                    except Exception:
-                        cell_value = ""
-                    
-                    celldata.append({
-                        "r": row - 1,
-                        "c": col - 1,
-                        "v": {
-                            "v": cell_value,
-                            "m": cell_value,
-                            "ct": {"fa": "General", "t": "g"}
-                        }
-                    })
-        
-        return {
-            "name": sheet_name,
-            "index": str(sheet_idx),
-            "order": sheet_idx,
-            "status": 1 if sheet_idx == 0 else 0,
-            "celldata": celldata
-        }
+        writer = CelldataWriter()
+        # 按行顺序读取有值的单元格，处理各种类型的值，确保不会产生NaN
+        for row_idx, col_idx, value in iter_sheet_cells(ws):
+            writer.add(row_idx, col_idx, sheet_cell_text(value))
+        return self._original_sheet(writer, sheet_name, sheet_idx)
+
+    @staticmethod
+    def _original_sheet(writer, sheet_name, sheet_idx):
+        return writer.sheet(
+            name=sheet_name,
+            index=str(sheet_idx),
+            order=sheet_idx,
+            status=1 if sheet_idx == 0 else 0
+        )
 
-    def analyze_dataframe(self, df, original_sheet_data=None):
+    def analyze_dataframe(self, df, original_sheet_data=None, layout_only=False, compact=False, original_table=None, encode=False):
         """分析DataFrame的核心逻辑
         
         Args:
             df: pandas DataFrame containing the data to analyze
             original_sheet_data: Optional dict for original sheet (if None, will be generated from df)
+            layout_only: 增量模式，逐行结果已通过 row_callback 推送，
+                只返回分析Sheet的布局（见 analysis_sheet_layout），不生成单元格与原始数据Sheet
+            compact: 生成的Sheet使用紧凑格式（见 sheet_codec）
+            original_table: 原始数据Sheet的单元格表（见 sheet_codec.CellTableWriter），代替 original_sheet_data
+            encode: 在进程池中构建结果Sheet并序列化（见 process_pool），返回 EncodedJSON
         
         Returns:
-            list of sheet data dicts
+            list of sheet data dicts（encode=True 时为序列化后的 EncodedJSON）
         """
         try:
             columns = df.columns.tolist()
@@ -731,22 +1320,19 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
             # 分析并获取扁平化数据
             all_opinions = self.analyze_and_categorize(rows, feedback_col)
             
-            sheets_data = []
-            
-            # 添加原始数据Sheet
-            if original_sheet_data:
-                sheets_data.append(original_sheet_data)
+            # 结果Sheet的构建与序列化是纯CPU计算，encode=True 时在进程池中执行
+            needs_df = not layout_only and original_sheet_data is None and original_table is None
+            args = (total_users, columns, df if needs_df else None, original_sheet_data, original_table,
+                    layout_only, compact, self.table_callback is not None, encode, self.group_merge_threshold)
+            if encode:
+                # 只向子进程发送结果构建需要的字段；需要 DataFrame 时各行的数据由子进程从 DataFrame 还原
+                packed = pack_opinions(all_opinions, columns, with_values=not needs_df)
+                sheets_data, table_cells = run_cpu_task(build_packed_result_sheets, packed, feedback_col, *args)
             else:
-                # 从DataFrame生成原始数据sheet
-                original_sheet = self._dataframe_to_sheet_data(df, "原始数据", 0)
-                sheets_data.append(original_sheet)
-
-            # 生成分析结果 Sheet
-            sheet_user = self.generate_analysis_sheet(all_opinions, total_users, "分析结果", 'user', original_columns=columns)
-            sheet_user['index'] = 1
-            sheet_user['order'] = 1
-            sheet_user['status'] = 1
-            sheets_data.append(sheet_user)
+                sheets_data, table_cells = build_result_sheets(all_opinions, *args)
+            
+            if table_cells is not None:
+                self.table_callback(table_cells)
             
             return sheets_data
             
@@ -756,66 +1342,190 @@ Taxonomy (标准化分类体系 - 请仅从以下列表中选择):
             traceback.print_exc()
             return []
     
-    def _dataframe_to_sheet_data(self, df, sheet_name, sheet_idx):
+    @staticmethod
+    def _dataframe_to_sheet_data(df, sheet_name, sheet_idx, compact=False):
         """将DataFrame转换为sheet data格式"""
-        celldata = []
-        
-        # 表头
-        for col_idx, col_name in enumerate(df.columns):
-            celldata.append({
-                'r': 0,
-                'c': col_idx,
-                'v': {
-                    'v': str(col_name),
-                    'm': str(col_name),
-                    'ct': {'fa': 'General', 't': 'g'}
-                }
-            })
-        
-        # 数据行
-        for row_idx, row in df.iterrows():
-            for col_idx, col_name in enumerate(df.columns):
-                val = row[col_name]
-                if pd.notna(val):
-                    val_str = str(val)
-                    celldata.append({
-                        'r': row_idx + 1,
-                        'c': col_idx,
-                        'v': {
-                            'v': val_str,
-                            'm': val_str,
-                            'ct': {'fa': 'General', 't': 'g'}
-                        }
-                    })
-        
-        return {
+        meta = {
             'name': sheet_name,
             'index': str(sheet_idx),
             'order': sheet_idx,
-            'status': 1 if sheet_idx == 0 else 0,
-            'celldata': celldata
+            'status': 1 if sheet_idx == 0 else 0
         }
+        if compact:
+            return dataframe_to_compact(df, **meta)
+        return {**meta, 'celldata': dataframe_to_celldata(df)}
 
-    def analyze_file(self, filepath):
-        """分析文件的主入口"""
+    def analyze_session(self, session, layout_only=False, compact=False, encode=False):
+        """分析服务端会话中已解析的表格（见 session_store），不再读取上传的文件"""
+        try:
+            return self.analyze_dataframe(session.tables['data'], layout_only=layout_only, compact=compact,
+                                          original_table=session.tables['original'], encode=encode)
+        except Exception as e:
+            print(f"[Analyze] Error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return []
+
+    def analyze_file(self, filepath, layout_only=False, compact=False, encode=False):
+        """分析文件的主入口（layout_only、compact、encode 见 analyze_dataframe）"""
         try:
             print(f"[Analyze] Reading file: {filepath}")
             if filepath.endswith('.csv'):
                 df = pd.read_csv(filepath)
-            else:
-                df = pd.read_excel(filepath)
+                # CSV 的原始数据Sheet由 DataFrame 生成
+                return self.analyze_dataframe(df, layout_only=layout_only, compact=compact, encode=encode)
             
-            # 为了保持兼容性，使用 openpyxl 读取生成原始 sheet data
-            import openpyxl
-            wb = openpyxl.load_workbook(filepath)
-            ws = wb.active
-            original_sheet = self.create_sheet_data(ws, "原始数据", 0)
+            if layout_only:
+                return self.analyze_dataframe(pd.read_excel(filepath), layout_only=True, encode=encode)
+            
+            # 一次解析同时得到 DataFrame 与原始数据Sheet
+            df, writer = read_analysis_sheet(filepath, sheet_writer(compact))
+            original_sheet = self._original_sheet(writer, "原始数据", 0)
             
             # 调用核心分析逻辑
-            return self.analyze_dataframe(df, original_sheet_data=original_sheet)
+            return self.analyze_dataframe(df, original_sheet_data=original_sheet, compact=compact, encode=encode)
             
         except Exception as e:
             print(f"[Analyze] Error: {str(e)}")
             import traceback
             traceback.print_exc()
             return []
+
+
+def pack_opinions(all_opinions, columns, with_values=True):
+    """进程池任务的精简意见记录: (row_id, summary, sentiment, 各列的值)
+
+    with_values=False 时不包含各列的值（由子进程从 DataFrame 还原，见 unpack_opinions）。
+    """
+    return [
+        (opinion['row_id'], opinion['summary'], opinion['sentiment'],
+         [opinion['row_data'].get(col, '') for col in columns] if with_values else None)
+        for opinion in all_opinions
+    ]
+
+
+def unpack_opinions(packed, columns, feedback_col, df=None):
+    """由 pack_opinions 的结果还原意见记录（与 VOCAnalyzer._build_opinion 的结构一致）"""
+    rows = df.to_dict('records') if df is not None else None
+    all_opinions = []
+    for row_id, summary, sentiment, values in packed:
+        row_data = rows[row_id - 1] if values is None else dict(zip(columns, values))
+        text = row_data.get(feedback_col)
+        all_opinions.append({
+            'row_id': row_id,
+            'summary': summary,
+            'sentiment': sentiment,
+            'snippet': text,
+            'full_feedback': text,
+            'row_data': row_data
+        })
+    return all_opinions
+
+
+def build_packed_result_sheets(packed, feedback_col, total_users, columns, df, *args):
+    """子进程中执行的 build_result_sheets，意见记录为 pack_opinions 的精简格式"""
+    all_opinions = unpack_opinions(packed, columns, feedback_col, df)
+    return build_result_sheets(all_opinions, total_users, columns, df, *args)
+
+
+def build_result_sheets(all_opinions, total_users, columns, df, original_sheet_data, original_table,
+                        layout_only, compact, with_table, encode, merge_threshold=0.0):
+    """由分析结果构建返回给前端的Sheet（见 VOCAnalyzer.analyze_dataframe），可在子进程中执行
+    - merge_threshold > 0 时先合并相近的分组（见 merge_similar_groups）
+
+    Returns:
+        (Sheet列表或 EncodedJSON, 分析结果Sheet的单元格表或None)
+    """
+    if merge_threshold > 0:
+        all_opinions = merge_similar_groups(all_opinions, merge_threshold, ANALYSIS_GROUP_MERGE_MEMORY_MB)
+    
+    table_cells = None
+    if with_table:
+        table_sheet = VOCAnalyzer.generate_analysis_sheet(all_opinions, total_users, "分析结果", original_columns=columns, writer=CellTableWriter())
+        table_cells = table_sheet['cells']
+    
+    sheets_data = []
+    
+    if layout_only:
+        sheet_layout = VOCAnalyzer.analysis_sheet_layout(all_opinions, "分析结果", original_columns=columns)
+        sheet_layout['index'] = 1
+        sheet_layout['order'] = 1
+        sheet_layout['status'] = 1
+        sheets_data.append(sheet_layout)
+    else:
+        # 添加原始数据Sheet
+        if original_sheet_data:
+            sheets_data.append(original_sheet_data)
+        elif original_table is not None:
+            writer = write_table(original_table, sheet_writer(compact))
+            sheets_data.append(VOCAnalyzer._original_sheet(writer, "原始数据", 0))
+        else:
+            # 从DataFrame生成原始数据sheet
+            sheets_data.append(VOCAnalyzer._dataframe_to_sheet_data(df, "原始数据", 0, compact=compact))
+        
+        # 生成分析结果 Sheet
+        sheet_user = VOCAnalyzer.generate_analysis_sheet(all_opinions, total_users, "分析结果", 'user', original_columns=columns, compact=compact)
+        sheet_user['index'] = 1
+        sheet_user['order'] = 1
+        sheet_user['status'] = 1
+        sheets_data.append(sheet_user)
+    
+    if encode:
+        return EncodedJSON(encode_json(sheets_data), len(sheets_data)), table_cells
+    return sheets_data, table_cells
+
+
+# 合并分组时，每组参与向量化的反馈条数上限，以及问题标题在组向量中的权重（其余为反馈的权重）
+GROUP_MERGE_FEEDBACK_SAMPLES = 8
+GROUP_MERGE_TITLE_WEIGHT = 0.7
+
+
+def merge_similar_groups(all_opinions, threshold, memory_mb=64):
+    """合并相近的（问题标题, 问题归类）分组，如模型对同一问题给出的措辞略有不同的标题
+    - 组向量 = 标题向量与组内部分反馈向量的加权和（字符 n-gram 哈希向量，见 semantic_clustering）
+    - 只合并同一问题归类下的分组；按行数从多到少聚类，合并后使用行数最多的分组的标题
+    - 内存占用由 memory_mb 限定，与行数无关
+
+    Returns:
+        新的结果列表（被合并的行的 summary 改为所并入分组的 summary）
+    """
+    grouped = VOCAnalyzer._group_opinions(all_opinions)
+    if len(grouped) < 2:
+        return all_opinions
+
+    # 行数多的分组优先成为簇的代表（行数相同时按出现顺序）
+    order = sorted(range(len(grouped)), key=lambda g: -len(grouped[g][1]))
+    category_ids = {}
+    blocks = [category_ids.setdefault(normalize_text(grouped[g][0][1]), len(category_ids)) for g in order]
+    weights = [len(grouped[g][1]) for g in order]
+
+    def vector_chunks():
+        for start in range(0, len(order), CHUNK_SIZE):
+            chunk = [grouped[g] for g in order[start:start + CHUNK_SIZE]]
+            titles = embed_texts([title for (title, _), _ in chunk])
+            feedback = embed_texts([
+                ' '.join(str(opinion.get('full_feedback', '')) for opinion in opinions[:GROUP_MERGE_FEEDBACK_SAMPLES])
+                for _, opinions in chunk
+            ])
+            vectors = GROUP_MERGE_TITLE_WEIGHT * titles + (1 - GROUP_MERGE_TITLE_WEIGHT) * feedback
+            yield vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    labels, representatives = leader_cluster(vector_chunks(), threshold, weights=weights, blocks=blocks, memory_mb=memory_mb)
+    if len(representatives) == len(grouped):
+        return all_opinions
+    print(f"[Group Merge] {len(grouped)} 个分组合并为 {len(representatives)} 个（相似度阈值 {threshold}）")
+
+    # 被合并分组的行改用代表分组的 summary（代表分组第一行的原始 summary，拆分后得到相同的标题与归类）
+    summaries = {}
+    for position, label in enumerate(labels.tolist()):
+        representative = order[representatives[label]]
+        group = order[position]
+        if representative != group:
+            for opinion in grouped[group][1]:
+                summaries[opinion['row_id']] = grouped[representative][1][0].get('summary')
+    if not summaries:
+        return all_opinions
+    return [
+        {**opinion, 'summary': summaries[opinion['row_id']]} if opinion['row_id'] in summaries else opinion
+        for opinion in all_opinions
+    ]
@@ -0,0 +1,385 @@
+# Excel 流式读取：只读模式逐行读取单元格，并以分块 JSON 的形式输出，内存占用与表格大小无关
+import gc
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from sheet_codec import COMPACT_VERSION, CellTableWriter, CelldataWriter, CompactSheetWriter, CompactStreamWriter
+
+# openpyxl 对未设置宽度的列返回的默认列宽
+DEFAULT_COLUMN_WIDTH = 13
+# 每个输出分块包含的单元格数
+CELLS_PER_CHUNK = 2000
+
+
+def open_workbook(file_path):
+    """以只读模式打开工作簿（单元格按行流式解析，不整体加载到内存）"""
+    return load_workbook(file_path, read_only=True)
+
+
+def sheet_cell_text(value):
+    """原始数据Sheet中单元格的显示文本，NaN/inf 显示为空"""
+    try:
+        text = str(value)
+    except Exception:
+        return ""
+    if text.lower() in ('nan', 'inf', '-inf'):
+        return ""
+    return text
+
+
+def _dataframe_cell(cell):
+    """与 pandas 读取 xlsx 时的单元格转换一致：空单元格为""，错误值为NaN，整数值的数字转为int"""
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def read_analysis_sheet(file_path, writer=None):
+    """一次只读解析第一个工作表，同时得到分析用的 DataFrame 与原始数据Sheet的单元格
+
+    DataFrame 与 pd.read_excel(file_path) 的结果一致（同样读取公式的缓存值）。
+
+    Args:
+        writer: 原始数据Sheet的单元格写入器（见 sheet_codec），默认为标准 celldata 格式
+
+    Returns:
+        (DataFrame, writer)
+    """
+    if writer is None:
+        writer = CelldataWriter()
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        data = []
+        last_row_with_data = -1
+        for row_idx, row in enumerate(ws.iter_rows()):
+            converted_row = []
+            for col_idx, cell in enumerate(row):
+                converted_row.append(_dataframe_cell(cell))
+                if cell.value is not None:
+                    writer.add(row_idx, col_idx, sheet_cell_text(cell.value))
+            # 去掉行尾的空单元格
+            while converted_row and converted_row[-1] == "":
+                converted_row.pop()
+            if converted_row:
+                last_row_with_data = row_idx
+            data.append(converted_row)
+    finally:
+        wb.close()
+
+    # 去掉末尾的空行，并将各行补齐到相同宽度
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame(), writer
+    max_width = max(len(data_row) for data_row in data)
+    data = [data_row + [""] * (max_width - len(data_row)) for data_row in data]
+    df = TextParser(data, header=0, skip_blank_lines=False).read()
+    return df, writer
+
+
+def load_session_tables(file_path):
+    """解析上传文件的第一个工作表，得到服务端会话保存的表格（见 session_store）
+
+    Returns:
+        {'data': 分析用的 DataFrame, 'original': 原始数据Sheet的单元格表（r, c, v）}
+    """
+    df, writer = read_analysis_sheet(file_path, CellTableWriter())
+    return {'data': df, 'original': writer.table()}
+
+
+def _column_strings(values):
+    """将一列非空值批量转换为字符串，结果与逐个调用 str() 一致"""
+    if values.dtype.kind == 'M' and values.dtype.name.startswith('datetime64'):
+        # 无时区的日期时间：整秒时按 Timestamp 的格式 "YYYY-MM-DD HH:MM:SS" 批量格式化
+        seconds = values.astype('datetime64[s]')
+        if (seconds == values).all():
+            return np.char.replace(seconds.astype(str), 'T', ' ').tolist()
+        return [str(value) for value in pd.DatetimeIndex(values)]
+    if values.dtype.kind == 'm':
+        return [str(value) for value in pd.TimedeltaIndex(values)]
+    # 数值/布尔数组 tolist() 得到的Python标量与NumPy标量的 str() 结果相同；对象数组中的文本原样返回
+    return list(map(str, values.tolist()))
+
+
+def _iter_dataframe_columns(df):
+    """逐列产出 (列号, 非空掩码, 非空单元格的字符串列表)
+
+    iterrows 按整行的公共类型取值：只有数值列时混合的整数/浮点列统一按浮点输出，
+    含文本等对象列时各列保持原类型；这里按同样的公共类型逐列转换。
+    """
+    if all(isinstance(dtype, np.dtype) for dtype in df.dtypes):
+        # NumPy 类型的公共类型与取值无关，取一行即可确定
+        common_dtype = df.iloc[:1].to_numpy().dtype
+        interleaved = None
+    else:
+        # 含扩展类型（可空整数、字符串、带时区日期等）时直接使用与 iterrows 相同的二维数组
+        interleaved = df.to_numpy()
+    for col_idx in range(df.shape[1]):
+        if interleaved is not None:
+            values = interleaved[:, col_idx]
+        elif common_dtype == object:
+            values = df.iloc[:, col_idx].to_numpy()
+        else:
+            values = df.iloc[:, col_idx].to_numpy(dtype=common_dtype)
+        col_mask = pd.notna(values)
+        yield col_idx, col_mask, _column_strings(values[col_mask])
+
+
+def _header_cells(df):
+    return [{
+        'r': 0,
+        'c': col_idx,
+        'v': {
+            'v': str(col_name),
+            'm': str(col_name),
+            'ct': {'fa': 'General', 't': 'g'}
+        }
+    } for col_idx, col_name in enumerate(df.columns)]
+
+
+def dataframe_to_celldata(df):
+    """将DataFrame转换为celldata（表头在第0行，数据从第1行开始，跳过空值）
+
+    按列批量计算空值掩码与字符串，输出顺序与逐行遍历（DataFrame.iterrows）一致。
+    """
+    celldata = _header_cells(df)
+    if df.empty:
+        return celldata
+
+    n_rows, n_cols = df.shape
+    mask = np.empty((n_rows, n_cols), dtype=bool)
+    strings = np.empty((n_rows, n_cols), dtype=object)
+    for col_idx, col_mask, col_strings in _iter_dataframe_columns(df):
+        mask[:, col_idx] = col_mask
+        strings[col_mask, col_idx] = col_strings
+
+    row_positions, col_positions = np.nonzero(mask)
+    row_numbers = (np.asarray(df.index) + 1)[row_positions].tolist()
+    # 布尔索引按行优先顺序取值，与 np.nonzero 的顺序一致
+    cell_strings = strings[mask].tolist()
+
+    # 大量创建小字典时暂停循环垃圾回收，避免反复触发全量扫描
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for row_number, col_idx, val_str in zip(row_numbers, col_positions.tolist(), cell_strings):
+            celldata.append({
+                'r': row_number,
+                'c': col_idx,
+                'v': {
+                    'v': val_str,
+                    'm': val_str,
+                    'ct': {'fa': 'General', 't': 'g'}
+                }
+            })
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return celldata
+
+
+def dataframe_to_compact(df, **meta):
+    """将DataFrame直接编码为紧凑格式的Sheet（内容与 dataframe_to_celldata 相同，不创建单元格字典）"""
+    writer = CompactSheetWriter()
+    for col_idx, col_name in enumerate(df.columns):
+        writer.add(0, col_idx, str(col_name))
+    if not df.empty:
+        row_numbers = np.asarray(df.index) + 1
+        for col_idx, col_mask, col_strings in _iter_dataframe_columns(df):
+            writer.add_column(col_idx, row_numbers[col_mask].tolist(), col_strings)
+    return writer.sheet(**meta)
+
+
+def iter_sheet_cells(ws):
+    """逐行遍历有值的单元格，产出 (行号, 列号, 值)，行列号从0开始"""
+    # 部分导出工具写入的表格尺寸不准确，只读模式下重置后按实际内容读取
+    if hasattr(ws, 'reset_dimensions'):
+        ws.reset_dimensions()
+    for row_idx, row in enumerate(ws.iter_rows(values_only=True)):
+        for col_idx, value in enumerate(row):
+            if value is not None:
+                yield row_idx, col_idx, value
+
+
+def read_column_widths(file_path, worksheet_path):
+    """读取工作表XML中 <cols> 定义的列宽 {列号(从0开始): 宽度}
+    - 只读模式不解析列宽，这里只解析 <sheetData> 之前的部分，不读取单元格数据
+    """
+    widths = {}
+    try:
+        with zipfile.ZipFile(file_path) as archive, archive.open(worksheet_path) as sheet_xml:
+            for _, elem in iterparse(sheet_xml, events=('start',)):
+                tag = elem.tag.rsplit('}', 1)[-1]
+                if tag == 'sheetData':
+                    break
+                if tag == 'col' and elem.get('width'):
+                    width = float(elem.get('width'))
+                    for col in range(int(elem.get('min')), int(elem.get('max')) + 1):
+                        widths[col - 1] = width
+    except (KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"[上传] 读取列宽失败，使用默认列宽: {e}")
+    return widths
+
+
+def _sheet_template(sheet_name, sheet_idx):
+    """上传接口返回的Sheet结构（celldata 与 config 在流式输出时单独写入）"""
+    return {
+        'name': sheet_name,
+        'index': sheet_idx,
+        'order': sheet_idx,
+        'status': 1,
+        'scrollLeft': 0,
+        'scrollTop': 0,
+        'luckysheet_select_save': [],
+        'calc chain': [],
+        'isPivotTable': False,
+        'pivotTable': {},
+        'filter_select': None,
+        'filter': None,
+        'luckysheet_conditionformat_save': [],
+        'frozen': {},
+        'chart': [],
+        'zoomRatio': 1,
+        'image': [],
+        'showGridLines': 1,
+        'dataVerification': {}
+    }
+
+
+def _upload_sheet_config(file_path, ws, max_col):
+    # 列宽：Luckysheet/FortuneSheet expects key to be string index "0", "1", etc.
+    widths = read_column_widths(file_path, ws._worksheet_path)
+    column = {str(col): int(widths.get(col) or DEFAULT_COLUMN_WIDTH) for col in range(max(max_col + 1, 1))}
+    return {'columnlen': column, 'rowlen': {}}
+
+
+def stream_upload_json(wb, file_path, file_id, dumps, compact=False, version=None):
+    """以分块字符串的形式输出上传接口的JSON: {fileId, version, sheets, originalSheets}
+
+    第一个分块至少包含第一个Sheet的第一批单元格：调用方在返回响应前先取出第一个分块，
+    工作簿无法解析时仍可返回错误状态码。之后的解析失败无法再改变状态码，
+    此时补全已输出的结构并以 "error" 字段结束JSON，前端据此显示错误。
+
+    Args:
+        wb: open_workbook 打开的只读工作簿，输出结束后关闭
+        dumps: JSON序列化函数（与 jsonify 保持一致的编码规则）
+        compact: 使用紧凑格式（见 sheet_codec），同样按单元格批次逐块输出
+        version: 服务端会话的版本号（见 session_store），为空时不输出
+    """
+    header = '{"fileId": ' + dumps(file_id)
+    if version is not None:
+        header += ', "version": ' + dumps(version)
+    pending = [header + ', "originalSheets": ' + dumps(wb.sheetnames) + ', "sheets": [']
+    # 已生成但尚未闭合的Sheet：close 为补全该Sheet的函数，Sheet之间为 None
+    state = {'close': None}
+    started = False
+    try:
+        for piece, flush in _upload_sheet_chunks(wb, file_path, dumps, compact, state):
+            # 结构性的小片段与之后的单元格数据合并输出
+            pending.append(piece)
+            if flush:
+                yield ''.join(pending)
+                pending.clear()
+                started = True
+        pending.append(']}')
+        yield ''.join(pending)
+        print(f"[上传] 返回数据完成，共 {len(wb.sheetnames)} 个sheet")
+    except Exception as e:
+        if not started:
+            # 尚未输出任何内容，由调用方返回错误响应
+            raise
+        print(f"[上传] 处理文件时出错，已输出的内容以错误结束: {e}")
+        if state['close']:
+            pending.append(state['close']())
+        yield ''.join(pending) + '], "error": ' + dumps(f'处理文件失败: {str(e)}') + '}'
+    finally:
+        wb.close()
+
+
+def _upload_sheet_chunks(wb, file_path, dumps, compact, state):
+    """依次产出各Sheet的JSON片段 (文本, 是否立即输出)，不含外层的 sheets 数组"""
+    for sheet_idx, sheet_name in enumerate(wb.sheetnames):
+        ws = wb[sheet_name]
+        print(f"[上传] 处理sheet: {sheet_name}")
+        separator = ', ' if sheet_idx else ''
+        if compact:
+            yield from _compact_sheet_chunks(ws, file_path, sheet_name, sheet_idx, separator, dumps, state)
+            continue
+        # 去掉模板末尾的 "}"，在其后追加 celldata 与 config
+        yield separator + dumps(_sheet_template(sheet_name, sheet_idx))[:-1] + ', "celldata": [', False
+        state['close'] = lambda: '], "config": {}}'
+
+        cell_count = 0
+        max_col = -1
+        chunk = []
+        for row_idx, col_idx, value in iter_sheet_cells(ws):
+            chunk.append(dumps({
+                'r': row_idx,
+                'c': col_idx,
+                'v': {
+                    'v': value,
+                    'm': str(value),
+                    'ct': {'fa': 'General', 't': 'g'}
+                }
+            }))
+            max_col = max(max_col, col_idx)
+            if len(chunk) >= CELLS_PER_CHUNK:
+                yield (', ' if cell_count else '') + ', '.join(chunk), True
+                cell_count += len(chunk)
+                chunk = []
+        if chunk:
+            yield (', ' if cell_count else '') + ', '.join(chunk), False
+            cell_count += len(chunk)
+        print(f"[上传] Sheet {sheet_name} 共读取 {cell_count} 个单元格")
+
+        config = dumps(_upload_sheet_config(file_path, ws, max_col))
+        state['close'] = None
+        yield '], "config": ' + config + '}', True
+
+
+def _compact_sheet_chunks(ws, file_path, sheet_name, sheet_idx, separator, dumps, state):
+    """紧凑格式的Sheet片段：每批单元格输出为 columns 中的列片段，共享字符串表与 config 最后输出"""
+    writer = CompactStreamWriter()
+    yield (separator + dumps(_sheet_template(sheet_name, sheet_idx))[:-1]
+           + ', "compact": {"version": ' + dumps(COMPACT_VERSION) + ', "columns": ['), False
+
+    def close(config):
+        # 去掉 tail 开头的 "{"，其字段接在 columns 之后并闭合 compact
+        return '], ' + dumps(writer.tail())[1:] + ', "config": ' + dumps(config) + '}'
+
+    state['close'] = lambda: close({})
+
+    cell_count = 0
+    max_col = -1
+
+    def flush():
+        nonlocal cell_count
+        comma = ', ' if cell_count else ''
+        cell_count += writer.pending
+        return comma + ', '.join(dumps(segment) for segment in writer.flush_columns())
+
+    for row_idx, col_idx, value in iter_sheet_cells(ws):
+        writer.add(row_idx, col_idx, str(value), value=value)
+        max_col = max(max_col, col_idx)
+        if writer.pending >= CELLS_PER_CHUNK:
+            yield flush(), True
+    if writer.pending:
+        yield flush(), False
+    print(f"[上传] Sheet {sheet_name} 共读取 {cell_count} 个单元格")
+
+    state['close'] = None
+    yield close(_upload_sheet_config(file_path, ws, max_col)), True
@@ -1,6 +1,9 @@
 import React, { useState, useEffect, useRef } from 'react'
 import FileUpload from './components/FileUpload'
 import SpreadsheetEditor from './components/SpreadsheetEditor'
+import { buildAnalysisSheet } from './utils/analysisSheet'
+import { expandCompactSheet, expandCompactSheets } from './utils/sheetCodec'
+import { splitStatsSheet, applyStatsDelta, assembleStatsSheet } from './utils/statsDelta'
 import './App.css'
 
 function App() {
@@ -10,9 +13,15 @@ function App() {
   const [countdown, setCountdown] = useState(null)
   const [progress, setProgress] = useState(null) // 进度信息 {current, total, progress, message}
   const [timeoutSeconds] = useState(120) // 超时时间：120秒
+  // 分析被终止、超时或中断后可从服务端断点继续，已完成的行不再重新分析
+  const [canResume, setCanResume] = useState(false)
   const countdownTimerRef = useRef(null)
   const abortControllerRef = useRef(null)
   const eventSourceRef = useRef(null)
+  // 服务端保存的统计分组状态（全量重算后建立，用于增量重算），分析结果Sheet被替换时清空
+  const statsStateRef = useRef(null)
+  // 服务端会话 {fileId, version, analysisShown}：上传后的表格与分析结果保存在服务端，通过 fileId + version 引用
+  const sessionRef = useRef(null)
 
   // 清理定时器和请求
   useEffect(() => {
@@ -60,7 +69,8 @@ function App() {
     formData.append('file', file)
 
     try {
-      const response = await fetch('/api/upload', {
+      // 紧凑格式：按列传输并在前端还原为celldata，减少传输与解析开销
+      const response = await fetch('/api/upload?format=compact', {
         method: 'POST',
         body: formData,
         signal: abortControllerRef.current.signal
@@ -72,6 +82,11 @@ function App() {
       }
 
       const data = await response.json()
+      // 流式返回中途解析失败时状态码已是200，错误信息在 error 字段中
+      if (data.error) {
+        throw new Error(data.error)
+      }
+      data.sheets = expandCompactSheets(data.sheets)
       console.log('[上传] 收到上传响应:', data)
       console.log('[上传] fileId:', data.fileId)
       console.log('[上传] sheets数量:', data.sheets?.length)
@@ -85,6 +100,8 @@ function App() {
           console.log('[上传] 第一个sheet的前3个单元格:', data.sheets[0].celldata.slice(0, 3))
         }
       }
+      statsStateRef.current = null
+      sessionRef.current = data.version ? { fileId: data.fileId, version: data.version, analysisShown: false } : null
       setFileData(data)
       console.log('[上传] 已设置fileData')
 
@@ -109,11 +126,13 @@ function App() {
     }
   }
 
-  const handleAnalyze = async (dataToAnalyze = null) => {
+  const handleAnalyze = async (dataToAnalyze = null, resume = false) => {
     const targetData = dataToAnalyze || fileData
     if (!targetData || !targetData.fileId) return
 
     setIsAnalyzing(true)
+    // 分析开始后即可继续（未完成时），完成后清除
+    setCanResume(true)
     setErrorMessage(null)
     setProgress(null)
     setCountdown(timeoutSeconds)
@@ -156,13 +175,30 @@ function App() {
     }, timeoutSeconds * 1000)
 
     return new Promise((resolve, reject) => {
-      // 使用fetch的stream模式接收SSE
-      fetch('/api/analyze', {
+      // 先提交分析任务（排队已满时返回429），再以fetch的stream模式订阅任务的SSE事件
+      fetch('/api/jobs', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ fileId: targetData.fileId })
+        // 增量模式：逐行接收分析结果，最后只接收分组与合并等布局信息
+        body: JSON.stringify({
+          fileId: sessionRef.current?.fileId || targetData.fileId,
+          version: sessionRef.current?.version,
+          incremental: true,
+          format: 'compact',
+          resume
+        })
+      }).then(async response => {
+        if (response.status === 429) {
+          const info = await response.json().catch(() => ({}))
+          throw new Error(info.error || '分析任务排队已满，请稍后重试')
+        }
+        if (!response.ok) {
+          throw new Error(`分析失败: ${response.status}`)
+        }
+        const job = await response.json()
+        return fetch(`/api/jobs/${job.jobId}/events`)
       }).then(response => {
         if (!response.ok) {
           throw new Error(`分析失败: ${response.status}`)
@@ -172,6 +208,7 @@ function App() {
         const decoder = new TextDecoder()
         let buffer = ''
         let completed = false // 跟踪是否已收到complete消息
+        const rowResults = {} // 增量模式下已收到的逐行结果 {行号: 结果}
 
         const readStream = () => {
           reader.read().then(({ done, value }) => {
@@ -211,8 +248,25 @@ function App() {
                       progress: data.progress,
                       message: data.message
                     })
+                  } else if (data.type === 'rows') {
+                    for (const row of data.rows) {
+                      rowResults[row.row] = row
+                    }
                   } else if (data.type === 'complete') {
                     completed = true
+                    if (data.data?.sheets) {
+                      data.data.sheets = expandCompactSheets(data.data.sheets)
+                    }
+                    if (data.data?.incremental) {
+                      // 原始数据Sheet沿用已上传的数据，分析Sheet由逐行结果组装
+                      const originalSheet = { ...targetData.sheets[0], name: '原始数据', index: '0', order: 0, status: 1 }
+                      data.data = {
+                        ...data.data,
+                        sheets: [originalSheet, ...data.data.sheets.map(sheet => (
+                          sheet.layout ? buildAnalysisSheet(sheet, rowResults) : sheet
+                        ))]
+                      }
+                    }
                     clearTimeout(timeoutId)
                     if (countdownTimerRef.current) {
                       clearInterval(countdownTimerRef.current)
@@ -224,10 +278,15 @@ function App() {
                     if (data.data?.sheets) {
                       console.log('[前端] 第一个sheet:', JSON.stringify(data.data.sheets[0], null, 2).substring(0, 500))
                     }
+                    statsStateRef.current = null
+                    if (sessionRef.current && data.data?.version) {
+                      sessionRef.current = { ...sessionRef.current, version: data.data.version, analysisShown: true }
+                    }
                     setFileData(data.data)
                     setProgress(null)
                     setCountdown(null)
                     setIsAnalyzing(false)
+                    setCanResume(false)
                     resolve(data.data)
                     return
                   } else if (data.type === 'error') {
@@ -281,53 +340,115 @@ function App() {
     })
   }
 
-  const handleRecalculate = async (currentData) => {
-    try {
-      console.log('[Recalculate] Sending data to backend...', currentData)
-      const response = await fetch('/api/recalculate_stats', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ celldata: currentData })
+  // 替换分析结果Sheet并触发 Workbook 重新渲染
+  const showAnalysisSheet = (result) => {
+    if (fileData && fileData.sheets) {
+      const updatedSheets = fileData.sheets.map((sheet, index) => {
+        if (sheet.name === '分析结果') {
+          // 完全替换分析结果sheet，保持其他属性
+          return {
+            name: result.name || '分析结果',
+            index: sheet.index,
+            order: sheet.order,
+            status: 1,  // 强制设置为活动状态
+            celldata: result.celldata,
+            config: result.config,
+            scrollLeft: 0,
+            scrollTop: 0
+          }
+        } else {
+          // 其他sheet设置为非活动状态
+          return { ...sheet, status: 0 }
+        }
+      })
+
+      // 强制更新：递增 renderVersion 触发 Workbook 的 key 变化；fileId 保持不变，服务端会话与统计状态都以它为键
+      setFileData({
+        ...fileData,
+        sheets: updatedSheets,
+        renderVersion: (fileData.renderVersion || 0) + 1
       })
+      console.log('[Recalculate] Updated sheet data')
+    }
+  }
+
+  // 增量重算：只提交修改过的单元格，服务端返回变化的分组块；失败时返回false，改用全量重算
+  const recalculateDelta = async (edits) => {
+    const stats = statsStateRef.current
+    if (!stats || !edits || edits.length === 0) return false
+
+    const response = await fetch('/api/recalculate_stats/delta', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ fileId: stats.fileId, version: stats.version, changes: edits })
+    })
+    if (!response.ok) {
+      console.warn(`[Recalculate] 增量重算不可用 (${response.status})，改用全量重算`)
+      statsStateRef.current = null
+      return false
+    }
+
+    const delta = await response.json()
+    console.log(`[Recalculate] 增量重算: ${edits.length} 个修改，${delta.blocks.length} 个分组变化`)
+    statsStateRef.current = applyStatsDelta(stats, delta)
+    const { celldata, merge } = assembleStatsSheet(statsStateRef.current)
+    const analysisSheet = fileData.sheets.find(sheet => sheet.name === '分析结果')
+    showAnalysisSheet({ name: '分析结果', celldata, config: { ...(analysisSheet?.config || {}), merge } })
+    return true
+  }
+
+  const handleRecalculate = async (currentData, edits) => {
+    try {
+      if (await recalculateDelta(edits)) return
+
+      let response = null
+      // 统计状态以上传时的 fileId 为键，多次重算复用同一个服务端状态
+      let statsKey = sessionRef.current?.fileId || fileData?.fileId
+      const session = sessionRef.current
+      // 分析结果尚未重算过时，引用服务端会话中保存的分析结果，只提交修改过的单元格
+      if (session?.analysisShown && edits !== null) {
+        response = await fetch('/api/recalculate_stats', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json'
+          },
+          body: JSON.stringify({ fileId: session.fileId, version: session.version, changes: edits, format: 'compact' })
+        })
+        if (response.ok) {
+          statsKey = session.fileId
+        } else {
+          console.warn(`[Recalculate] 服务端会话不可用 (${response.status})，改为提交整张表`)
+          response = null
+        }
+      }
+
+      if (!response) {
+        console.log('[Recalculate] Sending data to backend...', currentData)
+        response = await fetch('/api/recalculate_stats', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json'
+          },
+          // 带 fileId 时服务端保存分组状态，之后的修改可以增量重算
+          body: JSON.stringify({ celldata: currentData, format: 'compact', fileId: statsKey })
+        })
+      }
 
       if (!response.ok) {
         throw new Error(`重新计算失败: ${response.status}`)
       }
 
-      const result = await response.json()
+      const result = expandCompactSheet(await response.json())
       console.log('[Recalculate] Received result:', result)
+      statsStateRef.current = result.layout ? splitStatsSheet(result, statsKey) : null
+      if (session) {
+        session.analysisShown = false
+      }
 
       // 更新当前sheet的数据
-      if (fileData && fileData.sheets) {
-        const updatedSheets = fileData.sheets.map((sheet, index) => {
-          if (sheet.name === '分析结果') {
-            // 完全替换分析结果sheet，保持其他属性
-            return {
-              name: result.name || '分析结果',
-              index: sheet.index,
-              order: sheet.order,
-              status: 1,  // 强制设置为活动状态
-              celldata: result.celldata,
-              config: result.config,
-              scrollLeft: 0,
-              scrollTop: 0
-            }
-          } else {
-            // 其他sheet设置为非活动状态
-            return { ...sheet, status: 0 }
-          }
-        })
-
-        // 强制更新：添加时间戳到 fileId 来触发 Workbook 的 key 变化
-        setFileData({
-          ...fileData,
-          sheets: updatedSheets,
-          fileId: fileData.fileId.split('-')[0] + '-' + Date.now()  // 强制重新渲染
-        })
-        console.log('[Recalculate] Updated sheet data')
-      }
+      showAnalysisSheet(result)
     } catch (error) {
       console.error('[Recalculate] Error:', error)
       setErrorMessage(error.message || '重新计算统计失败')
@@ -350,6 +471,7 @@ function App() {
               <button onClick={() => {
                 setFileData(null)
                 setErrorMessage(null)
+                setCanResume(false)
                 setCountdown(null)
                 setProgress(null)
                 if (eventSourceRef.current) {
@@ -441,6 +563,14 @@ function App() {
                   开始AI分析
                 </button>
               )}
+              {!isAnalyzing && canResume && (
+                <button
+                  onClick={() => handleAnalyze(null, true)}
+                  className="btn-secondary"
+                >
+                  继续分析
+                </button>
+              )}
             </div>
             {errorMessage && (
               <div className="error-message">
@@ -6,6 +6,9 @@ import './SpreadsheetEditor.css'
 // 简单的防抖控制
 // (Moving ref inside component)
 
+// 改变行列结构的操作：之后的单元格坐标与服务端保存的分组状态不再对应，只能全量重算
+const STRUCTURAL_OPS = ['insertRowCol', 'deleteRowCol', 'mv']
+
 function SpreadsheetEditor({ data, onRecalculate }) {
   // console.log('[SpreadsheetEditor] 收到数据:', data)
 
@@ -15,6 +18,14 @@ function SpreadsheetEditor({ data, onRecalculate }) {
 
   // 简单的防抖控制
   const lastLogRef = React.useRef({ time: 0, r: -1 })
+  const workbookRef = React.useRef(null)
+  // 分析结果Sheet中修改过的单元格 {"r_c": {r, c, v}}，用于增量重算；行列结构变化后只能全量重算
+  const editsRef = React.useRef({ cells: new Map(), structural: false })
+
+  // 分析结果Sheet被替换（新的分析或重算结果）后，之前记录的修改已不对应当前的分组状态
+  React.useEffect(() => {
+    editsRef.current = { cells: new Map(), structural: false }
+  }, [data.sheets])
 
   const handleRecalculateClick = () => {
     if (!onRecalculate) return
@@ -27,8 +38,35 @@ function SpreadsheetEditor({ data, onRecalculate }) {
       return
     }
 
+    const { cells, structural } = editsRef.current
+    const edits = structural ? null : [...cells.values()]
+    editsRef.current = { cells: new Map(), structural: false }
+
     console.log('[Recalculate] Extracting data from sheet:', analysisSheet.name)
-    onRecalculate(analysisSheet.celldata)
+    onRecalculate(analysisSheet.celldata, edits)
+  }
+
+  // 记录分析结果Sheet的单元格修改（FortuneSheet 的 op.path 为 ['data', r, c] 或 ['data', r, c, 'v']）
+  const recordEdit = (op) => {
+    if (STRUCTURAL_OPS.includes(op.op)) {
+      editsRef.current.structural = true
+      return
+    }
+    const sheet = workbookRef.current?.getAllSheets().find(s => s.id === op.id)
+    if (!sheet || sheet.name !== '分析结果') return
+    const [target, r, c, field] = op.path || []
+    if (target === 'config' && r === 'merge') {
+      editsRef.current.structural = true
+      return
+    }
+    if (target !== 'data') return
+    if (typeof r !== 'number' || typeof c !== 'number' || op.path.length > 4) {
+      editsRef.current.structural = true
+      return
+    }
+    if (field !== undefined && field !== 'v') return
+    const value = field === 'v' ? op.value : op.value?.v
+    editsRef.current.cells.set(`${r}_${c}`, { r, c, v: value ?? '' })
   }
 
   const handleOp = (op) => {
@@ -37,6 +75,8 @@ function SpreadsheetEditor({ data, onRecalculate }) {
     // 监听行移动操作 (Move Rows)
     // FortuneSheet/Luckysheet 'mv' operation: { "op": "mv", "r": [start, end], "t": target_index }
 
+    recordEdit(op)
+
     // 简化逻辑：我们只关心 'mv' (move) 操作
     if (op.op === 'mv') {
       const targetIndex = op.v.t
@@ -120,7 +160,8 @@ function SpreadsheetEditor({ data, onRecalculate }) {
         </div>
       )}
       <Workbook
-        key={data.fileId + '-' + data.sheets.length}
+        ref={workbookRef}
+        key={data.fileId + '-' + data.sheets.length + '-' + (data.renderVersion || 0)}
         data={data.sheets}
         onChange={(d) => console.log('Data changed:', d)}
         onOp={handleOp}
@@ -0,0 +1,56 @@
+// 增量分析模式：根据逐行推送的结果与最终的布局信息，在前端组装分析结果Sheet
+// 单元格格式与后端 VOCAnalyzer.generate_analysis_sheet 保持一致
+
+const textCell = (r, c, text, style = {}) => ({
+  r,
+  c,
+  v: {
+    v: text,
+    m: text,
+    ct: { fa: 'General', t: 'g' },
+    ...style
+  }
+})
+
+const sentimentColor = (sentiment) => {
+  const text = String(sentiment)
+  if (text.includes('负面')) return '#FF0000'
+  if (text.includes('正面')) return '#008000'
+  return '#000000'
+}
+
+/**
+ * @param {object} sheet 后端返回的分析Sheet布局 {name, index, order, status, layout: {headers, groups, labels}, config}
+ * @param {object} rowResults 逐行结果 {行号: {row, title, category, sentiment, values}}
+ */
+export function buildAnalysisSheet(sheet, rowResults) {
+  const { headers, groups, labels } = sheet.layout
+  const celldata = headers.map((header, c) => textCell(0, c, header, { bg: '#EDEBE9', bl: 1 }))
+
+  let currentRow = 1
+  groups.forEach((group, groupIndex) => {
+    // 分组的标题与归类以布局为准（相近的分组合并后，组首行的标题可能不同）
+    const [title, category] = labels?.[groupIndex] ?? []
+    group.forEach((rowId, i) => {
+      const result = rowResults[rowId]
+      if (!result) {
+        currentRow += 1
+        return
+      }
+      // 问题总标题 & 问题归类 & 用户情绪（只在组首生成，之后依赖合并）
+      if (i === 0) {
+        celldata.push(textCell(currentRow, 0, title ?? result.title, { vt: 1, ht: 1, bg: '#F6F8FA' }))
+        celldata.push(textCell(currentRow, 1, (category ?? result.category) || '未分类', { vt: 1, ht: 1, bg: '#F6F8FA' }))
+        celldata.push(textCell(currentRow, 2, result.sentiment, { fc: sentimentColor(result.sentiment), vt: 1, ht: 1 }))
+      }
+      // 原始列数据（从列3开始）
+      result.values.forEach((value, colIndex) => {
+        celldata.push(textCell(currentRow, 3 + colIndex, value))
+      })
+      currentRow += 1
+    })
+  })
+
+  const { layout, ...rest } = sheet
+  return { ...rest, celldata }
+}
@@ -0,0 +1,71 @@
+// 紧凑格式Sheet的还原（格式说明见 backend/sheet_codec.py）
+// 将 compact 字段展开为 FortuneSheet 使用的 celldata，并根据分组列的游程重新生成合并配置
+
+const COMPACT_VERSION = 1
+
+export function expandCompactSheet(sheet) {
+  if (!sheet || !sheet.compact) return sheet
+  const { compact, ...rest } = sheet
+  if (compact.version !== COMPACT_VERSION) {
+    throw new Error(`不支持的紧凑格式版本: ${compact.version}`)
+  }
+
+  const { strings } = compact
+  const key = (r, c) => `${r}_${c}`
+  const raw = new Map(compact.raw.map(([r, c, value]) => [key(r, c), value]))
+  const styles = new Map(compact.cellStyles.map(([r, c, styleIndex]) => [key(r, c), compact.styles[styleIndex]]))
+  const config = { ...(rest.config || {}) }
+  const merge = { ...(config.merge || {}) }
+  let hasMerge = 'merge' in config
+
+  const cells = []
+  for (const column of compact.columns) {
+    const c = column.c
+    if (column.runs) {
+      for (const [r, span, stringIndex] of column.runs) {
+        cells.push([r, c, strings[stringIndex]])
+        if (span > 1) {
+          merge[key(r, c)] = { r, c, rs: span, cs: 1 }
+          hasMerge = true
+        }
+      }
+    } else {
+      let i = 0
+      for (const [start, count] of column.rows) {
+        for (let r = start; r < start + count; r++) {
+          cells.push([r, c, strings[column.values[i++]]])
+        }
+      }
+      // 上传接口逐块输出的列片段自带原始值
+      for (const [r, value] of column.raw || []) {
+        raw.set(key(r, c), value)
+      }
+    }
+  }
+  // 与标准格式一致，按行优先排序
+  cells.sort((a, b) => a[0] - b[0] || a[1] - b[1])
+
+  const celldata = cells.map(([r, c, text]) => {
+    const cellKey = key(r, c)
+    return {
+      r,
+      c,
+      v: {
+        v: raw.has(cellKey) ? raw.get(cellKey) : text,
+        m: text,
+        ct: { fa: 'General', t: 'g' },
+        ...(styles.get(cellKey) || {})
+      }
+    }
+  })
+
+  const result = { ...rest, celldata }
+  if (hasMerge) {
+    result.config = { ...config, merge }
+  }
+  return result
+}
+
+export function expandCompactSheets(sheets) {
+  return sheets ? sheets.map(expandCompactSheet) : sheets
+}
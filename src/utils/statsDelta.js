@@ -0,0 +1,69 @@
+// 统计Sheet的增量重算：前端保存各分组块的单元格，根据 /api/recalculate_stats/delta 返回的
+// 分组布局与变化的分组块重新组装Sheet（未变化的分组只平移行号，不需要服务端重新生成）
+
+const STATS_COLUMNS = 5 // 列0-4为统计列，分组行数大于1时合并
+
+/**
+ * 将全量重算的结果按分组布局拆分为分组块
+ * @param {object} sheet 全量重算返回的Sheet（含 version 与 layout: [[分组ID, 行数], ...]）
+ * @param {string} fileId 服务端保存分组状态所用的键
+ */
+export function splitStatsSheet(sheet, fileId) {
+  const header = []
+  const rows = new Map()
+  for (const cell of sheet.celldata) {
+    if (cell.r === 0) {
+      header.push(cell)
+    } else {
+      if (!rows.has(cell.r)) rows.set(cell.r, [])
+      rows.get(cell.r).push(cell)
+    }
+  }
+
+  const blocks = new Map()
+  let start = 1
+  for (const [groupId, size] of sheet.layout) {
+    const cells = []
+    for (let r = start; r < start + size; r++) {
+      for (const cell of rows.get(r) || []) {
+        cells.push({ ...cell, r: r - start })
+      }
+    }
+    blocks.set(groupId, cells)
+    start += size
+  }
+
+  return { fileId, version: sheet.version, layout: sheet.layout, header, blocks }
+}
+
+// 应用增量结果：替换变化的分组块，删除已不存在的分组
+export function applyStatsDelta(state, delta) {
+  const blocks = new Map(state.blocks)
+  for (const [groupId, cells] of delta.blocks) {
+    blocks.set(groupId, cells)
+  }
+  const groupIds = new Set(delta.layout.map(([groupId]) => groupId))
+  for (const groupId of blocks.keys()) {
+    if (!groupIds.has(groupId)) blocks.delete(groupId)
+  }
+  return { ...state, version: delta.version, layout: delta.layout, blocks }
+}
+
+// 按分组布局组装 celldata 与合并配置
+export function assembleStatsSheet(state) {
+  const celldata = [...state.header]
+  const merge = {}
+  let start = 1
+  for (const [groupId, size] of state.layout) {
+    for (const cell of state.blocks.get(groupId)) {
+      celldata.push({ ...cell, r: cell.r + start })
+    }
+    if (size > 1) {
+      for (let c = 0; c < STATS_COLUMNS; c++) {
+        merge[`${start}_${c}`] = { r: start, c, rs: size, cs: 1 }
+      }
+    }
+    start += size
+  }
+  return { celldata, merge }
+}